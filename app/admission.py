@@ -0,0 +1,126 @@
+"""
+Admission control of the requests that hit the db.
+
+Requests are grouped into route classes of similar cost, such as the cheap
+catalog reads or the expensive recommendations, and each class gets its own
+AdmissionLimiter. A limiter lets a fixed number of requests run at once and
+queues a bounded number of others. Requests that find the queue full, or that
+wait in it for too long, are shed so that they fail fast instead of piling up
+while the db is slow.
+
+As each class has its own limit, saturating one class, such as the
+recommendations, does not delay the requests of the others.
+"""
+
+import asyncio
+import collections
+
+from .metrics import ADMISSION_IN_PROGRESS, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED
+
+ROUTE_CLASSES: list[tuple[str, str, str]] = [
+    ("GET", "/modules", "catalog"),
+    ("GET", "/students", "student_reads"),
+    ("PUT", "/students", "student_writes"),
+    ("GET", "/recommendations", "recommendations"),
+    ("POST", "/recommendations", "recommendations"),
+    ("POST", "/auth", "auth"),
+]
+
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+
+
+class AdmissionLimiter:
+    """Limits the concurrent requests of a route class, with a bounded queue.
+
+    Permits are handed over to the oldest waiting request as they are
+    released, so queued requests are admitted in order.
+
+    Attributes:
+      route_class:
+        The name of the route class.
+      limit:
+        The number of requests allowed to run at once.
+      queue_size:
+        The number of requests allowed to wait for a permit.
+      queue_timeout:
+        The time in seconds a request may wait for a permit.
+    """
+
+    def __init__(self, route_class: str, limit: int, queue_size: int, queue_timeout: float):
+        self.route_class: str = route_class
+        self.limit: int = limit
+        self.queue_size: int = queue_size
+        self.queue_timeout: float = queue_timeout
+        self.active: int = 0
+        self.waiters: collections.deque[asyncio.Future] = collections.deque()
+        self.in_progress = ADMISSION_IN_PROGRESS.labels(route_class)
+        self.queue_depth = ADMISSION_QUEUE_DEPTH.labels(route_class)
+        self.shed = {
+            reason: ADMISSION_SHED.labels(route_class, reason)
+            for reason in (QUEUE_FULL, QUEUE_TIMEOUT)
+        }
+
+    async def acquire(self) -> bool:
+        """Waits for a permit.
+
+        Returns:
+          Whether the request was admitted. If not, it was shed and must not
+          call release.
+        """
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self.in_progress.inc()
+            return True
+
+        if len(self.waiters) >= self.queue_size:
+            self.shed[QUEUE_FULL].inc()
+            return False
+
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.queue_depth.inc()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The permit was handed over as the wait timed out.
+                return True
+
+            self.waiters.remove(waiter)
+            self.queue_depth.dec()
+            waiter.cancel()
+            self.shed[QUEUE_TIMEOUT].inc()
+            return False
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self.waiters.remove(waiter)
+                self.queue_depth.dec()
+                waiter.cancel()
+            raise
+
+        return True
+
+    def release(self):
+        """Returns a permit, handing it to the oldest waiting request if any."""
+        if self.waiters:
+            self.queue_depth.dec()
+            self.waiters.popleft().set_result(None)
+            return
+
+        self.active -= 1
+        self.in_progress.dec()
+
+
+def route_class(method: str, path: str) -> str:
+    """Returns the route class of a request, None if it is not limited."""
+    for class_method, prefix, name in ROUTE_CLASSES:
+        if method == class_method and (
+            path == prefix or path.startswith(prefix + "/")
+        ):
+            return name
+
+    return None
@@ -0,0 +1,74 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+Many users asking for the same page of modules, search results or faculty at
+the same moment would each run the same query. A SingleFlight runs the first
+of a set of identical calls in a worker thread and has the calls made while
+it is in flight wait for it and share its result, or its exception, instead
+of running their own. Calls are identical when they have the same key, made
+of the operation and of its arguments.
+
+The call runs in a copy of the context of the request that made it first, so
+its queries are attributed to that request only. Only reads that do not
+depend on who makes them may be coalesced.
+"""
+
+import asyncio
+from typing import Callable, Hashable
+
+from .metrics import COALESCED_CALLS, COALESCED_IN_FLIGHT
+
+EXECUTED = "executed"
+COALESCED = "coalesced"
+
+
+class SingleFlight:
+    """Coalesces the identical calls of an operation made concurrently.
+
+    Attributes:
+      operation:
+        The name of the operation, as reported in the metrics.
+    """
+
+    def __init__(self, operation: str):
+        self.operation: str = operation
+        self.calls: dict[Hashable, asyncio.Future] = {}
+        self.executed = COALESCED_CALLS.labels(operation, EXECUTED)
+        self.coalesced = COALESCED_CALLS.labels(operation, COALESCED)
+        self.in_flight = COALESCED_IN_FLIGHT.labels(operation)
+
+    async def run(self, key: Hashable, func: Callable, *args) -> any:
+        """Runs a blocking call in a worker thread, or joins the identical
+        call in flight.
+
+        A caller that is cancelled stops waiting for the call but does not
+        cancel it, as other callers may be waiting for it too.
+
+        Returns:
+          The result of the call.
+        """
+        call: asyncio.Future = self.calls.get(key)
+
+        if call is not None:
+            self.coalesced.inc()
+            return await asyncio.shield(call)
+
+        self.executed.inc()
+        self.in_flight.inc()
+        call = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        self.calls[key] = call
+        call.add_done_callback(lambda _: self._done(key, call))
+
+        return await asyncio.shield(call)
+
+    def _done(self, key: Hashable, call: asyncio.Future):
+        """Forgets a completed call, so that the next identical call runs."""
+        self.in_flight.dec()
+
+        if self.calls.get(key) is call:
+            del self.calls[key]
+
+        if not call.cancelled():
+            # Retrieves the exception, if any, so that it is not reported as
+            # never retrieved when every caller was cancelled.
+            call.exception()
@@ -2,6 +2,8 @@
 Constants
 """
 
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -11,5 +13,59 @@ class Settings(BaseSettings):
     neo4j_user: str
     neo4j_password: str
     secret_key: str
+    rec_store_stale_while_revalidate_seconds: float = 0
+    rec_precompute_chunk_size: int = 100
+    rec_precompute_concurrency: int = 4
+    recommender_backend: str = "cypher"
+    in_process_reload_seconds: float = 300
+    rec_query_timeout_seconds: float = 2.0
+    rec_request_deadline_seconds: float = 2.5
+    rec_batch_concurrency: int = 8
+    rec_batch_max_students: int = 1000
+    advisor_ids: list[str] = []
+    repository_backend: str = "neo4j"
+    memory_repository_snapshot: str = ""
+    query_count_ceilings: dict[str, int] = {}
+    query_count_ceiling_action: str = "log"
+    bcrypt_workers: int = 4
+    slow_query_threshold_ms: float = 200
+    slow_query_plan_dir: str = ""
+    slow_query_plan_mode: str = "EXPLAIN"
+    tracing_exporter: str = ""
+    tracing_file: str = "spans.jsonl"
+    tracing_memory_spans: int = 10000
+    profiling_token: str = ""
+    profiling_sample_rate: float = 0.0
+    profiling_interval_ms: float = 5
+    profiling_dir: str = "profiles"
+    profiling_max_profiles: int = 100
+    warmup_connections: int = 4
+    warmup_retry_seconds: float = 5
+    admission_limits: dict[str, int] = {
+        "catalog": 64,
+        "student_reads": 32,
+        "student_writes": 16,
+        "recommendations": 16,
+        "auth": 8,
+    }
+    admission_queue_sizes: dict[str, int] = {
+        "catalog": 128,
+        "student_reads": 64,
+        "student_writes": 32,
+        "recommendations": 16,
+        "auth": 32,
+    }
+    admission_queue_timeout_seconds: float = 2.0
+    admission_retry_after_seconds: int = 1
+    catalog_file: str = ""
+    catalog_check_interval_seconds: float = 1.0
+    bookmarks_cookie_max_age_seconds: int = 300
 
     model_config = SettingsConfigDict(env_file="../.env")
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Returns the app constants, reading the environment and env file the
+    first time only."""
+    return Settings()
@@ -2,7 +2,7 @@
 Functions to interact with the db for auth
 """
 
-from neo4j import Driver
+from neo4j import Driver, RoutingControl
 
 from ..queries.auth_cypher_queries import REGISTER_USER
 from ..models.student import StudentDB
@@ -22,5 +22,6 @@ def register_student(new_student: StudentDB, hashed_password: str, driver: Drive
         last_name=new_student.last_name,
         year_of_study=new_student.year_of_study,
         disciplines=new_student.disciplines,
+        routing_=RoutingControl.WRITE,
         database_="neo4j",
     )
@@ -0,0 +1,203 @@
+"""
+Causal consistency of each student's own reads and writes.
+
+The db functions route their reads to the followers and read replicas of the
+cluster and their writes to the leader. A replica may lag behind the leader,
+so a student reading right after a write could otherwise miss it. Each student
+gets a bookmark manager holding the bookmarks of their writes, and the
+queries run while it is the current one wait for the replica to have caught
+up with them.
+
+use_student_bookmarks makes a student's bookmark manager the current one, in
+a contextvar, so it is picked up by every query run on the student's behalf,
+including the queries run from worker threads in a copy of the context. Reads
+made on behalf of no student, such as the catalog reads, carry no bookmarks
+and never wait for the replicas to catch up with writes they do not depend on.
+
+The managers are kept per process, for the students seen most recently. So
+that a student's next request sees their writes whichever worker serves it,
+their bookmarks also travel with them: the bookmarks of the student a request
+was made on behalf of are returned to the client in a signed token, in the
+Bookmarks header and the bookmarks cookie, and the token a request carries in
+either is added to the student's bookmark manager when the request is made on
+behalf of that student, as in BookmarksMiddleware.
+
+The token is signed with the secret_key setting and names the student it was
+issued for, so clients can neither forge bookmarks, which would make the
+replicas wait for writes that never happened, nor pass theirs to another
+student. The remaining limits:
+
+- Clients that drop the token, such as clients without a cookie jar that
+  ignore the header, only read their own writes on the worker that served
+  them, until the replicas catch up.
+- A request made on behalf of several students, such as a batch of
+  recommendations, returns no token.
+- Writes made on a student's behalf by someone else, such as an advisor,
+  only reach the student's bookmarks on the worker that made them.
+"""
+
+import base64
+import collections
+import contextvars
+import hashlib
+import hmac
+import json
+import threading
+
+from neo4j import GraphDatabase
+from neo4j.api import BookmarkManager
+
+from .. import config
+
+MAX_STUDENTS = 10000
+
+current_bookmarks: contextvars.ContextVar[BookmarkManager] = contextvars.ContextVar(
+    "current_bookmarks", default=None
+)
+
+
+class RequestBookmarks:  # pylint: disable=too-few-public-methods
+    """The bookmarks a request received and the student it was made for.
+
+    The object is shared by the copies of the request's context, so the
+    student set from a worker thread is seen by the middleware.
+
+    Attributes:
+      token:
+        The bookmarks token the request carried, None if it carried none.
+      student_id:
+        The student the request was made on behalf of, None if it was made
+        on behalf of none or of several.
+      manager:
+        The bookmark manager of that student.
+      several_students:
+        Whether the request was made on behalf of several students.
+    """
+
+    def __init__(self, token: str = None):
+        self.token: str = token
+        self.student_id: str = None
+        self.manager: BookmarkManager = None
+        self.several_students: bool = False
+
+    def use(self, student_id: str, manager: BookmarkManager):
+        """Records the student the request is made on behalf of, and adds
+        the bookmarks the request carried for them to their manager."""
+        if self.several_students or self.student_id == student_id:
+            return
+
+        if self.student_id is not None:
+            self.several_students = True
+            self.student_id = self.manager = None
+            return
+
+        self.student_id = student_id
+        self.manager = manager
+
+        if self.token is not None:
+            manager.update_bookmarks((), decode_bookmarks(self.token, student_id))
+
+    def response_token(self) -> str:
+        """Returns the token of the student's bookmarks, None if there is
+        no single student or they have no bookmarks."""
+        if self.manager is None:
+            return None
+
+        bookmarks: set[str] = self.manager.get_bookmarks()
+
+        return encode_bookmarks(self.student_id, bookmarks) if bookmarks else None
+
+
+current_request_bookmarks: contextvars.ContextVar[RequestBookmarks] = contextvars.ContextVar(
+    "current_request_bookmarks", default=None
+)
+
+
+class StudentBookmarks:
+    """The bookmark managers of the students seen most recently.
+
+    Attributes:
+      max_students:
+        The number of students whose bookmarks are kept. The least recently
+        used are dropped first.
+    """
+
+    def __init__(self, max_students: int = MAX_STUDENTS):
+        self.max_students: int = max_students
+        self.managers: collections.OrderedDict[str, BookmarkManager] = (
+            collections.OrderedDict()
+        )
+        self.lock: threading.Lock = threading.Lock()
+
+    def get(self, student_id: str) -> BookmarkManager:
+        """Returns the bookmark manager of a student, creating it if needed."""
+        with self.lock:
+            manager: BookmarkManager = self.managers.get(student_id)
+
+            if manager is None:
+                manager = GraphDatabase.bookmark_manager()
+                self.managers[student_id] = manager
+
+                if len(self.managers) > self.max_students:
+                    self.managers.popitem(last=False)
+            else:
+                self.managers.move_to_end(student_id)
+
+            return manager
+
+
+student_bookmarks: StudentBookmarks = StudentBookmarks()
+
+
+def use_student_bookmarks(student_id: str) -> BookmarkManager:
+    """Runs the queries to come in the current context on behalf of a student.
+
+    Returns:
+      The bookmark manager of the student.
+    """
+    manager: BookmarkManager = student_bookmarks.get(student_id)
+    current_bookmarks.set(manager)
+    request: RequestBookmarks = current_request_bookmarks.get()
+
+    if request is not None:
+        request.use(student_id, manager)
+
+    return manager
+
+
+def encode_bookmarks(student_id: str, bookmarks: set[str]) -> str:
+    """Encodes the bookmarks of a student as a signed token."""
+    payload: bytes = base64.urlsafe_b64encode(
+        json.dumps({"student_id": student_id, "bookmarks": sorted(bookmarks)}).encode("utf-8")
+    )
+
+    return f"{payload.decode('ascii')}.{_signature(payload)}"
+
+
+def decode_bookmarks(token: str, student_id: str) -> list[str]:
+    """Decodes the bookmarks of a student from a signed token.
+
+    Returns:
+      The bookmarks, none if the token is not a valid token of the student.
+    """
+    payload, _, signature = token.encode("ascii", "replace").partition(b".")
+
+    if not hmac.compare_digest(signature, _signature(payload).encode("ascii")):
+        return []
+
+    try:
+        content: dict[str, any] = json.loads(base64.urlsafe_b64decode(payload))
+    except ValueError:
+        return []
+
+    if not isinstance(content, dict) or content.get("student_id") != student_id:
+        return []
+
+    return [bookmark for bookmark in content.get("bookmarks", []) if isinstance(bookmark, str)]
+
+
+def _signature(payload: bytes) -> str:
+    """Signs a token payload with the secret_key setting."""
+    return hmac.new(
+        config.get_settings().secret_key.encode("utf-8"), payload, hashlib.sha256
+    ).hexdigest()
@@ -0,0 +1,514 @@
+"""
+Read-only binary catalog of the modules, memory-mapped by every worker.
+
+The catalog holds the modules, their prerequisite groups and their mutually
+exclusive modules, as built from the Module, PrerequisiteGroup and
+MUTUALLY_EXCLUSIVE parts of the graph by write_catalog. Every worker maps the
+same file with MappedCatalog, so the catalog lives once in the page cache
+rather than once per worker, and the memory private to each worker stays flat
+whatever the size of the catalog. Lookups read the mapped arrays in place and
+only decode the strings they return.
+
+The file is little-endian and laid out as a header followed by sections, each
+aligned to 8 bytes:
+
+  strings       u32 offsets of each string into the string data, plus the end
+  string data   UTF-8 bytes of every distinct string
+  modules       7 u32 per module: the string ids of the course code, name,
+                info, faculty and grade type, the academic units and the
+                broadening and deepening flag, NONE standing for null
+  sorted        u32 module indices in increasing course code order
+  prerequisites u32 offsets of each module's groups into the groups, plus the end
+  groups        u32 offsets of each group's members into the members, plus the end
+  members       u32 string ids of the course codes of the groups
+  exclusives    u32 offsets of each module's exclusives, plus the end
+  exclusive ids u32 string ids of the mutually exclusive course codes
+  faculties     u32 string ids of the distinct faculties, in module order
+
+Rebuilds write a new file next to the old one and swap it in with os.replace,
+so readers see either the old or the new catalog, never a partial one.
+CatalogFile remaps the file once it has been swapped.
+"""
+
+import bisect
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from mmap import ACCESS_READ, mmap
+
+from ..models.module import MODULE_RELATIONS, Module, ModuleCourseCodeAndName, ModuleFieldset
+from ..tracing import traced_methods
+
+MAGIC = b"M2SCATLG"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIIIQ10Q")
+NONE = 0xFFFFFFFF
+MODULE_WORDS = 7
+SECTIONS = (
+    "string_offsets",
+    "string_data",
+    "modules",
+    "sorted",
+    "prerequisite_offsets",
+    "group_offsets",
+    "members",
+    "exclusive_offsets",
+    "exclusives",
+    "faculties",
+)
+
+
+class CatalogFormatError(ValueError):
+    """Raised when a file is not a catalog of a supported version."""
+
+
+def write_catalog(path: str, modules: list[Module], generation: int = None):
+    """Writes the catalog of a list of modules and swaps it in atomically.
+
+    Args:
+      path:
+        The path of the catalog.
+      modules:
+        The modules, with their prerequisites and mutually exclusives, in the
+        order the catalog lists them.
+      generation:
+        A number identifying the build. Defaults to the current time in
+        nanoseconds.
+    """
+    strings: dict[str, int] = {}
+
+    def string_id(value: str) -> int:
+        if value is None:
+            return NONE
+        return strings.setdefault(value, len(strings))
+
+    module_words: list[int] = []
+    prerequisite_offsets: list[int] = [0]
+    group_offsets: list[int] = [0]
+    members: list[int] = []
+    exclusive_offsets: list[int] = [0]
+    exclusives: list[int] = []
+    faculties: dict[int, None] = {}
+
+    for module in modules:
+        module_words.extend(
+            [
+                string_id(module.course_code),
+                string_id(module.course_name),
+                string_id(module.course_info),
+                string_id(module.faculty),
+                string_id(module.grade_type),
+                NONE if module.academic_units is None else module.academic_units,
+                (
+                    NONE
+                    if module.broadening_and_deepening is None
+                    else int(module.broadening_and_deepening)
+                ),
+            ]
+        )
+
+        for group in module.prerequisites:
+            members.extend(string_id(course_code) for course_code in group)
+            group_offsets.append(len(members))
+        prerequisite_offsets.append(len(group_offsets) - 1)
+
+        exclusives.extend(string_id(course_code) for course_code in module.mutually_exclusives)
+        exclusive_offsets.append(len(exclusives))
+
+        if module.faculty is not None:
+            faculties[string_id(module.faculty)] = None
+
+    encoded: list[bytes] = [value.encode("utf-8") for value in strings]
+    string_offsets: list[int] = [0]
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    sections: list[bytes] = [
+        _u32_array(string_offsets),
+        b"".join(encoded),
+        _u32_array(module_words),
+        _u32_array(
+            sorted(range(len(modules)), key=lambda index: modules[index].course_code)
+        ),
+        _u32_array(prerequisite_offsets),
+        _u32_array(group_offsets),
+        _u32_array(members),
+        _u32_array(exclusive_offsets),
+        _u32_array(exclusives),
+        _u32_array(list(faculties)),
+    ]
+
+    offsets: list[int] = []
+    position: int = _aligned(HEADER.size)
+    for section in sections:
+        offsets.append(position)
+        position = _aligned(position + len(section))
+
+    directory: str = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(
+        dir=directory, prefix=".catalog-", delete=False
+    ) as catalog:
+        catalog.write(
+            HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                len(modules),
+                len(strings),
+                0,
+                time.time_ns() if generation is None else generation,
+                *offsets,
+            )
+        )
+        for offset, section in zip(offsets, sections):
+            catalog.write(b"\0" * (offset - catalog.tell()))
+            catalog.write(section)
+        catalog.flush()
+        os.fsync(catalog.fileno())
+
+    os.replace(catalog.name, path)
+
+
+class MappedCatalog:
+    """A catalog file mapped into memory.
+
+    Attributes:
+      path:
+        The path the catalog was opened from.
+      generation:
+        The number identifying the build of the catalog.
+      identity:
+        The device and inode of the mapped file.
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise CatalogFormatError("Catalogs can only be mapped on little-endian hosts")
+
+        self.path: str = path
+
+        with open(path, "rb") as catalog:
+            stat: os.stat_result = os.fstat(catalog.fileno())
+            self.identity: tuple[int, int] = (stat.st_dev, stat.st_ino)
+            self.mapping: mmap = mmap(catalog.fileno(), 0, access=ACCESS_READ)
+
+        if len(self.mapping) < HEADER.size:
+            raise CatalogFormatError(f"{path} is not a catalog")
+
+        magic, version, module_count, string_count, _, generation, *offsets = (
+            HEADER.unpack_from(self.mapping)
+        )
+
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise CatalogFormatError(f"{path} is not a version {FORMAT_VERSION} catalog")
+
+        self.generation: int = generation
+        self.module_count: int = module_count
+        view: memoryview = memoryview(self.mapping)
+        ends: list[int] = offsets[1:] + [len(self.mapping)]
+        sections: dict[str, memoryview] = {
+            name: view[start:end] for name, start, end in zip(SECTIONS, offsets, ends)
+        }
+        counts: dict[str, int] = {
+            "string_offsets": string_count + 1,
+            "modules": module_count * MODULE_WORDS,
+            "sorted": module_count,
+            "prerequisite_offsets": module_count + 1,
+            "exclusive_offsets": module_count + 1,
+        }
+
+        self.string_data: memoryview = sections["string_data"]
+        self.string_offsets = _u32_view(sections["string_offsets"], counts["string_offsets"])
+        self.modules = _u32_view(sections["modules"], counts["modules"])
+        self.sorted = _u32_view(sections["sorted"], counts["sorted"])
+        self.prerequisite_offsets = _u32_view(
+            sections["prerequisite_offsets"], counts["prerequisite_offsets"]
+        )
+        self.group_offsets = _u32_view(
+            sections["group_offsets"], self.prerequisite_offsets[-1] + 1
+        )
+        self.members = _u32_view(sections["members"], self.group_offsets[-1])
+        self.exclusive_offsets = _u32_view(
+            sections["exclusive_offsets"], counts["exclusive_offsets"]
+        )
+        self.exclusives = _u32_view(sections["exclusives"], self.exclusive_offsets[-1])
+        self.faculties = _u32_view(
+            sections["faculties"], len(sections["faculties"]) // 4
+        )
+        self.sorted_codes: _SortedCodes = _SortedCodes(
+            self.modules, self.sorted, self.string_offsets, self.string_data
+        )
+
+    def __len__(self) -> int:
+        return self.module_count
+
+    def string(self, string_id: int) -> str:
+        """Decodes a string of the string table, None for NONE."""
+        if string_id == NONE:
+            return None
+
+        return str(
+            self.string_data[
+                self.string_offsets[string_id] : self.string_offsets[string_id + 1]
+            ],
+            "utf-8",
+        )
+
+    def index_of(self, course_code: str) -> int:
+        """Returns the index of a module, None if it is not in the catalog."""
+        if course_code is None:
+            return None
+
+        code: bytes = course_code.encode("utf-8")
+        position: int = bisect.bisect_left(self.sorted_codes, code)
+
+        if position < self.module_count and self.sorted_codes[position] == code:
+            return self.sorted[position]
+
+        return None
+
+    def course_code(self, index: int) -> str:
+        """Returns the course code of the module at an index."""
+        return self.string(self.modules[index * MODULE_WORDS])
+
+    def module(
+        self, index: int, total: int = None, relations: tuple[str, ...] = MODULE_RELATIONS
+    ) -> Module:
+        """Returns the module at an index, with its prerequisites and mutually
+        exclusives, or those of them in relations."""
+        words = self.modules[index * MODULE_WORDS : (index + 1) * MODULE_WORDS]
+
+        return Module(
+            course_code=self.string(words[0]),
+            course_name=self.string(words[1]),
+            course_info=self.string(words[2]),
+            faculty=self.string(words[3]),
+            grade_type=self.string(words[4]),
+            academic_units=None if words[5] == NONE else words[5],
+            broadening_and_deepening=None if words[6] == NONE else bool(words[6]),
+            total=total,
+            prerequisites=(
+                self.prerequisite_groups(index) if "prerequisites" in relations else []
+            ),
+            mutually_exclusives=(
+                self.mutually_exclusives(index) if "mutually_exclusives" in relations else []
+            ),
+        )
+
+    def prerequisite_groups(self, index: int) -> list[list[str]]:
+        """Returns the prerequisite groups of the module at an index."""
+        return [
+            [
+                self.string(member)
+                for member in self.members[
+                    self.group_offsets[group] : self.group_offsets[group + 1]
+                ]
+            ]
+            for group in range(
+                self.prerequisite_offsets[index], self.prerequisite_offsets[index + 1]
+            )
+        ]
+
+    def mutually_exclusives(self, index: int) -> list[str]:
+        """Returns the mutually exclusive course codes of the module at an index."""
+        return [
+            self.string(exclusive)
+            for exclusive in self.exclusives[
+                self.exclusive_offsets[index] : self.exclusive_offsets[index + 1]
+            ]
+        ]
+
+    def faculty_names(self) -> list[str]:
+        """Returns the distinct faculties, in module order."""
+        return [self.string(faculty) for faculty in self.faculties]
+
+    def faculty_of(self, index: int) -> str:
+        """Returns the faculty of the module at an index."""
+        return self.string(self.modules[index * MODULE_WORDS + 3])
+
+    def course_name(self, index: int) -> str:
+        """Returns the name of the module at an index."""
+        return self.string(self.modules[index * MODULE_WORDS + 1])
+
+
+class CatalogFile:
+    """The latest catalog at a path, remapped after the file is swapped.
+
+    The path is checked for a new file at most once per check interval, and
+    the previous mapping is released once the requests reading it are done.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path: str = path
+        self.check_interval: float = check_interval
+        self.catalog: MappedCatalog = MappedCatalog(path)
+        self.checked_at: float = time.monotonic()
+        self.lock: threading.Lock = threading.Lock()
+
+    def current(self) -> MappedCatalog:
+        """Returns the latest catalog."""
+        now: float = time.monotonic()
+
+        if now - self.checked_at < self.check_interval:
+            return self.catalog
+
+        with self.lock:
+            if now - self.checked_at >= self.check_interval:
+                self.checked_at = now
+                stat: os.stat_result = os.stat(self.path)
+
+                if (stat.st_dev, stat.st_ino) != self.catalog.identity:
+                    self.catalog = MappedCatalog(self.path)
+
+        return self.catalog
+
+
+@traced_methods("repository")
+class CatalogRepository:
+    """Repository serving the catalog reads from a catalog file.
+
+    Every other operation, including the full-text search_modules, is
+    delegated to the wrapped repository.
+
+    Attributes:
+      repo:
+        The wrapped repository.
+      catalog_file:
+        The catalog file the catalog reads are served from.
+    """
+
+    def __init__(self, repo, catalog_file: CatalogFile):
+        self.repo = repo
+        self.catalog_file: CatalogFile = catalog_file
+
+    def __getattr__(self, name: str):
+        return getattr(self.repo, name)
+
+    def get_modules(
+        self, skip: int, limit: int, fieldset: ModuleFieldset = None
+    ) -> list[Module]:
+        """See module_db.get_modules.
+
+        The catalog holds every field, so only the relations of the fieldset
+        are decoded and the fields are left to be trimmed from the response.
+        """
+        catalog: MappedCatalog = self.catalog_file.current()
+        relations: tuple[str, ...] = (
+            MODULE_RELATIONS if fieldset is None else fieldset.relations()
+        )
+
+        return [
+            catalog.module(index, total=len(catalog), relations=relations)
+            for index in range(skip, min(skip + limit, len(catalog)))
+        ]
+
+    def get_modules_based_on_course_codes(self, course_codes: list[str]) -> list[Module]:
+        """See module_db.get_modules_based_on_course_codes."""
+        catalog: MappedCatalog = self.catalog_file.current()
+        indices: list[int] = [catalog.index_of(course_code) for course_code in course_codes]
+
+        return [catalog.module(index) for index in indices if index is not None]
+
+    def get_prerequisite_groups_for_each_module(self, course_code: str) -> list[list[str]]:
+        """See module_db.get_prerequisite_groups_for_each_module."""
+        catalog: MappedCatalog = self.catalog_file.current()
+        index: int = catalog.index_of(course_code)
+
+        return [] if index is None else catalog.prerequisite_groups(index)
+
+    def get_mutually_exclusives_for_each_module(self, course_code: str) -> list[str]:
+        """See module_db.get_mutually_exclusives_for_each_module."""
+        catalog: MappedCatalog = self.catalog_file.current()
+        index: int = catalog.index_of(course_code)
+
+        return [] if index is None else catalog.mutually_exclusives(index)
+
+    def get_module(self, course_code: str, fieldset: ModuleFieldset = None) -> Module:
+        """See module_db.get_module."""
+        catalog: MappedCatalog = self.catalog_file.current()
+        index: int = catalog.index_of(course_code)
+        relations: tuple[str, ...] = (
+            MODULE_RELATIONS if fieldset is None else fieldset.relations()
+        )
+
+        return None if index is None else catalog.module(index, relations=relations)
+
+    def get_modules_course_codes(self) -> list[str]:
+        """See module_db.get_modules_course_codes."""
+        catalog: MappedCatalog = self.catalog_file.current()
+
+        return [catalog.course_code(index) for index in range(len(catalog))]
+
+    def get_faculties(self) -> list[str]:
+        """See module_db.get_faculties."""
+        return self.catalog_file.current().faculty_names()
+
+    def get_modules_in_a_faculty(self, faculty: str) -> list[ModuleCourseCodeAndName]:
+        """See module_db.get_modules_in_a_faculty."""
+        catalog: MappedCatalog = self.catalog_file.current()
+
+        return [
+            ModuleCourseCodeAndName(
+                course_code=catalog.course_code(index), course_name=catalog.course_name(index)
+            )
+            for index in range(len(catalog))
+            if catalog.faculty_of(index) == faculty
+        ]
+
+    def get_total_number_of_modules(self) -> int:
+        """See module_db.get_total_number_of_modules."""
+        return len(self.catalog_file.current())
+
+    def search_for_modules(self, modules: list[str]) -> list[str]:
+        """See module_db.search_for_modules."""
+        catalog: MappedCatalog = self.catalog_file.current()
+
+        return [
+            course_code for course_code in modules if catalog.index_of(course_code) is not None
+        ]
+
+
+class _SortedCodes:  # pylint: disable=too-few-public-methods
+    """The course codes of a catalog in increasing order, as a sequence of
+    bytes for bisect, read from the mapping on access."""
+
+    def __init__(
+        self,
+        modules: memoryview,
+        sorted_indices: memoryview,
+        string_offsets: memoryview,
+        string_data: memoryview,
+    ):
+        self.modules: memoryview = modules
+        self.sorted_indices: memoryview = sorted_indices
+        self.string_offsets: memoryview = string_offsets
+        self.string_data: memoryview = string_data
+
+    def __len__(self) -> int:
+        return len(self.sorted_indices)
+
+    def __getitem__(self, position: int) -> bytes:
+        string_id: int = self.modules[self.sorted_indices[position] * MODULE_WORDS]
+
+        return bytes(
+            self.string_data[
+                self.string_offsets[string_id] : self.string_offsets[string_id + 1]
+            ]
+        )
+
+
+def _u32_array(values: list[int]) -> bytes:
+    """Packs integers as little-endian u32."""
+    return struct.pack(f"<{len(values)}I", *values)
+
+
+def _u32_view(section: memoryview, count: int) -> memoryview:
+    """Views the first integers of a section as u32, without copying."""
+    return section[: count * 4].cast("I")
+
+
+def _aligned(position: int) -> int:
+    """Rounds a file position up to the next multiple of 8."""
+    return (position + 7) & ~7
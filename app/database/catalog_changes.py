@@ -0,0 +1,306 @@
+"""
+Versions of the catalog file and the log of the changes between them.
+
+Clients keeping a local copy of the catalog pick up its changes from the
+modules, prerequisite groups and mutually exclusives that changed since the
+version they hold, rather than downloading the catalog again.
+
+Each build of the catalog by write_versioned_catalog is a version, one more
+than the version of the catalog it replaces. The first build starts from the
+current time in nanoseconds, so that versions keep increasing if the catalog
+is ever lost. The version is the generation of the catalog file.
+
+The build compares the new catalog with the one it replaces and appends the
+course codes of what changed to a change log kept next to the catalog, as
+JSON:
+
+  {"base": 41, "versions": [{"version": 42, "modules": [...],
+    "prerequisites": [...], "mutually_exclusives": [...], "removed": [...]}]}
+
+The log only holds course codes; the changed modules are read from the
+current catalog when the changes are asked for. The changes of every version
+after base are logged, and the oldest versions are dropped once the log holds
+more than a given number of changes, raising base. Clients holding a version
+older than base, or a version the log cannot account for, have to download
+the catalog again.
+
+The log is swapped in before the catalog, so the log read along with a
+catalog is never older than it.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from ..models.module import CatalogChanges, Module
+from ..tracing import traced_methods
+from .catalog import CatalogFile, CatalogFormatError, MappedCatalog, write_catalog
+
+CHANGE_LOG_MAX_CHANGES = 10000
+CHANGED_PARTS: tuple[str, ...] = ("modules", "prerequisites", "mutually_exclusives")
+PROPERTIES_EXCLUDED: set[str] = {"total", "score", "prerequisites", "mutually_exclusives"}
+
+
+def change_log_path(catalog_path: str) -> str:
+    """Returns the path of the change log of a catalog."""
+    return f"{catalog_path}.changes"
+
+
+class ChangeLog:
+    """The course codes changed by each version of the catalog.
+
+    Attributes:
+      base:
+        The version the changes are logged from. The changes of every later
+        version are logged.
+      versions:
+        The changes of each version, oldest first, as dicts of the course
+        codes of each changed part and of those removed.
+    """
+
+    def __init__(self, base: int, versions: list[dict[str, any]] = None):
+        self.base: int = base
+        self.versions: list[dict[str, any]] = versions or []
+
+    @classmethod
+    def read(cls, path: str) -> "ChangeLog":
+        """Reads a change log.
+
+        Returns:
+          The change log, None if there is none or it cannot be read.
+        """
+        try:
+            with open(path, encoding="utf-8") as log:
+                content: dict[str, any] = json.load(log)
+
+            return cls(content["base"], content["versions"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def write(self, path: str):
+        """Writes the change log and swaps it in atomically."""
+        directory: str = os.path.dirname(os.path.abspath(path))
+
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=directory, prefix=".catalog-changes-", delete=False
+        ) as log:
+            json.dump(
+                {"base": self.base, "versions": self.versions}, log, separators=(",", ":")
+            )
+            log.flush()
+            os.fsync(log.fileno())
+
+        os.replace(log.name, path)
+
+    def latest(self) -> int:
+        """Returns the latest version logged."""
+        return self.versions[-1]["version"] if self.versions else self.base
+
+    def append(self, version: int, changes: dict[str, list[str]], max_changes: int):
+        """Logs the changes of a version, dropping the oldest versions if the
+        log then holds more than max_changes changes."""
+        self.versions.append({"version": version, **changes})
+        logged: int = sum(_change_count(logged) for logged in self.versions)
+
+        while self.versions and logged > max_changes:
+            dropped: dict[str, any] = self.versions.pop(0)
+            logged -= _change_count(dropped)
+            self.base = dropped["version"]
+
+    def since(self, version: int, current: int) -> dict[str, set[str]]:
+        """Merges the changes made after a version, up to the current one.
+
+        Returns:
+          The course codes of each changed part and of those removed, None if
+          the changes are not all logged.
+        """
+        if version < self.base or version > current or self.latest() < current:
+            return None
+
+        changed: dict[str, set[str]] = {part: set() for part in (*CHANGED_PARTS, "removed")}
+
+        for logged in self.versions:
+            if not version < logged["version"] <= current:
+                continue
+
+            for course_code in logged["removed"]:
+                for part in CHANGED_PARTS:
+                    changed[part].discard(course_code)
+                changed["removed"].add(course_code)
+
+            for part in CHANGED_PARTS:
+                changed[part].update(logged[part])
+                changed["removed"].difference_update(logged[part])
+
+        return changed
+
+
+def diff_catalog(previous: MappedCatalog, modules: list[Module]) -> dict[str, list[str]]:
+    """Compares a catalog with the modules replacing it.
+
+    The order of the prerequisite groups, of their members and of the mutually
+    exclusives is not significant.
+
+    Returns:
+      The course codes of each changed part and of those removed. Added
+      modules count as changed in every part.
+    """
+    changes: dict[str, list[str]] = {part: [] for part in (*CHANGED_PARTS, "removed")}
+    course_codes: set[str] = set()
+
+    for module in modules:
+        course_codes.add(module.course_code)
+        index: int = previous.index_of(module.course_code)
+
+        if index is None:
+            for part in CHANGED_PARTS:
+                changes[part].append(module.course_code)
+            continue
+
+        if previous.module(index, relations=()).model_dump(
+            exclude=PROPERTIES_EXCLUDED
+        ) != module.model_dump(exclude=PROPERTIES_EXCLUDED):
+            changes["modules"].append(module.course_code)
+
+        if _normalized_groups(previous.prerequisite_groups(index)) != _normalized_groups(
+            module.prerequisites
+        ):
+            changes["prerequisites"].append(module.course_code)
+
+        if sorted(previous.mutually_exclusives(index)) != sorted(module.mutually_exclusives):
+            changes["mutually_exclusives"].append(module.course_code)
+
+    changes["removed"] = [
+        course_code
+        for course_code in map(previous.course_code, range(len(previous)))
+        if course_code not in course_codes
+    ]
+
+    return changes
+
+
+def write_versioned_catalog(
+    path: str, modules: list[Module], max_changes: int = CHANGE_LOG_MAX_CHANGES
+) -> int:
+    """Writes the next version of a catalog and logs its changes.
+
+    Args:
+      path:
+        The path of the catalog.
+      modules:
+        The modules, with their prerequisites and mutually exclusives.
+      max_changes:
+        The number of changes the log holds at most.
+
+    Returns:
+      The version written.
+    """
+    log_path: str = change_log_path(path)
+
+    try:
+        previous: MappedCatalog = MappedCatalog(path)
+    except (OSError, CatalogFormatError):
+        previous = None
+
+    if previous is None:
+        version: int = time.time_ns()
+        log: ChangeLog = ChangeLog(version)
+    else:
+        version = previous.generation + 1
+        log = ChangeLog.read(log_path)
+
+        if log is not None:
+            # Forgets the versions of a build that failed to swap its catalog in.
+            log.versions = [
+                logged for logged in log.versions if logged["version"] <= previous.generation
+            ]
+
+        if log is None or log.latest() != previous.generation:
+            log = ChangeLog(previous.generation)
+
+        log.append(version, diff_catalog(previous, modules), max_changes)
+
+    log.write(log_path)
+    write_catalog(path, modules, generation=version)
+
+    return version
+
+
+@traced_methods("repository")
+class VersionedCatalog:
+    """The changes of a catalog file, read from its change log.
+
+    Attributes:
+      catalog_file:
+        The catalog file the changed modules are read from.
+    """
+
+    def __init__(self, catalog_file: CatalogFile):
+        self.catalog_file: CatalogFile = catalog_file
+        self.log: ChangeLog = None
+        self.log_identity: tuple[int, int] = None
+        self.lock: threading.Lock = threading.Lock()
+
+    def current(self) -> tuple[MappedCatalog, ChangeLog]:
+        """Returns the latest catalog and its change log, reading the log
+        again once the catalog has been swapped."""
+        catalog: MappedCatalog = self.catalog_file.current()
+
+        with self.lock:
+            if self.log_identity != catalog.identity:
+                self.log = ChangeLog.read(change_log_path(self.catalog_file.path))
+                self.log_identity = catalog.identity
+
+            return catalog, self.log
+
+    def get_catalog_changes(self, since: int) -> CatalogChanges:
+        """Returns the changes of the catalog since a version.
+
+        Args:
+          since:
+            The version of the catalog the changes are wanted from.
+
+        Returns:
+          The changes, or a full resync if they are not all logged.
+        """
+        catalog, log = self.current()
+        changed: dict[str, set[str]] = (
+            None if log is None else log.since(since, catalog.generation)
+        )
+
+        if changed is None:
+            return CatalogChanges(version=catalog.generation, full_resync=True)
+
+        def indices(part: str) -> list[tuple[str, int]]:
+            found: list[tuple[str, int]] = [
+                (course_code, catalog.index_of(course_code))
+                for course_code in sorted(changed[part])
+            ]
+
+            return [(course_code, index) for course_code, index in found if index is not None]
+
+        return CatalogChanges(
+            version=catalog.generation,
+            modules=[catalog.module(index, relations=()) for _, index in indices("modules")],
+            prerequisites={
+                course_code: catalog.prerequisite_groups(index)
+                for course_code, index in indices("prerequisites")
+            },
+            mutually_exclusives={
+                course_code: catalog.mutually_exclusives(index)
+                for course_code, index in indices("mutually_exclusives")
+            },
+            removed=sorted(changed["removed"]),
+        )
+
+
+def _change_count(changes: dict[str, any]) -> int:
+    """Counts the course codes logged for a version."""
+    return sum(len(changes[part]) for part in (*CHANGED_PARTS, "removed"))
+
+
+def _normalized_groups(groups: list[list[str]]) -> list[list[str]]:
+    """Sorts prerequisite groups and their members, for comparison."""
+    return sorted(sorted(group) for group in groups)
@@ -0,0 +1,475 @@
+"""
+Instrumentation of the Cypher queries run on behalf of each request.
+
+get_db_driver hands out an InstrumentedDriver, which records the name, duration
+and row count of every execute_query call into the RequestQueries of the
+current request. The current request is tracked by a contextvar, so calls made
+from worker threads are attributed to the request as long as the thread runs
+in a copy of the request's context. Calls made outside of any request are not
+recorded.
+
+Queries are named after the constant of the queries package that holds their
+text, such as "module.GET_MODULE". Queries built at runtime from a template of
+the queries package, such as sparse projections, are named with
+register_query. The duration of every query, in a request or
+not, is also observed in the cypher_query_duration_seconds histogram, and the
+connection pool of every InstrumentedDriver is reported in the metrics.
+
+Every query also runs in a tracing span carrying its name and row count.
+
+Queries slower than the slow_query_threshold_ms setting are logged with their
+redacted parameters, including those that fail, such as the queries timed out
+by the db. If the slow_query_plan_dir setting is set, the plan of a query is
+also written to that directory the first time a query of its name is slow.
+The plan is captured by a background thread, so that the extra round-trip
+does not add to the request that was already slow.
+
+Queries that do not pass a bookmark_manager_ run with the bookmarks of the
+current student, if any, as set by use_student_bookmarks. Reads made on behalf
+of no student run without bookmarks, and writes with the driver's default
+bookmark manager.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from neo4j import Driver, Query, RoutingControl
+
+from .. import config
+
+from ..metrics import (
+    CYPHER_QUERY_DURATION,
+    NEO4J_POOL_ACQUIRE_WAIT,
+    NEO4J_POOL_CONNECTIONS,
+    NEO4J_POOL_MAX_SIZE,
+    Histogram,
+    register_collector,
+)
+from ..queries import (
+    auth_cypher_queries,
+    module_cypher_queries,
+    rec_cypher_queries,
+    student_cypher_queries,
+)
+from ..tracing import span
+from .bookmarks import current_bookmarks
+
+UNKNOWN_QUERY = "unknown"
+
+QUERY_NAMES: dict[str, str] = {
+    value: f"{module.__name__.rsplit('.', 1)[-1].removesuffix('_cypher_queries')}.{name}"
+    for module in (
+        auth_cypher_queries,
+        module_cypher_queries,
+        rec_cypher_queries,
+        student_cypher_queries,
+    )
+    for name, value in vars(module).items()
+    if name.isupper() and isinstance(value, str) and not name.endswith("_TEMPLATE")
+}
+QUERY_DURATIONS: dict[str, Histogram] = {
+    name: CYPHER_QUERY_DURATION.labels(name)
+    for name in [*QUERY_NAMES.values(), UNKNOWN_QUERY]
+}
+
+REDACTED_PARAMETERS = re.compile(
+    r"email|password|secret|token|first_name|last_name", re.IGNORECASE
+)
+REDACTED = "<redacted>"
+MAX_LOGGED_ITEMS = 10
+MAX_LOGGED_STRING_LENGTH = 100
+PLAN_MODES = ("EXPLAIN", "PROFILE")
+WRITE_CLAUSES = re.compile(r"\b(CREATE|MERGE|SET|DELETE|REMOVE|DROP)\b", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+instrumented_drivers: weakref.WeakSet = weakref.WeakSet()
+captured_plans: set[str] = set()
+captured_plans_lock: threading.Lock = threading.Lock()
+plan_capture_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="slow-query-plans"
+)
+
+
+class QueryCeilingExceeded(RuntimeError):
+    """Raised when a request runs more queries than its endpoint allows."""
+
+
+class QueryRecord:  # pylint: disable=too-few-public-methods
+    """A single query run on behalf of a request.
+
+    Attributes:
+      name:
+        The name of the query.
+      duration:
+        The time taken by the query in milliseconds.
+      rows:
+        The number of records returned.
+    """
+
+    __slots__ = ("name", "duration", "rows")
+
+    def __init__(self, name: str, duration: float, rows: int):
+        self.name: str = name
+        self.duration: float = duration
+        self.rows: int = rows
+
+
+class RequestQueries:
+    """The queries run on behalf of a single request."""
+
+    def __init__(self):
+        self.records: list[QueryRecord] = []
+        self.lock: threading.Lock = threading.Lock()
+
+    def add(self, record: QueryRecord):
+        """Records a query."""
+        with self.lock:
+            self.records.append(record)
+
+    def count(self) -> int:
+        """Returns the number of queries run so far."""
+        return len(self.records)
+
+    def total_duration(self) -> float:
+        """Returns the time taken by the queries in milliseconds."""
+        with self.lock:
+            return sum(record.duration for record in self.records)
+
+    def by_name(self) -> dict[str, dict[str, float]]:
+        """Aggregates the queries by name.
+
+        Returns:
+          The number of calls, total duration in milliseconds and total row
+          count of each query, keyed by name, slowest first.
+        """
+        totals: dict[str, dict[str, float]] = {}
+
+        with self.lock:
+            for record in self.records:
+                total: dict[str, float] = totals.setdefault(
+                    record.name, {"calls": 0, "duration": 0.0, "rows": 0}
+                )
+                total["calls"] += 1
+                total["duration"] += record.duration
+                total["rows"] += record.rows
+
+        return dict(
+            sorted(totals.items(), key=lambda item: item[1]["duration"], reverse=True)
+        )
+
+
+current_queries: contextvars.ContextVar[RequestQueries] = contextvars.ContextVar(
+    "current_queries", default=None
+)
+
+
+class InstrumentedDriver:
+    """Wraps a neo4j.Driver to record the queries run on behalf of requests.
+
+    Everything but execute_query is delegated to the wrapped driver as is. The
+    time spent acquiring connections from the driver's pool is measured by
+    wrapping the pool's acquire method, which is not part of the public API
+    of the driver, so it is skipped if the pool does not have one.
+
+    Attributes:
+      driver:
+        The wrapped neo4j.Driver.
+    """
+
+    def __init__(self, driver: Driver):
+        self.driver: Driver = driver
+        pool = getattr(driver, "_pool", None)
+
+        if pool is not None and callable(getattr(pool, "acquire", None)):
+            pool.acquire = _timed_acquire(pool.acquire)
+
+        instrumented_drivers.add(self)
+
+    def execute_query(self, query, *args, **kwargs):
+        """Runs a query on the wrapped driver and records it."""
+        name: str = query_name(query)
+
+        if "bookmark_manager_" not in kwargs:
+            manager = current_bookmarks.get()
+
+            if manager is not None:
+                kwargs["bookmark_manager_"] = manager
+            elif kwargs.get("routing_") == RoutingControl.READ:
+                kwargs["bookmark_manager_"] = None
+
+        start: float = time.perf_counter()
+        rows: int = 0
+        error: Exception = None
+
+        try:
+            with span(f"cypher.{name}", {"query": name}) as query_span:
+                result = self.driver.execute_query(query, *args, **kwargs)
+                records = getattr(result, "records", result)
+                rows = len(records) if isinstance(records, list) else 0
+
+                if query_span is not None:
+                    query_span.set_attribute("rows", rows)
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            duration: float = time.perf_counter() - start
+            QUERY_DURATIONS[name].observe(duration)
+            queries: RequestQueries = current_queries.get()
+
+            if queries is not None:
+                queries.add(QueryRecord(name, duration * 1000, rows))
+
+            if duration * 1000 >= config.get_settings().slow_query_threshold_ms:
+                self._report_slow_query(
+                    name, query, args, kwargs, duration * 1000, rows, error
+                )
+
+        return result
+
+    def _report_slow_query(  # pylint: disable=too-many-arguments
+        self,
+        name: str,
+        query: str | Query,
+        args: tuple,
+        kwargs: dict[str, any],
+        duration: float,
+        rows: int,
+        error: Exception = None,
+    ):
+        """Logs a slow query and captures its plan the first time it is slow.
+
+        Args:
+          error:
+            The exception the query failed with, None if it succeeded.
+        """
+        parameters: dict[str, any] = redact_parameters(query_parameters(args, kwargs))
+        extra: dict[str, any] = {
+            "query_name": name,
+            "query_parameters": parameters,
+            "query_duration_ms": duration,
+            "query_rows": rows,
+        }
+
+        if error is None:
+            logger.warning(
+                "Slow query %s took %.1fms and returned %d rows",
+                name,
+                duration,
+                rows,
+                extra=extra,
+            )
+        else:
+            logger.warning(
+                "Slow query %s failed after %.1fms with %s",
+                name,
+                duration,
+                type(error).__name__,
+                extra={**extra, "query_error": type(error).__name__},
+            )
+
+        if not config.get_settings().slow_query_plan_dir:
+            return
+
+        with captured_plans_lock:
+            if name in captured_plans:
+                return
+            captured_plans.add(name)
+
+        plan_capture_executor.submit(
+            self._capture_plan,
+            name,
+            query,
+            args,
+            dict(kwargs),
+            parameters,
+            duration,
+            rows,
+            error is not None,
+        )
+
+    def _capture_plan(  # pylint: disable=too-many-arguments
+        self,
+        name: str,
+        query: str | Query,
+        args: tuple,
+        kwargs: dict[str, any],
+        parameters: dict[str, any],
+        duration: float,
+        rows: int,
+        failed: bool = False,
+    ):
+        """Writes the plan of a query to the slow_query_plan_dir directory.
+
+        The plan is captured with the slow_query_plan_mode setting. PROFILE
+        runs the query again, so queries that write or that failed, such as
+        those that timed out, fall back to EXPLAIN.
+
+        Runs in the background, so failures are logged rather than raised.
+        """
+        try:
+            self._write_plan(name, query, args, kwargs, parameters, duration, rows, failed)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Cannot capture the plan of slow query %s", name)
+
+    def _write_plan(  # pylint: disable=too-many-arguments
+        self,
+        name: str,
+        query: str | Query,
+        args: tuple,
+        kwargs: dict[str, any],
+        parameters: dict[str, any],
+        duration: float,
+        rows: int,
+        failed: bool,
+    ):
+        """Runs the plan of a query and writes it, see _capture_plan."""
+        settings: config.Settings = config.get_settings()
+        text: str = query.text if isinstance(query, Query) else query
+        mode: str = settings.slow_query_plan_mode.upper()
+
+        if mode not in PLAN_MODES or WRITE_CLAUSES.search(text) or failed:
+            mode = "EXPLAIN"
+
+        result = self.driver.execute_query(f"{mode} {text}", *args, **kwargs)
+        summary = result.summary
+        plan = summary.profile if mode == "PROFILE" else summary.plan
+
+        os.makedirs(settings.slow_query_plan_dir, exist_ok=True)
+        path: str = os.path.join(settings.slow_query_plan_dir, f"{name}.json")
+
+        with open(path, "w", encoding="utf-8") as plan_file:
+            json.dump(
+                {
+                    "query_name": name,
+                    "query": text,
+                    "parameters": parameters,
+                    "duration_ms": duration,
+                    "rows": rows,
+                    "failed": failed,
+                    "mode": mode,
+                    "plan": plan,
+                },
+                plan_file,
+                indent=2,
+                default=str,
+            )
+
+        logger.info("Captured the plan of slow query %s in %s", name, path)
+
+    def __enter__(self) -> "InstrumentedDriver":
+        self.driver.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.driver.__exit__(*exc_info)
+
+    def __getattr__(self, name: str):
+        return getattr(self.driver, name)
+
+
+def query_name(query: str | Query) -> str:
+    """Returns the name of the queries package constant holding a query."""
+    text: str = query.text if isinstance(query, Query) else query
+
+    return QUERY_NAMES.get(text, UNKNOWN_QUERY)
+
+
+def register_query(text: str, name: str):
+    """Names a query built at runtime, after a query of the queries package.
+
+    The name must be one of QUERY_NAMES, so that its duration is observed in
+    the histogram of that query. A text that already has a name keeps it.
+    """
+    QUERY_NAMES.setdefault(text, name)
+
+
+def query_parameters(args: tuple, kwargs: dict[str, any]) -> dict[str, any]:
+    """Returns the parameters of an execute_query call.
+
+    The parameters are the parameters_ dict, passed by keyword or as the
+    first positional argument, merged with the keyword arguments that do not
+    end with an underscore, as in execute_query itself.
+    """
+    parameters: dict[str, any] = dict(
+        kwargs.get("parameters_") or (args[0] if args and isinstance(args[0], dict) else {})
+    )
+    parameters.update(
+        (key, value) for key, value in kwargs.items() if not key.endswith("_")
+    )
+
+    return parameters
+
+
+def redact_parameters(parameters: dict[str, any]) -> dict[str, any]:
+    """Makes query parameters safe and short enough to log.
+
+    Sensitive parameters, whose names match REDACTED_PARAMETERS anywhere, such
+    as student_email or hashed_password, are replaced, long lists are cut down
+    to their first items and their length, and long strings are truncated.
+    """
+    redacted: dict[str, any] = {}
+
+    for key, value in parameters.items():
+        if REDACTED_PARAMETERS.search(key):
+            redacted[key] = REDACTED
+        elif isinstance(value, (list, tuple)) and len(value) > MAX_LOGGED_ITEMS:
+            redacted[key] = {
+                "items": list(value[:MAX_LOGGED_ITEMS]),
+                "length": len(value),
+            }
+        elif isinstance(value, str) and len(value) > MAX_LOGGED_STRING_LENGTH:
+            redacted[key] = value[:MAX_LOGGED_STRING_LENGTH] + "..."
+        else:
+            redacted[key] = value
+
+    return redacted
+
+
+def _timed_acquire(acquire):
+    """Wraps the acquire method of a connection pool to time the waits."""
+
+    def timed_acquire(*args, **kwargs):
+        start: float = time.perf_counter()
+
+        try:
+            return acquire(*args, **kwargs)
+        finally:
+            NEO4J_POOL_ACQUIRE_WAIT.observe(time.perf_counter() - start)
+
+    return timed_acquire
+
+
+def _collect_pool_metrics():
+    """Reports the connections of the pools of the live instrumented drivers."""
+    in_use: int = 0
+    idle: int = 0
+    max_size: int = 0
+
+    for driver in list(instrumented_drivers):
+        pool = getattr(driver.driver, "_pool", None)
+
+        try:
+            for connections in list(pool.connections.values()):
+                for connection in list(connections):
+                    if connection.in_use:
+                        in_use += 1
+                    else:
+                        idle += 1
+            max_size += pool.pool_config.max_connection_pool_size
+        except (AttributeError, RuntimeError):
+            logger.debug("Cannot read the connection pool of %r", driver.driver)
+
+    NEO4J_POOL_CONNECTIONS.labels("in_use").set(in_use)
+    NEO4J_POOL_CONNECTIONS.labels("idle").set(idle)
+    NEO4J_POOL_MAX_SIZE.set(max_size)
+
+
+register_collector(_collect_pool_metrics)
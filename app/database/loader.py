@@ -0,0 +1,135 @@
+"""
+Request-scoped loader that dedupes and batches the module lookups.
+
+A single request may look up the same modules many times: updating a student
+looks up the new modules, then the members of each of their prerequisite
+groups, then checks that the modules exist, then looks up the modules the
+student currently takes. ModuleLoader wraps the repository of a request and
+memoizes every module it looks up, or the absence of it, for the rest of the
+request, so that each course code is looked up at most once.
+
+The lookups are batched: the modules missing from a call are looked up with a
+single get_modules_based_on_course_codes call on the wrapped repository. The
+prerequisites of the modules looked up are likely to be looked up next, so
+they are queued and looked up along with the next batch, rather than one
+group at a time. The service code can keep asking for modules one at a time.
+
+Modules are not written by requests, so the memoized modules cannot go stale
+within a request.
+"""
+
+import threading
+
+from ..metrics import CACHE_REQUESTS
+from ..models.module import Module, ModuleFieldset
+from ..tracing import traced_methods
+
+loader_hits = CACHE_REQUESTS.labels("module_loader", "hit")
+loader_misses = CACHE_REQUESTS.labels("module_loader", "miss")
+
+
+@traced_methods("repository")
+class ModuleLoader:
+    """Repository memoizing and batching the module lookups of a request.
+
+    Every operation that is not a module lookup is delegated to the wrapped
+    repository.
+
+    Attributes:
+      repo:
+        The wrapped repository.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.modules: dict[str, Module] = {}
+        self.queued: dict[str, None] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        return getattr(self.repo, name)
+
+    def load_many(self, course_codes: list[str]) -> list[Module]:
+        """Looks up modules, along with the queued lookups if any are missing.
+
+        Returns:
+          The module of each course code, None for those that do not exist.
+        """
+        with self.lock:
+            missing: list[str] = [
+                course_code
+                for course_code in dict.fromkeys(course_codes)
+                if course_code not in self.modules
+            ]
+            loader_hits.inc(len(course_codes) - len(missing))
+
+            if missing:
+                loader_misses.inc(len(missing))
+                self._load([*missing, *self.queued])
+
+            return [self.modules[course_code] for course_code in course_codes]
+
+    def _load(self, course_codes: list[str]):
+        """Looks up a batch of modules and queues their prerequisites."""
+        batch: list[str] = list(dict.fromkeys(course_codes))
+        self.queued.clear()
+
+        found: dict[str, Module] = {
+            module.course_code: module
+            for module in self.repo.get_modules_based_on_course_codes(batch)
+        }
+
+        for course_code in batch:
+            self.modules[course_code] = found.get(course_code)
+
+        for module in found.values():
+            for group in module.prerequisites or []:
+                self.queued.update(
+                    (course_code, None)
+                    for course_code in group
+                    if course_code not in self.modules
+                )
+
+    def get_module(self, course_code: str, fieldset: ModuleFieldset = None) -> Module:
+        """See module_db.get_module.
+
+        A module with a sparse fieldset is looked up on its own, unless it
+        has already been looked up in full.
+        """
+        if fieldset is not None and fieldset.is_sparse() and course_code not in self.modules:
+            return self.repo.get_module(course_code, fieldset)
+
+        return self.load_many([course_code])[0]
+
+    def get_modules_based_on_course_codes(self, course_codes: list[str]) -> list[Module]:
+        """See module_db.get_modules_based_on_course_codes."""
+        return [module for module in self.load_many(course_codes) if module is not None]
+
+    def get_prerequisite_groups_for_each_module(self, course_code: str) -> list[list[str]]:
+        """See module_db.get_prerequisite_groups_for_each_module."""
+        module: Module = self.get_module(course_code)
+
+        return [] if module is None else module.prerequisites or []
+
+    def get_mutually_exclusives_for_each_module(self, course_code: str) -> list[str]:
+        """See module_db.get_mutually_exclusives_for_each_module."""
+        module: Module = self.get_module(course_code)
+
+        return [] if module is None else module.mutually_exclusives or []
+
+    def search_for_modules(self, modules: list[str]) -> list[str]:
+        """See module_db.search_for_modules."""
+        return [
+            course_code
+            for course_code, module in zip(modules, self.load_many(modules))
+            if module is not None
+        ]
+
+    def get_modules_currently_taken(self, student_id: str) -> list[Module]:
+        """See student_db.get_modules_currently_taken.
+
+        The course codes of the student's modules are read from the wrapped
+        repository, as they change within a request, and the modules are
+        looked up through the loader.
+        """
+        return self.get_modules_based_on_course_codes(self.repo.get_student_courses(student_id))
@@ -0,0 +1,773 @@
+"""
+In-memory implementation of the Repository.
+
+The graph is held in plain dicts and sets keyed by course code and student id,
+and every operation reproduces the semantics of the Cypher query behind the
+*_db function of the same name: prerequisite groups, mutual exclusions, the
+SIMILAR edges between modules, the SIMILAR_TO_USER edges between students and
+the materialized recommendations. It needs no server, so it serves as a fast
+local stand-in for Neo4j and as a baseline for benchmarks.
+
+The graph can be built with the add_* methods or loaded from a snapshot, a
+JSON document of the shape returned by InMemoryRepository.snapshot.
+"""
+
+import json
+import threading
+
+from ..models.module import MODULE_RELATIONS, Module, ModuleCourseCodeAndName, ModuleFieldset
+from ..models.rec import Recommendation, StoredRecommendation, StudentRecProfile
+from ..models.student import Student, StudentDB
+from ..queries.module_cypher_queries import MODULE_PROPERTIES
+from ..recommenders.collaborative import EXCLUDED_DISCIPLINES as CF_EXCLUDED_DISCIPLINES
+from ..recommenders.content_based import EXCLUDED_DISCIPLINES as CB_EXCLUDED_DISCIPLINES
+from ..tracing import traced_methods
+
+STUDENT_FIELDS = (
+    "student_id",
+    "email",
+    "major",
+    "first_name",
+    "last_name",
+    "year_of_study",
+    "disciplines",
+)
+SEARCH_FIELDS = ("course_code", "course_name", "course_info")
+
+
+@traced_methods("repository")
+class InMemoryRepository:  # pylint: disable=too-many-public-methods,too-many-instance-attributes
+    """Repository holding the whole graph in process.
+
+    Attributes:
+      modules:
+        The properties of each module, keyed by course code.
+      prerequisite_groups:
+        The prerequisite groups of each module, as (group id, course codes)
+        tuples, keyed by course code.
+      mutually_exclusive:
+        The MUTUALLY_EXCLUSIVE edges, as (source, target) course codes.
+      similar:
+        The score of the SIMILAR edges from each module, keyed by source and
+        then target course code.
+      students:
+        The properties of each student, keyed by student id.
+      takes:
+        The course codes of the modules taken by each student.
+      similar_students:
+        The Jaccard index of the SIMILAR_TO_USER edges from each student,
+        keyed by source and then target student id.
+      stored:
+        The materialized recommendations of each student, as dicts holding
+        computed_at, stale_since, generation and the recommended modules.
+    """
+
+    def __init__(self):
+        self.modules: dict[str, dict[str, any]] = {}
+        self.prerequisite_groups: dict[str, list[tuple[str, list[str]]]] = {}
+        self.mutually_exclusive: set[tuple[str, str]] = set()
+        self.similar: dict[str, dict[str, float]] = {}
+        self.students: dict[str, dict[str, any]] = {}
+        self.takes: dict[str, set[str]] = {}
+        self.similar_students: dict[str, dict[str, float]] = {}
+        self.stored: dict[str, dict[str, any]] = {}
+        self.lock: threading.RLock = threading.RLock()
+
+    # Building
+
+    def add_module(self, module: dict[str, any]):
+        """Adds a module from a dict of its properties.
+
+        Besides the Module fields, the dict may hold the community and
+        discipline of the module.
+        """
+        with self.lock:
+            self.modules[module["course_code"]] = {
+                key: value
+                for key, value in module.items()
+                if key in MODULE_PROPERTIES or key in ("community", "discipline")
+            }
+
+    def add_prerequisite_group(
+        self, course_code: str, prerequisites: list[str], group_id: str = None
+    ):
+        """Adds a group of modules of which one is a prerequisite of a module."""
+        with self.lock:
+            groups: list[tuple[str, list[str]]] = self.prerequisite_groups.setdefault(
+                course_code, []
+            )
+            groups.append((group_id or f"{course_code}-{len(groups)}", list(prerequisites)))
+
+    def add_mutually_exclusive(self, course_code: str, mutual_course_code: str):
+        """Adds a MUTUALLY_EXCLUSIVE edge between two modules."""
+        with self.lock:
+            self.mutually_exclusive.add((course_code, mutual_course_code))
+
+    def add_similar(self, source: str, target: str, score: float):
+        """Adds a SIMILAR edge between two modules."""
+        with self.lock:
+            self.similar.setdefault(source, {})[target] = score
+
+    def add_student(self, student: dict[str, any], password: str = None):
+        """Adds a student from a dict of its properties and taken course codes."""
+        with self.lock:
+            self.students[student["student_id"]] = {
+                **{field: student.get(field) for field in STUDENT_FIELDS},
+                "password": password if password is not None else student.get("password"),
+            }
+            self.takes[student["student_id"]] = set(student.get("course_codes") or [])
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict[str, any]) -> "InMemoryRepository":
+        """Builds a repository from a snapshot."""
+        repo: InMemoryRepository = cls()
+
+        for module in snapshot.get("modules", []):
+            repo.add_module(module)
+        for group in snapshot.get("prerequisite_groups", []):
+            repo.add_prerequisite_group(
+                group["course_code"], group["prerequisites"], group.get("group_id")
+            )
+        for source, target in snapshot.get("mutually_exclusive", []):
+            repo.add_mutually_exclusive(source, target)
+        for source, target, score in snapshot.get("similar", []):
+            repo.add_similar(source, target, score)
+        for student in snapshot.get("students", []):
+            repo.add_student(student)
+        for source, target, score in snapshot.get("similar_students", []):
+            repo.similar_students.setdefault(source, {})[target] = score
+
+        return repo
+
+    @classmethod
+    def from_file(cls, path: str) -> "InMemoryRepository":
+        """Builds a repository from a snapshot stored as a JSON file."""
+        with open(path, encoding="utf-8") as snapshot:
+            return cls.from_snapshot(json.load(snapshot))
+
+    def snapshot(self) -> dict[str, any]:
+        """Returns the graph, without materialized recommendations, as plain data."""
+        with self.lock:
+            return {
+                "modules": list(self.modules.values()),
+                "prerequisite_groups": [
+                    {"course_code": course_code, "group_id": group_id, "prerequisites": codes}
+                    for course_code, groups in self.prerequisite_groups.items()
+                    for group_id, codes in groups
+                ],
+                "mutually_exclusive": [list(pair) for pair in self.mutually_exclusive],
+                "similar": [
+                    [source, target, score]
+                    for source, targets in self.similar.items()
+                    for target, score in targets.items()
+                ],
+                "students": [
+                    {**student, "course_codes": sorted(self.takes[student_id])}
+                    for student_id, student in self.students.items()
+                ],
+                "similar_students": [
+                    [source, target, score]
+                    for source, targets in self.similar_students.items()
+                    for target, score in targets.items()
+                ],
+            }
+
+    # Modules
+
+    def get_modules(
+        self, skip: int, limit: int, fieldset: ModuleFieldset = None
+    ) -> list[Module]:
+        """See module_db.get_modules."""
+        relations: tuple[str, ...] = _relations(fieldset, MODULE_RELATIONS)
+
+        with self.lock:
+            total: int = len(self.modules)
+
+            return [
+                self._full_module(course_code, relations, total=total)
+                for course_code in list(self.modules)[skip : skip + limit]
+            ]
+
+    def get_modules_based_on_course_codes(self, course_codes: list[str]) -> list[Module]:
+        """See module_db.get_modules_based_on_course_codes."""
+        with self.lock:
+            return [
+                self._full_module(course_code)
+                for course_code in course_codes
+                if course_code in self.modules
+            ]
+
+    def get_prerequisite_groups_for_each_module(self, course_code: str) -> list[list[str]]:
+        """See module_db.get_prerequisite_groups_for_each_module."""
+        with self.lock:
+            groups: list[list[str]] = []
+
+            for _, codes in self.prerequisite_groups.get(course_code, []):
+                group: list[str] = list(
+                    dict.fromkeys(code for code in codes if code in self.modules)
+                )
+                if group:
+                    groups.append(group)
+
+            return groups
+
+    def get_mutually_exclusives_for_each_module(self, course_code: str) -> list[str]:
+        """See module_db.get_mutually_exclusives_for_each_module."""
+        with self.lock:
+            return [
+                target
+                for source, target in self.mutually_exclusive
+                if source == course_code and target in self.modules
+            ]
+
+    def get_module(self, course_code: str, fieldset: ModuleFieldset = None) -> Module:
+        """See module_db.get_module."""
+        with self.lock:
+            if course_code not in self.modules:
+                return None
+
+            return self._full_module(course_code, _relations(fieldset, MODULE_RELATIONS))
+
+    def search_modules(
+        self, search_term: str, skip: int, limit: int, fieldset: ModuleFieldset = None
+    ) -> list[Module]:
+        """See module_db.search_modules.
+
+        Modules are matched on a case-insensitive substring of their course
+        code, name or info, and scored by the number of fields matched.
+        """
+        term: str = search_term.lower()
+
+        with self.lock:
+            matches: list[tuple[int, str]] = []
+
+            for course_code, module in self.modules.items():
+                score: int = sum(
+                    1
+                    for field in SEARCH_FIELDS
+                    if module.get(field) and term in str(module[field]).lower()
+                )
+                if score:
+                    matches.append((score, course_code))
+
+            matches.sort(key=lambda match: (-match[0], match[1]))
+
+            return [
+                self._full_module(
+                    course_code,
+                    _relations(fieldset, ()),
+                    score=float(score),
+                    total=len(matches),
+                )
+                for score, course_code in matches[skip : skip + limit]
+            ]
+
+    def get_modules_course_codes(self) -> list[str]:
+        """See module_db.get_modules_course_codes."""
+        with self.lock:
+            return list(self.modules)
+
+    def get_faculties(self) -> list[str]:
+        """See module_db.get_faculties."""
+        with self.lock:
+            return list(dict.fromkeys(module.get("faculty") for module in self.modules.values()))
+
+    def get_modules_in_a_faculty(self, faculty: str) -> list[ModuleCourseCodeAndName]:
+        """See module_db.get_modules_in_a_faculty."""
+        with self.lock:
+            return [
+                ModuleCourseCodeAndName(
+                    course_code=module["course_code"], course_name=module["course_name"]
+                )
+                for module in self.modules.values()
+                if module.get("faculty") == faculty
+            ]
+
+    def get_total_number_of_modules(self) -> int:
+        """See module_db.get_total_number_of_modules."""
+        with self.lock:
+            return len(self.modules)
+
+    def search_for_modules(self, modules: list[str]) -> list[str]:
+        """See module_db.search_for_modules."""
+        with self.lock:
+            return [course_code for course_code in modules if course_code in self.modules]
+
+    # Students
+
+    def get_student(self, student_id: str) -> StudentDB:
+        """See student_db.get_student."""
+        with self.lock:
+            if student_id not in self.students:
+                return None
+
+            return StudentDB(
+                **self.students[student_id],
+                course_codes=self.get_student_courses(student_id),
+            )
+
+    def get_all_student_ids(self) -> list[str]:
+        """See student_db.get_all_student_ids."""
+        with self.lock:
+            return sorted(self.students)
+
+    def find_student_ids(self, major: str = None, year_of_study: int = None) -> list[str]:
+        """See student_db.find_student_ids."""
+        with self.lock:
+            return sorted(
+                student_id
+                for student_id, student in self.students.items()
+                if (major is None or student["major"] == major)
+                and (year_of_study is None or student["year_of_study"] == year_of_study)
+            )
+
+    def get_student_courses(self, student_id: str) -> list[str]:
+        """See student_db.get_student_courses."""
+        with self.lock:
+            return [
+                course_code
+                for course_code in self.takes.get(student_id, ())
+                if course_code in self.modules
+            ]
+
+    def update_student(self, student_update: Student) -> Student:
+        """See student_db.update_student."""
+        with self.lock:
+            student: dict[str, any] = self.students[student_update.student_id]
+
+            for field in STUDENT_FIELDS[1:]:
+                student[field] = getattr(student_update, field)
+
+            return Student(**{field: student[field] for field in STUDENT_FIELDS})
+
+    def remove_modules(self, student_id: str, modules_to_be_removed: list[str]):
+        """See student_db.remove_modules."""
+        with self.lock:
+            self.takes.get(student_id, set()).difference_update(modules_to_be_removed)
+
+    def add_modules(self, student_id: str, modules_to_be_added: list[str]):
+        """See student_db.add_modules."""
+        with self.lock:
+            if student_id in self.students:
+                self.takes[student_id].update(modules_to_be_added)
+
+    def get_modules_currently_taken(self, student_id: str) -> list[Module]:
+        """See student_db.get_modules_currently_taken."""
+        with self.lock:
+            return [
+                self._full_module(course_code)
+                for course_code in self.get_student_courses(student_id)
+            ]
+
+    # Authentication
+
+    def register_student(self, new_student: StudentDB, hashed_password: str):
+        """See auth_db.register_student."""
+        with self.lock:
+            if new_student.student_id not in self.students:
+                self.add_student(
+                    {field: getattr(new_student, field) for field in STUDENT_FIELDS},
+                    hashed_password,
+                )
+
+    # Recommendations
+
+    def get_cb_recs_that_fulfil_prereq(  # pylint: disable=too-many-arguments,unused-argument
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        max_similarity: float = 0.85,
+    ) -> list[Module]:
+        """See rec_db.get_cb_recs_that_fulfil_prereq."""
+        with self.lock:
+            best: dict[str, float] = {}
+
+            for course_code, rec, score in self._similar_candidates(student_id, max_similarity):
+                if (
+                    self.modules[rec].get("broadening_and_deepening") is True
+                    and course_code in self._prerequisites(rec)
+                ):
+                    best[rec] = max(score, best.get(rec, score))
+
+            return self._top_scored(best, k)
+
+    def get_cb_recs_that_have_no_prereq(  # pylint: disable=too-many-arguments,unused-argument
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        max_similarity: float = 0.85,
+    ) -> list[Module]:
+        """See rec_db.get_cb_recs_that_have_no_prereq."""
+        with self.lock:
+            best: dict[str, float] = {}
+            disciplines: list[str] = self.students.get(student_id, {}).get("disciplines") or []
+
+            for _, rec, score in self._similar_candidates(student_id, max_similarity):
+                module: dict[str, any] = self.modules[rec]
+
+                if (
+                    module.get("broadening_and_deepening") is True
+                    and not self._prerequisites(rec)
+                    and self._other_discipline(
+                        module.get("discipline"), disciplines, CB_EXCLUDED_DISCIPLINES
+                    )
+                ):
+                    best[rec] = max(score, best.get(rec, score))
+
+            return self._top_scored(best, k)
+
+    def get_cf_recs_that_fulfill_prereq(  # pylint: disable=too-many-arguments,unused-argument
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        number_of_neighbours: int = 10,
+    ) -> list[Module]:
+        """See rec_db.get_cf_recs_that_fulfill_prereq."""
+        with self.lock:
+            taken: set[str] = self.takes.get(student_id, set())
+            counts: dict[str, int] = {
+                course_code: count
+                for course_code, count in self._neighbour_counts(
+                    student_id, number_of_neighbours
+                ).items()
+                if not self._prerequisites(course_code).isdisjoint(taken)
+            }
+
+            return self._top_counted(counts, k)
+
+    def get_cf_recs_that_have_no_prereq(  # pylint: disable=too-many-arguments,unused-argument
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        number_of_neighbours: int = 10,
+    ) -> list[Module]:
+        """See rec_db.get_cf_recs_that_have_no_prereq."""
+        with self.lock:
+            counts: dict[str, int] = {
+                course_code: count
+                for course_code, count in self._neighbour_counts(
+                    student_id, number_of_neighbours
+                ).items()
+                if not self._prerequisites(course_code)
+            }
+
+            return self._top_counted(counts, k)
+
+    def get_stored_recommendations(self, student_id: str) -> StoredRecommendation:
+        """See rec_db.get_stored_recommendations."""
+        with self.lock:
+            if student_id not in self.students:
+                return None
+
+            stored: dict[str, any] = self.stored.get(student_id, {})
+            recommendation: Recommendation = Recommendation()
+
+            for kind, course_code, score in stored.get("recommendations", []):
+                if course_code not in self.modules:
+                    continue
+
+                module: Module = self._module(course_code, score=score)
+
+                if kind == "cf":
+                    recommendation.cf_recommendations.append(module)
+                else:
+                    recommendation.cbf_recommendations.append(module)
+
+            return StoredRecommendation(
+                recommendation=recommendation,
+                computed_at=stored.get("computed_at"),
+                stale_since=stored.get("stale_since"),
+                generation=stored.get("generation", 0),
+            )
+
+    def store_recommendations(
+        self,
+        student_id: str,
+        recommendation: Recommendation,
+        generation: int,
+        computed_at: float,
+    ):
+        """See rec_db.store_recommendations."""
+        with self.lock:
+            if student_id not in self.students:
+                return
+
+            stored: dict[str, any] = self.stored.setdefault(student_id, {})
+
+            if stored.get("generation", 0) != generation:
+                return
+
+            stored["computed_at"] = computed_at
+            stored["stale_since"] = None
+            stored["recommendations"] = [
+                (kind, module.course_code, module.score)
+                for kind, modules in (
+                    ("cf", recommendation.cf_recommendations),
+                    ("cbf", recommendation.cbf_recommendations),
+                )
+                for module in modules
+            ]
+
+    def invalidate_stored_recommendations(self, student_id: str, now: float):
+        """See rec_db.invalidate_stored_recommendations."""
+        with self.lock:
+            if student_id in self.students:
+                self._invalidate(student_id, now)
+
+    def invalidate_all_stored_recommendations(self, now: float):
+        """See rec_db.invalidate_all_stored_recommendations."""
+        with self.lock:
+            for student_id in self.students:
+                self._invalidate(student_id, now)
+
+    def get_modules_for_recommender(self) -> list[dict[str, any]]:
+        """See rec_db.get_modules_for_recommender."""
+        with self.lock:
+            return [
+                {
+                    **{field: module.get(field) for field in MODULE_PROPERTIES},
+                    "community": module.get("community"),
+                    "discipline": module.get("discipline"),
+                    "prerequisites": [
+                        code
+                        for group in self.get_prerequisite_groups_for_each_module(course_code)
+                        for code in group
+                    ],
+                }
+                for course_code, module in self.modules.items()
+            ]
+
+    def get_similar_edges(self) -> list[tuple[str, str, float]]:
+        """See rec_db.get_similar_edges."""
+        with self.lock:
+            return [
+                (source, target, score)
+                for source, targets in self.similar.items()
+                for target, score in targets.items()
+                if source in self.modules and target in self.modules
+            ]
+
+    def get_mutually_exclusive_pairs(self) -> list[tuple[str, str]]:
+        """See rec_db.get_mutually_exclusive_pairs."""
+        with self.lock:
+            return [
+                pair
+                for source, target in self.mutually_exclusive
+                if source in self.modules and target in self.modules
+                for pair in ((source, target), (target, source))
+            ]
+
+    def get_student_rec_profile(  # pylint: disable=unused-argument
+        self, student_id: str, timeout: float = None
+    ) -> StudentRecProfile:
+        """See rec_db.get_student_rec_profile."""
+        with self.lock:
+            if student_id not in self.students:
+                return StudentRecProfile()
+
+            student: dict[str, any] = self.students[student_id]
+
+            return StudentRecProfile(
+                course_codes=self.get_student_courses(student_id),
+                disciplines=student["disciplines"] or [],
+                year_of_study=student["year_of_study"],
+                number_of_neighbours=len(self._neighbours(student_id)),
+            )
+
+    def get_students_for_recommender(self) -> list[dict[str, any]]:
+        """See rec_db.get_students_for_recommender."""
+        with self.lock:
+            return [
+                {
+                    "student_id": student_id,
+                    "disciplines": student["disciplines"],
+                    "course_codes": self.get_student_courses(student_id),
+                }
+                for student_id, student in self.students.items()
+            ]
+
+    def get_similar_students(self, student_id: str) -> list[tuple[str, float]]:
+        """See rec_db.get_similar_students."""
+        with self.lock:
+            return self._neighbours(student_id)
+
+    def write_similar_students(self, rows: list[dict[str, any]]):
+        """See rec_db.write_similar_students."""
+        with self.lock:
+            for row in rows:
+                if row["student_id"] not in self.students:
+                    continue
+
+                self.similar_students[row["student_id"]] = {
+                    neighbour["student_id"]: neighbour["score"]
+                    for neighbour in row["neighbours"]
+                    if neighbour["student_id"] in self.students
+                }
+
+    def get_enrollment_counts(self) -> list[dict[str, any]]:
+        """See rec_db.get_enrollment_counts."""
+        with self.lock:
+            counts: dict[tuple[str, tuple, any], int] = {}
+
+            for student_id, student in self.students.items():
+                for course_code in self.get_student_courses(student_id):
+                    key: tuple[str, tuple, any] = (
+                        course_code,
+                        tuple(student["disciplines"] or ()),
+                        student["year_of_study"],
+                    )
+                    counts[key] = counts.get(key, 0) + 1
+
+            return [
+                {
+                    "course_code": course_code,
+                    "disciplines": list(disciplines),
+                    "year_of_study": year_of_study,
+                    "count": count,
+                }
+                for (course_code, disciplines, year_of_study), count in counts.items()
+            ]
+
+    # Helpers
+
+    def _module(self, course_code: str, **extra: any) -> Module:
+        """Returns the Module fields of a module."""
+        module: dict[str, any] = self.modules[course_code]
+
+        return Module(**{field: module.get(field) for field in MODULE_PROPERTIES}, **extra)
+
+    def _full_module(
+        self, course_code: str, relations: tuple[str, ...] = MODULE_RELATIONS, **extra: any
+    ) -> Module:
+        """Returns a module along with its prerequisites and mutual exclusions,
+        or those of them in relations."""
+        module: Module = self._module(course_code, **extra)
+
+        if "prerequisites" in relations:
+            module.prerequisites = self.get_prerequisite_groups_for_each_module(course_code)
+        if "mutually_exclusives" in relations:
+            module.mutually_exclusives = self.get_mutually_exclusives_for_each_module(
+                course_code
+            )
+
+        return module
+
+    def _prerequisites(self, course_code: str) -> set[str]:
+        """Returns the course codes of every prerequisite of a module."""
+        return {
+            code
+            for _, codes in self.prerequisite_groups.get(course_code, [])
+            for code in codes
+            if code in self.modules
+        }
+
+    def _is_mutually_exclusive(self, course_code: str, other: str) -> bool:
+        """Checks for a MUTUALLY_EXCLUSIVE edge in either direction."""
+        return (course_code, other) in self.mutually_exclusive or (
+            other,
+            course_code,
+        ) in self.mutually_exclusive
+
+    def _similar_candidates(self, student_id: str, max_similarity: float):
+        """Yields the (taken, candidate, score) SIMILAR edges the CB queries walk.
+
+        The candidate must be in the same community as the taken module, must
+        not be mutually exclusive with it and must score below max_similarity.
+        """
+        for course_code in self.get_student_courses(student_id):
+            community: any = self.modules[course_code].get("community")
+
+            if community is None:
+                continue
+
+            for rec, score in self.similar.get(course_code, {}).items():
+                if (
+                    rec in self.modules
+                    and self.modules[rec].get("community") == community
+                    and score is not None
+                    and score < max_similarity
+                    and not self._is_mutually_exclusive(rec, course_code)
+                ):
+                    yield course_code, rec, score
+
+    def _neighbours(self, student_id: str) -> list[tuple[str, float]]:
+        """Returns the SIMILAR_TO_USER neighbours by Jaccard index, then id."""
+        return sorted(
+            (
+                (neighbour, score)
+                for neighbour, score in self.similar_students.get(student_id, {}).items()
+                if neighbour in self.students
+            ),
+            key=lambda neighbour: (-(neighbour[1] or 0), neighbour[0]),
+        )
+
+    def _neighbour_counts(self, student_id: str, number_of_neighbours: int) -> dict[str, int]:
+        """Counts the neighbours taking each module that the CF queries consider.
+
+        Only the modules not taken by the student, from a discipline other
+        than one of the student's and not excluded, are counted.
+        """
+        if student_id not in self.students:
+            return {}
+
+        taken: set[str] = self.takes.get(student_id, set())
+        disciplines: list[str] = self.students[student_id]["disciplines"] or []
+        counts: dict[str, int] = {}
+
+        for neighbour, _ in self._neighbours(student_id)[:number_of_neighbours]:
+            for course_code in self.takes.get(neighbour, set()) - taken:
+                if course_code in self.modules and self._other_discipline(
+                    self.modules[course_code].get("discipline"),
+                    disciplines,
+                    CF_EXCLUDED_DISCIPLINES,
+                ):
+                    counts[course_code] = counts.get(course_code, 0) + 1
+
+        return counts
+
+    def _top_scored(self, best: dict[str, float], k: int) -> list[Module]:
+        """Returns the k best scored modules, ties broken by course code."""
+        ranked: list[str] = sorted(
+            best, key=lambda course_code: (-best[course_code], course_code)
+        )
+
+        return [
+            self._module(course_code, score=best[course_code]) for course_code in ranked[:k]
+        ]
+
+    def _top_counted(self, counts: dict[str, int], k: int) -> list[Module]:
+        """Returns the k most counted modules, ties broken by course code."""
+        ranked: list[str] = sorted(
+            counts, key=lambda course_code: (-counts[course_code], course_code)
+        )
+
+        return [self._module(course_code) for course_code in ranked[:k]]
+
+    def _invalidate(self, student_id: str, now: float):
+        """Marks the stored recommendations of a student as stale."""
+        stored: dict[str, any] = self.stored.setdefault(student_id, {})
+
+        if stored.get("stale_since") is None:
+            stored["stale_since"] = now
+
+        stored["generation"] = stored.get("generation", 0) + 1
+
+    @staticmethod
+    def _other_discipline(
+        discipline: str, disciplines: list[str], excluded: frozenset[str]
+    ) -> bool:
+        """Applies the discipline filter shared by the CB and CF queries."""
+        return (
+            discipline is not None
+            and discipline not in excluded
+            and any(discipline != other for other in disciplines)
+        )
+
+
+def _relations(fieldset: ModuleFieldset, default: tuple[str, ...]) -> tuple[str, ...]:
+    """Returns the relations of a fieldset, the default ones if it is None."""
+    return default if fieldset is None else fieldset.relations(default)
@@ -2,24 +2,35 @@
 Functions to interact with the db for module data
 """
 
-from neo4j import Driver, Record, EagerResult
+from functools import lru_cache
+
+from neo4j import Driver, Record, EagerResult, RoutingControl
 
 from ..queries.module_cypher_queries import (
     GET_ALL_MODULES,
+    GET_ALL_MODULES_TEMPLATE,
     GET_MODULE,
+    GET_MODULE_TEMPLATE,
+    GET_MODULE_WITH_RELATIONS,
+    GET_MODULES_BY_COURSE_CODES,
     SEARCH_MODULES,
+    SEARCH_MODULES_TEMPLATE,
     GET_MODULES_COURSE_CODES,
     GET_FACULTIES,
     GET_PREREQUISITE_GROUPS_FOR_EACH_MODULE,
     GET_MUTUALLY_EXCLUSIVES_FOR_EACH_MODULE,
     GET_MODULES_FOR_A_FACULTY,
     GET_TOTAL_NUMBER_OF_MODULES,
+    module_projection,
 )
 
-from ..models.module import Module, ModuleCourseCodeAndName
+from ..models.module import MODULE_RELATIONS, Module, ModuleCourseCodeAndName, ModuleFieldset
+from .instrumentation import query_name, register_query
 
 
-def get_modules(skip: int, limit: int, driver: Driver) -> list[Module]:
+def get_modules(
+    skip: int, limit: int, driver: Driver, fieldset: ModuleFieldset = None
+) -> list[Module]:
     """Retrieves modules from the db.
 
     Retrieves modules from the db based on the
@@ -32,49 +43,60 @@ def get_modules(skip: int, limit: int, driver: Driver) -> list[Module]:
         The number of modules to be retrieved.
       driver:
         An open instance of neo4j.Driver
+      fieldset:
+        The fields and relations to be retrieved, all of them if None.
 
     Returns:
       A list of Modules
     """
-    query: str = GET_ALL_MODULES
+    query: str = _module_query(GET_ALL_MODULES_TEMPLATE, GET_ALL_MODULES, "m", fieldset)
 
     eager_result: EagerResult = driver.execute_query(
         query,
         skip=skip,
         limit=limit,
+        routing_=RoutingControl.READ,
         database_="neo4j",
     )
     records: list[Record] = eager_result.records
-    modules: list[Module] = []
-
-    for record in records:
-        data = record.data()
-        module: Module = Module(**data)
-        prereqs: list[list[str]] = get_prerequisite_groups_for_each_module(
-            data["course_code"], driver
-        )
-        mutuallly_exclusives: list[str] = get_mutually_exclusives_for_each_module(
-            data["course_code"], driver
-        )
-        module.prerequisites = prereqs
-        module.mutually_exclusives = mutuallly_exclusives
-        modules.append(module)
 
-    return modules
+    return [_module_from_record(record) for record in records]
 
 
 def get_modules_based_on_course_codes(
     course_codes: list[str], driver: Driver
 ) -> list[Module]:
-    """Retreive modules based on their course codes."""
-    modules: list[Module] = []
+    """Retreive modules based on their course codes.
 
-    for course_code in course_codes:
-        module: Module = get_module(course_code, driver)
-        if module is not None:
-            modules.append(module)
+    The modules are retrieved along with their prerequisite groups and
+    mutually exclusive modules in a single query.
 
-    return modules
+    Args:
+      course_codes:
+        The course codes of the modules to be retrieved.
+      driver:
+        An open instance of neo4j.Driver
+
+    Returns:
+      The modules in the order of the course codes. Course codes of modules
+      that do not exist are skipped.
+    """
+    query: str = GET_MODULES_BY_COURSE_CODES
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        course_codes=list(dict.fromkeys(course_codes)),
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+    found: dict[str, Module] = {}
+
+    for record in records:
+        module: Module = _module_from_record(record)
+        found[module.course_code] = module
+
+    return [found[course_code] for course_code in course_codes if course_code in found]
 
 
 def get_prerequisite_groups_for_each_module(
@@ -99,7 +121,7 @@ def get_prerequisite_groups_for_each_module(
     query: str = GET_PREREQUISITE_GROUPS_FOR_EACH_MODULE
 
     eager_result: EagerResult = driver.execute_query(
-        query, course_code=course_code, database_="neo4j"
+        query, course_code=course_code, routing_=RoutingControl.READ, database_="neo4j"
     )
     records: list[Record] = eager_result.records
     prerequisite_groups: list[list[str]] = []
@@ -132,7 +154,7 @@ def get_mutually_exclusives_for_each_module(
     query: str = GET_MUTUALLY_EXCLUSIVES_FOR_EACH_MODULE
 
     eager_result: EagerResult = driver.execute_query(
-        query, course_code=course_code, database_="neo4j"
+        query, course_code=course_code, routing_=RoutingControl.READ, database_="neo4j"
     )
     records: list[Record] = eager_result.records
     mutually_exclusives: list[str] = []
@@ -144,7 +166,7 @@ def get_mutually_exclusives_for_each_module(
     return mutually_exclusives
 
 
-def get_module(course_code: str, driver: Driver) -> Module:
+def get_module(course_code: str, driver: Driver, fieldset: ModuleFieldset = None) -> Module:
     """Retrieves a single module from the db
 
     Retrieves a single module from the db based
@@ -155,41 +177,31 @@ def get_module(course_code: str, driver: Driver) -> Module:
         The course code of the module to be retrieved.
       driver:
         An open instance of neo4j.Driver
+      fieldset:
+        The fields and relations to be retrieved, all of them if None.
 
     Returns:
       The retrieved module or None if no such module with the
       given course code exists.
     """
-    query: str = GET_MODULE
+    query: str = _module_query(GET_MODULE_TEMPLATE, GET_MODULE_WITH_RELATIONS, "m", fieldset)
 
     eager_result: EagerResult = driver.execute_query(
         query,
         course_code=course_code,
+        routing_=RoutingControl.READ,
         database_="neo4j",
     )
     records: list[Record] = eager_result.records
-    module: Module = None
 
     if len(records) == 0:
         return None
 
-    data: dict[str, any] = records[0].data()
-    module: Module = Module(**data)
-    prerequisites: list[list[str]] = get_prerequisite_groups_for_each_module(
-        course_code, driver
-    )
-    mutually_exclusives: list[str] = get_mutually_exclusives_for_each_module(
-        course_code, driver
-    )
-
-    module.prerequisites = prerequisites
-    module.mutually_exclusives = mutually_exclusives
-
-    return module
+    return _module_from_record(records[0])
 
 
 def search_modules(
-    search_term: str, skip: int, limit: int, driver: Driver
+    search_term: str, skip: int, limit: int, driver: Driver, fieldset: ModuleFieldset = None
 ) -> list[Module]:
     """Searches for modules based on a search term.
 
@@ -206,28 +218,28 @@ def search_modules(
         The number of modules to be returned
       driver:
         An open instance of neo4j.Driver
+      fieldset:
+        The fields and relations to be retrieved. All the fields and no
+        relations if None.
 
     Returns:
       A list of modules that are relevant to the search term.
     """
-    query: str = SEARCH_MODULES
+    query: str = _module_query(
+        SEARCH_MODULES_TEMPLATE, SEARCH_MODULES, "node", fieldset, default_relations=()
+    )
 
     eager_result: EagerResult = driver.execute_query(
         query,
         search_term=f"*{search_term}*",
         skip=skip,
         limit=limit,
+        routing_=RoutingControl.READ,
         database_="neo4j",
     )
     records: list[Record] = eager_result.records
-    modules: list[Module] = []
 
-    for record in records:
-        data: dict[str, any] = record.data()
-        module: Module = Module(**data)
-        modules.append(module)
-
-    return modules
+    return [_module_from_record(record) for record in records]
 
 
 def get_modules_course_codes(driver: Driver) -> list[str]:
@@ -245,7 +257,11 @@ def get_modules_course_codes(driver: Driver) -> list[str]:
     """
     query: str = GET_MODULES_COURSE_CODES
 
-    eager_result: EagerResult = driver.execute_query(query, database_="neo4j")
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
     records: list[Record] = eager_result.records
     course_codes: list[str] = []
 
@@ -271,7 +287,11 @@ def get_faculties(driver: Driver) -> list[str]:
     """
     query: str = GET_FACULTIES
 
-    eager_result: EagerResult = driver.execute_query(query, database_="neo4j")
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
     records: list[Record] = eager_result.records
     faculties: list[str] = []
 
@@ -303,7 +323,7 @@ def get_modules_in_a_faculty(
     query: str = GET_MODULES_FOR_A_FACULTY
 
     eager_result: EagerResult = driver.execute_query(
-        query, faculty=faculty, database_="neo4j"
+        query, faculty=faculty, routing_=RoutingControl.READ, database_="neo4j"
     )
     records: list[Record] = eager_result.records
     modules: list[ModuleCourseCodeAndName] = []
@@ -328,7 +348,11 @@ def get_total_number_of_modules(driver: Driver) -> int:
     """
     query: str = GET_TOTAL_NUMBER_OF_MODULES
 
-    eager_result: EagerResult = driver.execute_query(query, database_="neo4j")
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
     records: list[Record] = eager_result.records
 
     return records[0].data()["total"]
@@ -358,6 +382,7 @@ def search_for_modules(modules: list[str], driver: Driver) -> list[str]:
         eager_result: EagerResult = driver.execute_query(
             search_for_modules_query,
             course_code=module,
+            routing_=RoutingControl.READ,
             database_="neo4j",
         )
         records: list[Record] = eager_result.records
@@ -369,3 +394,63 @@ def search_for_modules(modules: list[str], driver: Driver) -> list[str]:
         retrieved_modules.append(data["course_code"])
 
     return retrieved_modules
+
+
+def _module_query(
+    template: str,
+    default_query: str,
+    variable: str,
+    fieldset: ModuleFieldset,
+    default_relations: tuple[str, ...] = MODULE_RELATIONS,
+) -> str:
+    """Returns the query retrieving the fieldset of modules, the default query
+    of the template if the fieldset is None or the default one."""
+    if fieldset is None or not fieldset.is_sparse():
+        return default_query
+
+    return _projected_query(
+        template,
+        query_name(default_query),
+        variable,
+        fieldset.properties(),
+        fieldset.relations(default_relations),
+    )
+
+
+@lru_cache(maxsize=None)
+def _projected_query(
+    template: str,
+    name: str,
+    variable: str,
+    properties: tuple[str, ...],
+    relations: tuple[str, ...],
+) -> str:
+    """Builds a template's query with a projection, named after the default
+    query of the template.
+
+    The projections are made of whitelisted names only, so there are a few
+    hundred of them at most across the templates.
+    """
+    query: str = template.format(
+        projection=module_projection(variable, properties, relations)
+    )
+    register_query(query, name)
+
+    return query
+
+
+def _module_from_record(record: Record) -> Module:
+    """Builds a module from a record of a projection of modules.
+
+    Unlike GET_PREREQUISITE_GROUPS_FOR_EACH_MODULE, the prerequisites
+    comprehension keeps repeated members and groups without members, which
+    are dropped here.
+    """
+    data: dict[str, any] = record.data()
+
+    if data.get("prerequisites") is not None:
+        data["prerequisites"] = [
+            list(dict.fromkeys(group)) for group in data["prerequisites"] if group
+        ]
+
+    return Module(**data)
@@ -2,25 +2,53 @@
 Functions to interact with the db for recommendations
 """
 
-from neo4j import Driver, Record, EagerResult
+from neo4j import Driver, Record, EagerResult, Query, RoutingControl
 
 from ..queries.rec_cypher_queries import (
     GET_CB_MODULES_THAT_FULFILL_PREREQS,
     GET_CB_MODULES_WITH_NO_PREREQS,
     GET_CF_MODULES_THAT_FULFILL_PREREQS,
     GET_CF_MODULES_WITH_NO_PREREQS,
+    GET_STORED_RECOMMENDATIONS,
+    STORE_RECOMMENDATIONS,
+    INVALIDATE_STORED_RECOMMENDATIONS,
+    INVALIDATE_ALL_STORED_RECOMMENDATIONS,
+    GET_MODULES_FOR_RECOMMENDER,
+    GET_SIMILAR_EDGES,
+    GET_MUTUALLY_EXCLUSIVE_PAIRS,
+    GET_STUDENT_REC_PROFILE,
+    GET_STUDENTS_FOR_RECOMMENDER,
+    GET_SIMILAR_STUDENTS,
+    WRITE_SIMILAR_STUDENTS,
+    GET_ENROLLMENT_COUNTS,
 )
 
 from ..models.module import Module
+from ..models.rec import Recommendation, StoredRecommendation, StudentRecProfile
 
 
-def get_cb_recs_that_fulfil_prereq(student_id: str, driver: Driver) -> list[Module]:
-    """Function to get content-based recommendations that fulfil prerequisites."""
-    query: str = GET_CB_MODULES_THAT_FULFILL_PREREQS
+def get_cb_recs_that_fulfil_prereq(
+    student_id: str,
+    driver: Driver,
+    timeout: float = None,
+    k: int = 10,
+    max_similarity: float = 0.85,
+) -> list[Module]:
+    """Function to get content-based recommendations that fulfil prerequisites.
+
+    The db returns the k best modules, by similarity score, out of the modules
+    whose Similar edge scores below max_similarity. The transaction is
+    terminated by the db if it runs for longer than the timeout, given in
+    seconds.
+    """
+    query: Query = Query(GET_CB_MODULES_THAT_FULFILL_PREREQS, timeout=timeout)
 
     eager_result: EagerResult = driver.execute_query(
         query,
         student_id=student_id,
+        k=k,
+        max_similarity=max_similarity,
+        routing_=RoutingControl.READ,
         database_="neo4j",
     )
 
@@ -35,12 +63,29 @@ def get_cb_recs_that_fulfil_prereq(student_id: str, driver: Driver) -> list[Modu
     return modules
 
 
-def get_cb_recs_that_have_no_prereq(student_id: str, driver: Driver) -> list[Module]:
-    """Function to get content-based recommendations that have no prerequisites."""
-    query: str = GET_CB_MODULES_WITH_NO_PREREQS
+def get_cb_recs_that_have_no_prereq(
+    student_id: str,
+    driver: Driver,
+    timeout: float = None,
+    k: int = 10,
+    max_similarity: float = 0.85,
+) -> list[Module]:
+    """Function to get content-based recommendations that have no prerequisites.
+
+    The db returns the k best modules, by similarity score, out of the modules
+    whose Similar edge scores below max_similarity. The transaction is
+    terminated by the db if it runs for longer than the timeout, given in
+    seconds.
+    """
+    query: Query = Query(GET_CB_MODULES_WITH_NO_PREREQS, timeout=timeout)
 
     eager_result: EagerResult = driver.execute_query(
-        query, student_id=student_id, database_="neo4j"
+        query,
+        student_id=student_id,
+        k=k,
+        max_similarity=max_similarity,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
     )
 
     records: list[Record] = eager_result.records
@@ -54,12 +99,29 @@ def get_cb_recs_that_have_no_prereq(student_id: str, driver: Driver) -> list[Mod
     return modules
 
 
-def get_cf_recs_that_fulfill_prereq(student_id: str, driver: Driver) -> list[Module]:
-    """Function to get collaborative filtering recommendations that fulfill prerequisites."""
-    query: str = GET_CF_MODULES_THAT_FULFILL_PREREQS
+def get_cf_recs_that_fulfill_prereq(
+    student_id: str,
+    driver: Driver,
+    timeout: float = None,
+    k: int = 10,
+    number_of_neighbours: int = 10,
+) -> list[Module]:
+    """Function to get collaborative filtering recommendations that fulfill prerequisites.
+
+    The db returns the k modules taken by the most neighbours among the
+    student's number_of_neighbours nearest neighbours. The transaction is
+    terminated by the db if it runs for longer than the timeout, given in
+    seconds.
+    """
+    query: Query = Query(GET_CF_MODULES_THAT_FULFILL_PREREQS, timeout=timeout)
 
     eager_result: EagerResult = driver.execute_query(
-        query, student_id=student_id, database_="neo4j"
+        query,
+        student_id=student_id,
+        k=k,
+        number_of_neighbours=number_of_neighbours,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
     )
 
     records: list[Record] = eager_result.records
@@ -73,12 +135,29 @@ def get_cf_recs_that_fulfill_prereq(student_id: str, driver: Driver) -> list[Mod
     return modules
 
 
-def get_cf_recs_that_have_no_prereq(student_id: str, driver: Driver) -> list[Module]:
-    """Function to get collaborative filtering recommendations that have no prerequisites."""
-    query: str = GET_CF_MODULES_WITH_NO_PREREQS
+def get_cf_recs_that_have_no_prereq(
+    student_id: str,
+    driver: Driver,
+    timeout: float = None,
+    k: int = 10,
+    number_of_neighbours: int = 10,
+) -> list[Module]:
+    """Function to get collaborative filtering recommendations that have no prerequisites.
+
+    The db returns the k modules taken by the most neighbours among the
+    student's number_of_neighbours nearest neighbours. The transaction is
+    terminated by the db if it runs for longer than the timeout, given in
+    seconds.
+    """
+    query: Query = Query(GET_CF_MODULES_WITH_NO_PREREQS, timeout=timeout)
 
     eager_result: EagerResult = driver.execute_query(
-        query, student_id=student_id, database_="neo4j"
+        query,
+        student_id=student_id,
+        k=k,
+        number_of_neighbours=number_of_neighbours,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
     )
 
     records: list[Record] = eager_result.records
@@ -90,3 +169,325 @@ def get_cf_recs_that_have_no_prereq(student_id: str, driver: Driver) -> list[Mod
         modules.append(module)
 
     return modules
+
+
+def get_stored_recommendations(
+    student_id: str, driver: Driver
+) -> StoredRecommendation:
+    """Retrieves the materialized recommendations of a student.
+
+    Args:
+      student_id:
+        The id of the student whose stored recommendations are retrieved.
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      The stored recommendations of the student or None if the student does
+      not exist.
+    """
+    query: str = GET_STORED_RECOMMENDATIONS
+
+    eager_result: EagerResult = driver.execute_query(
+        query, student_id=student_id, routing_=RoutingControl.READ, database_="neo4j"
+    )
+    records: list[Record] = eager_result.records
+
+    if len(records) == 0:
+        return None
+
+    data: dict[str, any] = records[0].data()
+    recommendation: Recommendation = Recommendation()
+
+    for rec in data["recommendations"]:
+        kind: str = rec.pop("kind")
+        module: Module = Module(**rec)
+
+        if kind == "cf":
+            recommendation.cf_recommendations.append(module)
+        else:
+            recommendation.cbf_recommendations.append(module)
+
+    return StoredRecommendation(
+        recommendation=recommendation,
+        computed_at=data["computed_at"],
+        stale_since=data["stale_since"],
+        generation=data["generation"],
+    )
+
+
+def store_recommendations(
+    student_id: str,
+    recommendation: Recommendation,
+    generation: int,
+    computed_at: float,
+    driver: Driver,
+):
+    """Materializes the recommendations of a student in the db.
+
+    The previously stored recommendations of the student are replaced. Nothing
+    is written if the student's recommendations have been invalidated since
+    the given generation was read.
+
+    Args:
+      student_id:
+        The id of the student.
+      recommendation:
+        The recommendations to be stored.
+      generation:
+        The generation of the stored recommendations that the recommendations
+        were computed from.
+      computed_at:
+        The unix timestamp of when the recommendations were computed.
+      driver:
+        An open instance of the neo4j.Driver.
+    """
+    query: str = STORE_RECOMMENDATIONS
+    recommendations: list[dict[str, any]] = []
+
+    for kind, modules in (
+        ("cf", recommendation.cf_recommendations),
+        ("cbf", recommendation.cbf_recommendations),
+    ):
+        for rank, module in enumerate(modules):
+            recommendations.append(
+                {
+                    "kind": kind,
+                    "rank": rank,
+                    "score": module.score,
+                    "course_code": module.course_code,
+                }
+            )
+
+    driver.execute_query(
+        query,
+        student_id=student_id,
+        generation=generation,
+        computed_at=computed_at,
+        recommendations=recommendations,
+        routing_=RoutingControl.WRITE,
+        database_="neo4j",
+    )
+
+
+def invalidate_stored_recommendations(student_id: str, now: float, driver: Driver):
+    """Marks the stored recommendations of a student as stale.
+
+    Args:
+      student_id:
+        The id of the student.
+      now:
+        The current unix timestamp.
+      driver:
+        An open instance of the neo4j.Driver.
+    """
+    query: str = INVALIDATE_STORED_RECOMMENDATIONS
+
+    driver.execute_query(
+        query,
+        student_id=student_id,
+        now=now,
+        routing_=RoutingControl.WRITE,
+        database_="neo4j",
+    )
+
+
+def invalidate_all_stored_recommendations(now: float, driver: Driver):
+    """Marks the stored recommendations of every student as stale.
+
+    To be used after the similarity graph has been rebuilt.
+
+    Args:
+      now:
+        The current unix timestamp.
+      driver:
+        An open instance of the neo4j.Driver.
+    """
+    query: str = INVALIDATE_ALL_STORED_RECOMMENDATIONS
+
+    driver.execute_query(query, now=now, routing_=RoutingControl.WRITE, database_="neo4j")
+
+
+def get_modules_for_recommender(driver: Driver) -> list[dict[str, any]]:
+    """Retrieves every module along with the properties used by recommenders.
+
+    Args:
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      A list of dicts holding the Module fields of each module along with its
+      community, discipline and the course codes of all of its prerequisites.
+    """
+    query: str = GET_MODULES_FOR_RECOMMENDER
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+
+    return [record.data() for record in records]
+
+
+def get_similar_edges(driver: Driver) -> list[tuple[str, str, float]]:
+    """Retrieves every SIMILAR relationship between modules.
+
+    Args:
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      A list of (source course code, target course code, score) tuples.
+    """
+    query: str = GET_SIMILAR_EDGES
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+
+    return [(record["source"], record["target"], record["score"]) for record in records]
+
+
+def get_mutually_exclusive_pairs(driver: Driver) -> list[tuple[str, str]]:
+    """Retrieves every pair of mutually exclusive modules, in both directions.
+
+    Args:
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      A list of (course code, course code) tuples.
+    """
+    query: str = GET_MUTUALLY_EXCLUSIVE_PAIRS
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+
+    return [(record["source"], record["target"]) for record in records]
+
+
+def get_student_rec_profile(
+    student_id: str, driver: Driver, timeout: float = None
+) -> StudentRecProfile:
+    """Retrieves what recommenders need to know about a student.
+
+    The transaction is terminated by the db if it runs for longer than the
+    timeout, given in seconds.
+
+    Args:
+      student_id:
+        The id of the student.
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      The profile of the student, which is empty if the student does not exist.
+    """
+    query: Query = Query(GET_STUDENT_REC_PROFILE, timeout=timeout)
+
+    eager_result: EagerResult = driver.execute_query(
+        query, student_id=student_id, routing_=RoutingControl.READ, database_="neo4j"
+    )
+    records: list[Record] = eager_result.records
+
+    if len(records) == 0:
+        return StudentRecProfile()
+
+    data: dict[str, any] = records[0].data()
+    data["disciplines"] = data["disciplines"] or []
+
+    return StudentRecProfile(**data)
+
+
+def get_students_for_recommender(driver: Driver) -> list[dict[str, any]]:
+    """Retrieves every student along with the modules they have taken.
+
+    Args:
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      A list of dicts holding the student id, disciplines and the course codes
+      of the modules taken by each student.
+    """
+    query: str = GET_STUDENTS_FOR_RECOMMENDER
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+
+    return [record.data() for record in records]
+
+
+def get_similar_students(student_id: str, driver: Driver) -> list[tuple[str, float]]:
+    """Retrieves the precomputed SIMILAR_TO_USER neighbours of a student.
+
+    Args:
+      student_id:
+        The id of the student.
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      A list of (student id, Jaccard index) tuples ordered by Jaccard index
+      and then by student id.
+    """
+    query: str = GET_SIMILAR_STUDENTS
+
+    eager_result: EagerResult = driver.execute_query(
+        query, student_id=student_id, routing_=RoutingControl.READ, database_="neo4j"
+    )
+    records: list[Record] = eager_result.records
+
+    return [(record["student_id"], record["score"]) for record in records]
+
+
+def write_similar_students(rows: list[dict[str, any]], driver: Driver):
+    """Replaces the SIMILAR_TO_USER edges of a batch of students.
+
+    Args:
+      rows:
+        A list of dicts holding a student id and the list of neighbours of that
+        student, each neighbour being a dict of its student id and score.
+      driver:
+        An open instance of the neo4j.Driver.
+    """
+    query: str = WRITE_SIMILAR_STUDENTS
+
+    driver.execute_query(query, rows=rows, routing_=RoutingControl.WRITE, database_="neo4j")
+
+
+def get_enrollment_counts(driver: Driver) -> list[dict[str, any]]:
+    """Retrieves the number of students taking each module.
+
+    Args:
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      A list of dicts holding a course code, a list of disciplines, a year of
+      study and the number of students with those disciplines and year of
+      study taking the module.
+    """
+    query: str = GET_ENROLLMENT_COUNTS
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+
+    return [record.data() for record in records]
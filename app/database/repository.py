@@ -0,0 +1,380 @@
+"""
+Repository interface over the data of modules, students and recommendations.
+
+Services talk to a Repository instead of a neo4j.Driver so that the backend can
+be swapped. Neo4jRepository runs the Cypher queries of the *_db modules against
+a Neo4j server, while memory_repository.InMemoryRepository holds the graph in
+process and can stand in for the db locally and in benchmarks.
+"""
+
+from typing import Protocol
+
+from neo4j import Driver
+
+from . import auth_db, module_db, rec_db, student_db
+from ..models.module import Module, ModuleCourseCodeAndName, ModuleFieldset
+from ..models.rec import Recommendation, StoredRecommendation, StudentRecProfile
+from ..models.student import Student, StudentDB
+from ..tracing import traced_methods
+
+
+class Repository(Protocol):  # pylint: disable=too-many-public-methods
+    """The operations on the graph that services rely on.
+
+    Every operation has the semantics of the *_db function of the same name.
+    """
+
+    # Modules
+
+    def get_modules(
+        self, skip: int, limit: int, fieldset: ModuleFieldset = None
+    ) -> list[Module]:
+        """See module_db.get_modules."""
+
+    def get_modules_based_on_course_codes(self, course_codes: list[str]) -> list[Module]:
+        """See module_db.get_modules_based_on_course_codes."""
+
+    def get_prerequisite_groups_for_each_module(self, course_code: str) -> list[list[str]]:
+        """See module_db.get_prerequisite_groups_for_each_module."""
+
+    def get_mutually_exclusives_for_each_module(self, course_code: str) -> list[str]:
+        """See module_db.get_mutually_exclusives_for_each_module."""
+
+    def get_module(self, course_code: str, fieldset: ModuleFieldset = None) -> Module:
+        """See module_db.get_module."""
+
+    def search_modules(
+        self, search_term: str, skip: int, limit: int, fieldset: ModuleFieldset = None
+    ) -> list[Module]:
+        """See module_db.search_modules."""
+
+    def get_modules_course_codes(self) -> list[str]:
+        """See module_db.get_modules_course_codes."""
+
+    def get_faculties(self) -> list[str]:
+        """See module_db.get_faculties."""
+
+    def get_modules_in_a_faculty(self, faculty: str) -> list[ModuleCourseCodeAndName]:
+        """See module_db.get_modules_in_a_faculty."""
+
+    def get_total_number_of_modules(self) -> int:
+        """See module_db.get_total_number_of_modules."""
+
+    def search_for_modules(self, modules: list[str]) -> list[str]:
+        """See module_db.search_for_modules."""
+
+    # Students
+
+    def get_student(self, student_id: str) -> StudentDB:
+        """See student_db.get_student."""
+
+    def get_all_student_ids(self) -> list[str]:
+        """See student_db.get_all_student_ids."""
+
+    def find_student_ids(self, major: str = None, year_of_study: int = None) -> list[str]:
+        """See student_db.find_student_ids."""
+
+    def get_student_courses(self, student_id: str) -> list[str]:
+        """See student_db.get_student_courses."""
+
+    def update_student(self, student_update: Student) -> Student:
+        """See student_db.update_student."""
+
+    def remove_modules(self, student_id: str, modules_to_be_removed: list[str]):
+        """See student_db.remove_modules."""
+
+    def add_modules(self, student_id: str, modules_to_be_added: list[str]):
+        """See student_db.add_modules."""
+
+    def get_modules_currently_taken(self, student_id: str) -> list[Module]:
+        """See student_db.get_modules_currently_taken."""
+
+    # Authentication
+
+    def register_student(self, new_student: StudentDB, hashed_password: str):
+        """See auth_db.register_student."""
+
+    # Recommendations
+
+    def get_cb_recs_that_fulfil_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        max_similarity: float = 0.85,
+    ) -> list[Module]:
+        """See rec_db.get_cb_recs_that_fulfil_prereq."""
+
+    def get_cb_recs_that_have_no_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        max_similarity: float = 0.85,
+    ) -> list[Module]:
+        """See rec_db.get_cb_recs_that_have_no_prereq."""
+
+    def get_cf_recs_that_fulfill_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        number_of_neighbours: int = 10,
+    ) -> list[Module]:
+        """See rec_db.get_cf_recs_that_fulfill_prereq."""
+
+    def get_cf_recs_that_have_no_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        number_of_neighbours: int = 10,
+    ) -> list[Module]:
+        """See rec_db.get_cf_recs_that_have_no_prereq."""
+
+    def get_stored_recommendations(self, student_id: str) -> StoredRecommendation:
+        """See rec_db.get_stored_recommendations."""
+
+    def store_recommendations(
+        self,
+        student_id: str,
+        recommendation: Recommendation,
+        generation: int,
+        computed_at: float,
+    ):
+        """See rec_db.store_recommendations."""
+
+    def invalidate_stored_recommendations(self, student_id: str, now: float):
+        """See rec_db.invalidate_stored_recommendations."""
+
+    def invalidate_all_stored_recommendations(self, now: float):
+        """See rec_db.invalidate_all_stored_recommendations."""
+
+    def get_modules_for_recommender(self) -> list[dict[str, any]]:
+        """See rec_db.get_modules_for_recommender."""
+
+    def get_similar_edges(self) -> list[tuple[str, str, float]]:
+        """See rec_db.get_similar_edges."""
+
+    def get_mutually_exclusive_pairs(self) -> list[tuple[str, str]]:
+        """See rec_db.get_mutually_exclusive_pairs."""
+
+    def get_student_rec_profile(
+        self, student_id: str, timeout: float = None
+    ) -> StudentRecProfile:
+        """See rec_db.get_student_rec_profile."""
+
+    def get_students_for_recommender(self) -> list[dict[str, any]]:
+        """See rec_db.get_students_for_recommender."""
+
+    def get_similar_students(self, student_id: str) -> list[tuple[str, float]]:
+        """See rec_db.get_similar_students."""
+
+    def write_similar_students(self, rows: list[dict[str, any]]):
+        """See rec_db.write_similar_students."""
+
+    def get_enrollment_counts(self) -> list[dict[str, any]]:
+        """See rec_db.get_enrollment_counts."""
+
+
+@traced_methods("repository")
+class Neo4jRepository:  # pylint: disable=too-many-public-methods
+    """Repository backed by a Neo4j server.
+
+    Attributes:
+      driver:
+        An open instance of the neo4j.Driver that the queries are run on.
+    """
+
+    def __init__(self, driver: Driver):
+        self.driver: Driver = driver
+
+    def get_modules(
+        self, skip: int, limit: int, fieldset: ModuleFieldset = None
+    ) -> list[Module]:
+        """See module_db.get_modules."""
+        return module_db.get_modules(skip, limit, self.driver, fieldset)
+
+    def get_modules_based_on_course_codes(self, course_codes: list[str]) -> list[Module]:
+        """See module_db.get_modules_based_on_course_codes."""
+        return module_db.get_modules_based_on_course_codes(course_codes, self.driver)
+
+    def get_prerequisite_groups_for_each_module(self, course_code: str) -> list[list[str]]:
+        """See module_db.get_prerequisite_groups_for_each_module."""
+        return module_db.get_prerequisite_groups_for_each_module(course_code, self.driver)
+
+    def get_mutually_exclusives_for_each_module(self, course_code: str) -> list[str]:
+        """See module_db.get_mutually_exclusives_for_each_module."""
+        return module_db.get_mutually_exclusives_for_each_module(course_code, self.driver)
+
+    def get_module(self, course_code: str, fieldset: ModuleFieldset = None) -> Module:
+        """See module_db.get_module."""
+        return module_db.get_module(course_code, self.driver, fieldset)
+
+    def search_modules(
+        self, search_term: str, skip: int, limit: int, fieldset: ModuleFieldset = None
+    ) -> list[Module]:
+        """See module_db.search_modules."""
+        return module_db.search_modules(search_term, skip, limit, self.driver, fieldset)
+
+    def get_modules_course_codes(self) -> list[str]:
+        """See module_db.get_modules_course_codes."""
+        return module_db.get_modules_course_codes(self.driver)
+
+    def get_faculties(self) -> list[str]:
+        """See module_db.get_faculties."""
+        return module_db.get_faculties(self.driver)
+
+    def get_modules_in_a_faculty(self, faculty: str) -> list[ModuleCourseCodeAndName]:
+        """See module_db.get_modules_in_a_faculty."""
+        return module_db.get_modules_in_a_faculty(faculty, self.driver)
+
+    def get_total_number_of_modules(self) -> int:
+        """See module_db.get_total_number_of_modules."""
+        return module_db.get_total_number_of_modules(self.driver)
+
+    def search_for_modules(self, modules: list[str]) -> list[str]:
+        """See module_db.search_for_modules."""
+        return module_db.search_for_modules(modules, self.driver)
+
+    def get_student(self, student_id: str) -> StudentDB:
+        """See student_db.get_student."""
+        return student_db.get_student(student_id, self.driver)
+
+    def get_all_student_ids(self) -> list[str]:
+        """See student_db.get_all_student_ids."""
+        return student_db.get_all_student_ids(self.driver)
+
+    def find_student_ids(self, major: str = None, year_of_study: int = None) -> list[str]:
+        """See student_db.find_student_ids."""
+        return student_db.find_student_ids(self.driver, major, year_of_study)
+
+    def get_student_courses(self, student_id: str) -> list[str]:
+        """See student_db.get_student_courses."""
+        return student_db.get_student_courses(student_id, self.driver)
+
+    def update_student(self, student_update: Student) -> Student:
+        """See student_db.update_student."""
+        return student_db.update_student(student_update, self.driver)
+
+    def remove_modules(self, student_id: str, modules_to_be_removed: list[str]):
+        """See student_db.remove_modules."""
+        student_db.remove_modules(student_id, modules_to_be_removed, self.driver)
+
+    def add_modules(self, student_id: str, modules_to_be_added: list[str]):
+        """See student_db.add_modules."""
+        student_db.add_modules(student_id, modules_to_be_added, self.driver)
+
+    def get_modules_currently_taken(self, student_id: str) -> list[Module]:
+        """See student_db.get_modules_currently_taken."""
+        return student_db.get_modules_currently_taken(student_id, self.driver)
+
+    def register_student(self, new_student: StudentDB, hashed_password: str):
+        """See auth_db.register_student."""
+        auth_db.register_student(new_student, hashed_password, self.driver)
+
+    def get_cb_recs_that_fulfil_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        max_similarity: float = 0.85,
+    ) -> list[Module]:
+        """See rec_db.get_cb_recs_that_fulfil_prereq."""
+        return rec_db.get_cb_recs_that_fulfil_prereq(
+            student_id, self.driver, timeout, k, max_similarity
+        )
+
+    def get_cb_recs_that_have_no_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        max_similarity: float = 0.85,
+    ) -> list[Module]:
+        """See rec_db.get_cb_recs_that_have_no_prereq."""
+        return rec_db.get_cb_recs_that_have_no_prereq(
+            student_id, self.driver, timeout, k, max_similarity
+        )
+
+    def get_cf_recs_that_fulfill_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        number_of_neighbours: int = 10,
+    ) -> list[Module]:
+        """See rec_db.get_cf_recs_that_fulfill_prereq."""
+        return rec_db.get_cf_recs_that_fulfill_prereq(
+            student_id, self.driver, timeout, k, number_of_neighbours
+        )
+
+    def get_cf_recs_that_have_no_prereq(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        timeout: float = None,
+        k: int = 10,
+        number_of_neighbours: int = 10,
+    ) -> list[Module]:
+        """See rec_db.get_cf_recs_that_have_no_prereq."""
+        return rec_db.get_cf_recs_that_have_no_prereq(
+            student_id, self.driver, timeout, k, number_of_neighbours
+        )
+
+    def get_stored_recommendations(self, student_id: str) -> StoredRecommendation:
+        """See rec_db.get_stored_recommendations."""
+        return rec_db.get_stored_recommendations(student_id, self.driver)
+
+    def store_recommendations(
+        self,
+        student_id: str,
+        recommendation: Recommendation,
+        generation: int,
+        computed_at: float,
+    ):
+        """See rec_db.store_recommendations."""
+        rec_db.store_recommendations(
+            student_id, recommendation, generation, computed_at, self.driver
+        )
+
+    def invalidate_stored_recommendations(self, student_id: str, now: float):
+        """See rec_db.invalidate_stored_recommendations."""
+        rec_db.invalidate_stored_recommendations(student_id, now, self.driver)
+
+    def invalidate_all_stored_recommendations(self, now: float):
+        """See rec_db.invalidate_all_stored_recommendations."""
+        rec_db.invalidate_all_stored_recommendations(now, self.driver)
+
+    def get_modules_for_recommender(self) -> list[dict[str, any]]:
+        """See rec_db.get_modules_for_recommender."""
+        return rec_db.get_modules_for_recommender(self.driver)
+
+    def get_similar_edges(self) -> list[tuple[str, str, float]]:
+        """See rec_db.get_similar_edges."""
+        return rec_db.get_similar_edges(self.driver)
+
+    def get_mutually_exclusive_pairs(self) -> list[tuple[str, str]]:
+        """See rec_db.get_mutually_exclusive_pairs."""
+        return rec_db.get_mutually_exclusive_pairs(self.driver)
+
+    def get_student_rec_profile(
+        self, student_id: str, timeout: float = None
+    ) -> StudentRecProfile:
+        """See rec_db.get_student_rec_profile."""
+        return rec_db.get_student_rec_profile(student_id, self.driver, timeout)
+
+    def get_students_for_recommender(self) -> list[dict[str, any]]:
+        """See rec_db.get_students_for_recommender."""
+        return rec_db.get_students_for_recommender(self.driver)
+
+    def get_similar_students(self, student_id: str) -> list[tuple[str, float]]:
+        """See rec_db.get_similar_students."""
+        return rec_db.get_similar_students(student_id, self.driver)
+
+    def write_similar_students(self, rows: list[dict[str, any]]):
+        """See rec_db.write_similar_students."""
+        rec_db.write_similar_students(rows, self.driver)
+
+    def get_enrollment_counts(self) -> list[dict[str, any]]:
+        """See rec_db.get_enrollment_counts."""
+        return rec_db.get_enrollment_counts(self.driver)
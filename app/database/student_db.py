@@ -2,7 +2,7 @@
 Functions to interact with the db for user data
 """
 
-from neo4j import Driver, Record, EagerResult
+from neo4j import Driver, Record, EagerResult, RoutingControl
 
 from ..queries.student_cypher_queries import (
     GET_STUDENT,
@@ -10,6 +10,8 @@ from ..queries.student_cypher_queries import (
     UPDATE_STUDENT,
     DELETE_MODULE_TAKEN,
     ADD_MODULE_TAKEN,
+    GET_ALL_STUDENT_IDS,
+    FIND_STUDENT_IDS,
 )
 
 from ..models.student import Student, StudentDB
@@ -42,6 +44,7 @@ def get_student(student_id: str, driver: Driver) -> StudentDB:
     eager_result: EagerResult = driver.execute_query(
         query,
         student_id=student_id,
+        routing_=RoutingControl.READ,
         database_="neo4j",
     )
     records: list[Record] = eager_result.records
@@ -58,6 +61,68 @@ def get_student(student_id: str, driver: Driver) -> StudentDB:
     return student
 
 
+def get_all_student_ids(driver: Driver) -> list[str]:
+    """Retrieves the ids of all students in the db.
+
+    Args:
+      driver:
+        An open instance of the neo4j.Driver.
+
+    Returns:
+      A list of the ids of all students ordered by id.
+    """
+    query: str = GET_ALL_STUDENT_IDS
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+    student_ids: list[str] = []
+
+    for record in records:
+        data: dict[str, any] = record.data()
+        student_ids.append(data["student_id"])
+
+    return student_ids
+
+
+def find_student_ids(
+    driver: Driver, major: str = None, year_of_study: int = None
+) -> list[str]:
+    """Retrieves the ids of the students of a major and year of study.
+
+    Args:
+      driver:
+        An open instance of the neo4j.Driver.
+      major:
+        The major of the students. Any major if None.
+      year_of_study:
+        The year of study of the students. Any year if None.
+
+    Returns:
+      A list of the ids of the matching students ordered by id.
+    """
+    query: str = FIND_STUDENT_IDS
+
+    eager_result: EagerResult = driver.execute_query(
+        query,
+        major=major,
+        year_of_study=year_of_study,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
+    )
+    records: list[Record] = eager_result.records
+    student_ids: list[str] = []
+
+    for record in records:
+        data: dict[str, any] = record.data()
+        student_ids.append(data["student_id"])
+
+    return student_ids
+
+
 def get_student_courses(student_id: str, driver: Driver) -> list[str]:
     """Retrieves the modules that the student has taken.
 
@@ -77,7 +142,7 @@ def get_student_courses(student_id: str, driver: Driver) -> list[str]:
     query: str = GET_STUDENT_MODULES
 
     eager_result: EagerResult = driver.execute_query(
-        query, student_id=student_id, database_="neo4j"
+        query, student_id=student_id, routing_=RoutingControl.READ, database_="neo4j"
     )
     records: list[Record] = eager_result.records
     modules: list[str] = []
@@ -116,6 +181,7 @@ def update_student(student_update: Student, driver: Driver) -> Student:
         year_of_study=student_update.year_of_study,
         email=student_update.email,
         disciplines=student_update.disciplines,
+        routing_=RoutingControl.WRITE,
         database_="neo4j",
     )
     records: list[Record] = eager_result.records
@@ -147,6 +213,7 @@ def remove_modules(student_id: str, modules_to_be_removed: list[str], driver: Dr
             remove_module_taken_query,
             student_id=student_id,
             course_code=module,
+            routing_=RoutingControl.WRITE,
             database_="neo4j",
         )
 
@@ -172,6 +239,7 @@ def add_modules(student_id: str, modules_to_be_added: list[str], driver: Driver)
             add_module_taken_query,
             student_id=student_id,
             course_code=module,
+            routing_=RoutingControl.WRITE,
             database_="neo4j",
         )
 
@@ -181,7 +249,10 @@ def get_modules_currently_taken(student_id: str, driver: Driver) -> list[Module]
     get_current_modules_query: str = GET_STUDENT_MODULES
 
     current_modules_eager_result: EagerResult = driver.execute_query(
-        get_current_modules_query, student_id=student_id, database_="neo4j"
+        get_current_modules_query,
+        student_id=student_id,
+        routing_=RoutingControl.READ,
+        database_="neo4j",
     )
     records: list[Record] = current_modules_eager_result.records
     current_modules: list[Module] = []
@@ -1,20 +1,170 @@
 """
 Dependencies
 """
+from typing import Annotated
+
 from . import config  # pylint: disable=import-error
-from neo4j import GraphDatabase
+from fastapi import HTTPException, Query, status
+from neo4j import Driver, GraphDatabase
+from pydantic import ValidationError
+
+from .database.catalog import CatalogFile, CatalogRepository
+from .database.catalog_changes import VersionedCatalog
+from .database.instrumentation import InstrumentedDriver
+from .database.loader import ModuleLoader
+from .database.memory_repository import InMemoryRepository
+from .database.repository import Neo4jRepository, Repository
+from .models.module import MODULE_FIELDS, MODULE_RELATIONS, ModuleFieldset
 
 
 async def get_db_driver():
-    """Dependency to Neo4j db driver"""
+    """Dependency to Neo4j db driver
+
+    Requests share the driver returned by get_shared_driver, so that they
+    reuse the connections of its pool, opened during the warm-up, rather than
+    each connecting to the db.
+    """
+
+    yield get_shared_driver()
+
+
+async def get_repository():
+    """Dependency to the repository of the configured backend
+
+    Each request gets its own ModuleLoader, which memoizes and batches the
+    module lookups of the request.
+    """
+
+    settings = config.get_settings()
+
+    if settings.repository_backend == "memory":
+        yield ModuleLoader(with_catalog(get_memory_repository()))
+        return
+
+    async for driver in get_db_driver():
+        yield ModuleLoader(with_catalog(Neo4jRepository(driver)))
+
+
+shared_driver: Driver = None
+memory_repository: InMemoryRepository = None
+catalog_file: CatalogFile = None
+versioned_catalog: VersionedCatalog = None
+
+
+def get_shared_driver() -> Driver:
+    """Returns the driver shared by the requests and background work."""
+    global shared_driver  # pylint: disable=global-statement
+
+    if shared_driver is None:
+        settings = config.get_settings()
+        shared_driver = InstrumentedDriver(
+            GraphDatabase.driver(
+                settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+            )
+        )
+
+    return shared_driver
+
+
+def close_shared_driver():
+    """Closes the shared driver, if it was opened."""
+    global shared_driver  # pylint: disable=global-statement
+
+    if shared_driver is not None:
+        shared_driver.close()
+        shared_driver = None
+
+
+def get_memory_repository() -> InMemoryRepository:
+    """Returns the in-memory repository, loading its snapshot the first time."""
+    global memory_repository  # pylint: disable=global-statement
+
+    if memory_repository is None:
+        settings = config.get_settings()
+        memory_repository = (
+            InMemoryRepository.from_file(settings.memory_repository_snapshot)
+            if settings.memory_repository_snapshot
+            else InMemoryRepository()
+        )
+
+    return memory_repository
+
+
+def get_shared_repository() -> Repository:
+    """Returns a repository that outlives requests, for background work."""
+    if config.get_settings().repository_backend == "memory":
+        return with_catalog(get_memory_repository())
+
+    return with_catalog(Neo4jRepository(get_shared_driver()))
+
+
+def get_catalog_file() -> CatalogFile:
+    """Returns the catalog file, mapping it the first time."""
+    global catalog_file  # pylint: disable=global-statement
+
+    if catalog_file is None:
+        settings = config.get_settings()
+        catalog_file = CatalogFile(
+            settings.catalog_file, settings.catalog_check_interval_seconds
+        )
+
+    return catalog_file
+
+
+async def get_versioned_catalog():
+    """Dependency to the versions of the catalog file
+
+    The versions of the catalog are its builds, so there are none to report
+    when the catalog_file setting is unset.
+    """
+    global versioned_catalog  # pylint: disable=global-statement
+
+    if not config.get_settings().catalog_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The catalog is not versioned, as no catalog file is configured",
+        )
+
+    if versioned_catalog is None:
+        versioned_catalog = VersionedCatalog(get_catalog_file())
+
+    yield versioned_catalog
+
+
+def with_catalog(repo: Repository) -> Repository:
+    """Serves the catalog reads of a repository from the catalog file, if the
+    catalog_file setting is set."""
+    if not config.get_settings().catalog_file:
+        return repo
+
+    return CatalogRepository(repo, get_catalog_file())
+
+
+def get_module_fieldset(
+    fields: Annotated[
+        str | None,
+        Query(description=f"Comma-separated fields to return, among {', '.join(MODULE_FIELDS)}"),
+    ] = None,
+    include: Annotated[
+        str | None,
+        Query(
+            description="Comma-separated relations to return, among "
+            f"{', '.join(MODULE_RELATIONS)}"
+        ),
+    ] = None,
+) -> ModuleFieldset:
+    """Dependency to the sparse fieldset of the modules to be returned"""
+
+    def split(names: str | None) -> tuple[str, ...]:
+        if names is None:
+            return None
 
-    settings = config.Settings()
-    driver = GraphDatabase.driver(
-        settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
-    )
-    driver.verify_connectivity()
+        return tuple(name.strip() for name in names.split(",") if name.strip())
 
     try:
-        yield driver
-    finally:
-        driver.close()
+        return ModuleFieldset(fields=split(fields), include=split(include))
+    except ValidationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="; ".join(error["msg"] for error in exc.errors()),
+        ) from exc
@@ -0,0 +1,90 @@
+"""
+Batch job that writes the recommendations of many students as NDJSON.
+
+Usage:
+  python -m app.jobs.batch_recommendations [--student-ids ID ...] [--input FILE]
+      [--major MAJOR] [--year-of-study YEAR] [--concurrency N] [--output FILE]
+
+Students are given by id, on the command line or one per line in a file ("-"
+for stdin), or selected by major and year of study. Unlike POST
+/recommendations/batch, the job selects any number of students. One
+BatchRecommendation is written per line, in the order the recommendations are
+ready.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import nullcontext
+
+from neo4j import GraphDatabase
+
+from .. import config
+from ..database.repository import Neo4jRepository
+from ..models.rec import BatchRecommendationRequest
+from ..services.rec import resolve_batch_students, stream_batch_recommendations
+
+
+async def write_batch(student_ids: list[str], repo, concurrency: int, output) -> int:
+    """Streams the recommendations of the students to the output.
+
+    Returns:
+      The number of students whose recommendations could not be computed.
+    """
+    failures: int = 0
+
+    async for result in stream_batch_recommendations(student_ids, repo, concurrency):
+        output.write(result.model_dump_json() + "\n")
+        failures += result.error is not None
+
+    return failures
+
+
+def main():
+    """Entry point of the batch job."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--student-ids", nargs="+", default=[])
+    parser.add_argument("--input", default=None)
+    parser.add_argument("--major", default=None)
+    parser.add_argument("--year-of-study", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    student_ids: list[str] = list(args.student_ids)
+
+    if args.input is not None:
+        with nullcontext(sys.stdin) if args.input == "-" else open(
+            args.input, encoding="utf-8"
+        ) as lines:
+            student_ids.extend(line.strip() for line in lines if line.strip())
+
+    # The ids are resolved along with the filters rather than validated as
+    # part of the request, as a job may list more of them than a request.
+    batch = BatchRecommendationRequest(major=args.major, year_of_study=args.year_of_study)
+    settings = config.get_settings()
+
+    with GraphDatabase.driver(
+        settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+    ) as driver:
+        repo = Neo4jRepository(driver)
+        student_ids = list(dict.fromkeys(student_ids + resolve_batch_students(batch, repo)))
+
+        start: float = time.perf_counter()
+        with nullcontext(sys.stdout) if args.output is None else open(
+            args.output, "w", encoding="utf-8"
+        ) as output:
+            failures: int = asyncio.run(
+                write_batch(student_ids, repo, args.concurrency, output)
+            )
+
+    print(
+        f"Recommended modules to {len(student_ids) - failures} of {len(student_ids)} "
+        f"students in {time.perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
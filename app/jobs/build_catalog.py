@@ -0,0 +1,83 @@
+"""
+Batch job that builds the memory-mapped module catalog from the graph.
+
+Usage:
+  python -m app.jobs.build_catalog [--output catalog.bin] [--snapshot graph.json]
+                                   [--max-logged-changes 10000]
+
+The catalog is written next to the output path and swapped in atomically, so
+the workers mapping it pick it up on their next check without a restart. The
+output defaults to the catalog_file setting.
+
+Each build is the next version of the catalog, and its changes since the
+previous build are added to the change log kept next to the catalog, which
+holds at most --max-logged-changes changes.
+"""
+
+import argparse
+import time
+
+from neo4j import GraphDatabase
+
+from .. import config
+from ..database.catalog_changes import CHANGE_LOG_MAX_CHANGES, write_versioned_catalog
+from ..database.memory_repository import InMemoryRepository
+from ..database.repository import Neo4jRepository, Repository
+
+
+def build_catalog(
+    repo: Repository, path: str, max_changes: int = CHANGE_LOG_MAX_CHANGES
+) -> tuple[int, int]:
+    """Writes the next version of the catalog of every module of a repository.
+
+    Returns:
+      The number of modules in the catalog and its version.
+    """
+    modules = repo.get_modules(0, repo.get_total_number_of_modules())
+    version: int = write_versioned_catalog(path, modules, max_changes)
+
+    return len(modules), version
+
+
+def main():
+    """Entry point of the build job."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", default=None)
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="build from an in-memory repository snapshot instead of Neo4j",
+    )
+    parser.add_argument("--max-logged-changes", type=int, default=CHANGE_LOG_MAX_CHANGES)
+    args = parser.parse_args()
+
+    start: float = time.perf_counter()
+
+    if args.snapshot is not None:
+        output: str = args.output
+        if output is None:
+            parser.error("--output is required with --snapshot")
+        written, version = build_catalog(
+            InMemoryRepository.from_file(args.snapshot), output, args.max_logged_changes
+        )
+    else:
+        settings = config.get_settings()
+        output = args.output or settings.catalog_file
+        if not output:
+            parser.error("--output is required when the catalog_file setting is unset")
+
+        with GraphDatabase.driver(
+            settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+        ) as driver:
+            written, version = build_catalog(
+                Neo4jRepository(driver), output, args.max_logged_changes
+            )
+
+    print(
+        f"Wrote version {version} of {written} modules to {output} "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Batch job that precomputes the recommendations of every student.
+
+Usage:
+  python -m app.jobs.precompute_recommendations [--invalidate]
+
+Pass --invalidate after the similarity graph has been rebuilt so that every
+stored recommendation is marked stale before being recomputed.
+"""
+
+import argparse
+import asyncio
+import time
+
+from neo4j import GraphDatabase
+
+from .. import config
+from ..database.repository import Neo4jRepository
+from ..services.rec import precompute_recommendations
+
+
+def main():
+    """Entry point of the precompute job."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--invalidate", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = config.get_settings()
+
+    with GraphDatabase.driver(
+        settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+    ) as driver:
+        repo = Neo4jRepository(driver)
+
+        if args.invalidate:
+            repo.invalidate_all_stored_recommendations(time.time())
+
+        start: float = time.perf_counter()
+        count: int = asyncio.run(
+            precompute_recommendations(repo, args.chunk_size, args.concurrency)
+        )
+
+    print(
+        f"Precomputed recommendations for {count} students "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
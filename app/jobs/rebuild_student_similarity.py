@@ -0,0 +1,58 @@
+"""
+Batch job that rebuilds the SIMILAR_TO_USER edges with a MinHash LSH index.
+
+Usage:
+  python -m app.jobs.rebuild_student_similarity [--k 10] [--batch-size 500]
+
+The stored recommendations of every student are invalidated afterwards, as
+they depend on the similarity graph.
+"""
+
+import argparse
+import time
+
+from neo4j import GraphDatabase
+
+from .. import config
+from ..database.repository import Neo4jRepository
+from ..recommenders.minhash import (
+    NUM_BANDS,
+    NUM_PERMUTATIONS,
+    SIMILARITY_WRITE_BATCH_SIZE,
+    build_minhash_index,
+    write_similar_students,
+)
+
+
+def main():
+    """Entry point of the rebuild job."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=SIMILARITY_WRITE_BATCH_SIZE)
+    parser.add_argument("--permutations", type=int, default=NUM_PERMUTATIONS)
+    parser.add_argument("--bands", type=int, default=NUM_BANDS)
+    args = parser.parse_args()
+
+    settings = config.get_settings()
+
+    with GraphDatabase.driver(
+        settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+    ) as driver:
+        repo = Neo4jRepository(driver)
+        start: float = time.perf_counter()
+        index = build_minhash_index(
+            repo.get_students_for_recommender(), args.permutations, args.bands
+        )
+        print(f"Indexed {len(index.sets)} students in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        written: int = write_similar_students(index, repo, args.k, args.batch_size)
+        print(
+            f"Wrote neighbours of {written} students in {time.perf_counter() - start:.1f}s"
+        )
+
+        repo.invalidate_all_stored_recommendations(time.time())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,59 @@
 """
 Main module of the module2student Python backend
 """
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from .dependencies import close_shared_driver # pylint: disable=import-error
+from .middleware import ( # pylint: disable=import-error
+    AdmissionControlMiddleware,
+    BookmarksMiddleware,
+    ProfilingMiddleware,
+    QueryInstrumentationMiddleware,
+    RequestMetricsMiddleware,
+    TracingMiddleware,
+    register_routes,
+)
 from .routers import module # pylint: disable=import-error
 from .routers import student # pylint: disable=import-error
 from .routers import auth # pylint: disable=import-error
 from .routers import recommendation # pylint: disable=import-error
+from .routers import metrics # pylint: disable=import-error
+from .routers import health # pylint: disable=import-error
+from .services import warmup # pylint: disable=import-error
+from . import tracing # pylint: disable=import-error
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Installs the span exporter and warms up the app in the background, and
+    closes the db driver on shutdown."""
+    tracing.set_exporter(tracing.exporter_from_settings())
+    warm_up_task: asyncio.Task = asyncio.create_task(warmup.warm_up())
+
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        close_shared_driver()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(BookmarksMiddleware)
+app.add_middleware(QueryInstrumentationMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(module.router)
 app.include_router(student.router)
 app.include_router(auth.router)
 app.include_router(recommendation.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 @app.get("/")
 async def root():
@@ -20,3 +61,5 @@ async def root():
     API root endpoint
     """
     return { "message": "Hello Bigger Applications!"}
+
+register_routes(app.routes)
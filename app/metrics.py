@@ -0,0 +1,309 @@
+"""
+In-process metrics.
+
+Metrics are declared once at import time, together with their label names, and
+the children of each label set are created once and then reused, so recording
+a value never allocates on the request path. Where the label values are known
+up front, such as the routes of the app, the children are created at startup.
+
+The metrics are exposed in the Prometheus text format by exposition. Values
+that are cheaper to read than to track, such as the size of a connection pool,
+are read by collectors registered with register_collector when the metrics are
+exposed.
+"""
+
+import bisect
+import math
+import threading
+from typing import Callable, Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels.
+
+    Attributes:
+      name:
+        The name of the metric.
+      documentation:
+        A description of the metric.
+      labelnames:
+        The names of the labels of the metric.
+    """
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+        self.value: float = 0.0
+        self.children: dict[tuple[str, ...], "Counter"] = {}
+        self.lock: threading.Lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *labelvalues: str) -> "Counter":
+        """Returns the child counter of a label set, creating it the first time."""
+        child: Counter = self.children.get(labelvalues)
+
+        if child is None:
+            with self.lock:
+                child = self.children.get(labelvalues)
+                if child is None:
+                    child = self._new_child()
+                    self.children[labelvalues] = child
+
+        return child
+
+    def inc(self, amount: float = 1.0):
+        """Increases the count."""
+        with self.lock:
+            self.value += amount
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Yields the (name suffix, labels, value) samples of the metric."""
+        for labels, child in self._children():
+            yield "", labels, child.value
+
+    def _new_child(self) -> "Counter":
+        """Creates the metric of a single label set."""
+        child: Counter = Counter.__new__(Counter)
+        child.value = 0.0
+        child.lock = threading.Lock()
+
+        return child
+
+    def _children(self) -> Iterator[tuple[dict[str, str], any]]:
+        """Yields the labels and metric of every label set."""
+        if not self.labelnames:
+            yield {}, self
+            return
+
+        for labelvalues, child in list(self.children.items()):
+            yield dict(zip(self.labelnames, labelvalues)), child
+
+
+class Gauge(Counter):
+    """A value that goes up and down, optionally split by labels."""
+
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        """Decreases the value."""
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        """Sets the value."""
+        self.value = value
+
+    def _new_child(self) -> "Gauge":
+        child: Gauge = Gauge.__new__(Gauge)
+        child.value = 0.0
+        child.lock = threading.Lock()
+
+        return child
+
+
+class Histogram(Counter):
+    """Observations counted in cumulative buckets, optionally split by labels.
+
+    Attributes:
+      buckets:
+        The upper bounds of the buckets, in increasing order.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.buckets: tuple[float, ...] = tuple(buckets)
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float):
+        """Records an observation."""
+        index: int = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        for labels, child in self._children():
+            with child.lock:
+                counts: list[int] = list(child.counts)
+                total: float = child.sum
+
+            cumulative: int = 0
+
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+    def _new_child(self) -> "Histogram":
+        child: Histogram = Histogram.__new__(Histogram)
+        child.buckets = self.buckets
+        child.counts = [0] * (len(self.buckets) + 1)
+        child.sum = 0.0
+        child.lock = threading.Lock()
+
+        return child
+
+
+REGISTRY: list[Counter] = []
+COLLECTORS: list[Callable[[], None]] = []
+
+
+def register_collector(collector: Callable[[], None]):
+    """Registers a function that updates metrics right before they are exposed."""
+    COLLECTORS.append(collector)
+
+
+def exposition() -> str:
+    """Formats every metric in the Prometheus text exposition format."""
+    for collector in COLLECTORS:
+        collector()
+
+    lines: list[str] = []
+
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+
+        for suffix, labels, value in metric.samples():
+            label_text: str = ",".join(
+                f'{name}="{_escape(value)}"' for name, value in labels.items()
+            )
+            lines.append(
+                f"{metric.name}{suffix}"
+                f"{'{' + label_text + '}' if label_text else ''} {_format_value(value)}"
+            )
+
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    """Escapes a label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """Formats a sample value or bucket bound."""
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+
+    return repr(value)
+
+
+REC_SUB_QUERY_TIMEOUTS = Counter(
+    "rec_sub_query_timeouts_total",
+    "Recommendation sub-queries that missed their time budget.",
+    ("sub_query",),
+)
+REC_DEGRADED_RESPONSES = Counter(
+    "rec_degraded_responses_total",
+    "Recommendations returned with fallback results.",
+    ("fallback",),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to serve HTTP requests, by route template.",
+    ("method", "route"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being served.",
+)
+CYPHER_QUERY_DURATION = Histogram(
+    "cypher_query_duration_seconds",
+    "Time taken by Cypher queries, by query name.",
+    ("query",),
+)
+NEO4J_POOL_ACQUIRE_WAIT = Histogram(
+    "neo4j_pool_acquire_wait_seconds",
+    "Time spent waiting for a connection from the Neo4j connection pool.",
+)
+NEO4J_POOL_CONNECTIONS = Gauge(
+    "neo4j_pool_connections",
+    "Connections of the Neo4j connection pools, by state.",
+    ("state",),
+)
+NEO4J_POOL_MAX_SIZE = Gauge(
+    "neo4j_pool_max_size",
+    "Maximum number of connections of the Neo4j connection pools.",
+)
+BCRYPT_QUEUE_DEPTH = Gauge(
+    "bcrypt_queue_depth",
+    "Password hashes and checks waiting for a bcrypt worker.",
+)
+BCRYPT_DURATION = Histogram(
+    "bcrypt_duration_seconds",
+    "Time taken by password hashes and checks, queueing included.",
+    ("operation",),
+)
+ADMISSION_IN_PROGRESS = Gauge(
+    "admission_in_progress",
+    "Requests admitted and being served, by route class.",
+    ("route_class",),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting to be admitted, by route class.",
+    ("route_class",),
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_total",
+    "Requests rejected by admission control, by route class and reason.",
+    ("route_class", "reason"),
+)
+COALESCED_CALLS = Counter(
+    "coalesced_calls_total",
+    "Coalesced db calls, by operation and whether they ran or joined one in flight.",
+    ("operation", "result"),
+)
+COALESCED_IN_FLIGHT = Gauge(
+    "coalesced_calls_in_flight",
+    "Calls to the db in flight that identical calls may join, by operation.",
+    ("operation",),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups, by cache and result.",
+    ("cache", "result"),
+)
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio",
+    "Fraction of the lookups of each cache that were hits.",
+    ("cache",),
+)
+
+CACHE_HIT_RESULTS = ("hit", "stale")
+
+
+def _collect_cache_hit_ratios():
+    """Updates the hit ratio of every cache from its lookup counts."""
+    lookups: dict[str, list[float]] = {}
+
+    for (cache, result), child in list(CACHE_REQUESTS.children.items()):
+        totals: list[float] = lookups.setdefault(cache, [0.0, 0.0])
+        totals[0] += child.value if result in CACHE_HIT_RESULTS else 0.0
+        totals[1] += child.value
+
+    for cache, (hits, total) in lookups.items():
+        CACHE_HIT_RATIO.labels(cache).set(hits / total if total else 0.0)
+
+
+register_collector(_collect_cache_hit_ratios)
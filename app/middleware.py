@@ -0,0 +1,395 @@
+"""
+HTTP middleware of the app.
+
+The middleware are plain ASGI middleware rather than BaseHTTPMiddleware, which
+costs a task and a copy of the response stream per request.
+"""
+
+import asyncio
+import hmac
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import Iterable
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import config
+from .admission import AdmissionLimiter, route_class
+from .database.bookmarks import RequestBookmarks, current_request_bookmarks
+from .database.instrumentation import (
+    QueryCeilingExceeded,
+    RequestQueries,
+    current_queries,
+)
+from .metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+from .profiling import SamplingProfiler, save_profile
+from . import tracing
+
+UNMATCHED_ROUTE = "unmatched"
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+BOOKMARKS_HEADER = "Bookmarks"
+BOOKMARKS_COOKIE = "bookmarks"
+
+logger = logging.getLogger(__name__)
+profiling_lock: threading.Lock = threading.Lock()
+
+
+class RequestMetricsMiddleware:  # pylint: disable=too-few-public-methods
+    """Measures the latency of each request by route and the requests in flight.
+
+    Requests are labelled with the template of the route they matched, such as
+    "/students/{student_id}", so that the number of label sets stays bounded.
+    Requests that match no route share the "unmatched" label. The latency
+    includes streaming the response body.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app: ASGIApp = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start: float = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], route.path if route else UNMATCHED_ROUTE
+            ).observe(time.perf_counter() - start)
+
+
+class AdmissionControlMiddleware:  # pylint: disable=too-few-public-methods
+    """Sheds the requests of a route class beyond its capacity.
+
+    Each route class with a limit in the admission_limits setting gets an
+    AdmissionLimiter, queueing up to its admission_queue_sizes entry for at
+    most the admission_queue_timeout_seconds setting. Requests that are shed
+    get a 503 with a Retry-After header. Requests outside of any route class,
+    such as the probes and metrics, are never limited.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app: ASGIApp = app
+        settings: config.Settings = config.get_settings()
+        self.limiters: dict[str, AdmissionLimiter] = {
+            name: AdmissionLimiter(
+                name,
+                limit,
+                settings.admission_queue_sizes.get(name, 0),
+                settings.admission_queue_timeout_seconds,
+            )
+            for name, limit in settings.admission_limits.items()
+        }
+        self.retry_after: str = str(settings.admission_retry_after_seconds)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limiter: AdmissionLimiter = (
+            self.limiters.get(route_class(scope["method"], scope["path"]))
+            if scope["type"] == "http"
+            else None
+        )
+
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            response: JSONResponse = JSONResponse(
+                {"detail": "The server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": self.retry_after},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+class TracingMiddleware:  # pylint: disable=too-few-public-methods
+    """Runs each request in the root span of its trace.
+
+    The span is named after the method and route template of the request, and
+    continues the trace of the caller if the request has a valid traceparent
+    header. The traceparent of the span is returned in the response headers so
+    that callers can find the trace.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app: ASGIApp = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or tracing.get_exporter() is None:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent: bytes = dict(scope["headers"]).get(b"traceparent", b"")
+
+        with tracing.span(
+            f"{scope['method']} {scope['path']}",
+            {"http.method": scope["method"], "http.target": scope["path"]},
+            traceparent.decode("latin-1"),
+        ) as request_span:
+
+            async def send_with_traceparent(message: Message):
+                if message["type"] == "http.response.start":
+                    request_span.set_attribute("http.status_code", message["status"])
+                    MutableHeaders(scope=message).append(
+                        "traceparent", request_span.traceparent()
+                    )
+
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_traceparent)
+            finally:
+                route = scope.get("route")
+
+                if route is not None:
+                    request_span.name = f"{scope['method']} {route.path}"
+                    request_span.set_attribute("http.route", route.path)
+
+
+class ProfilingMiddleware:  # pylint: disable=too-few-public-methods
+    """Profiles the requests that ask for it or are sampled.
+
+    A request is profiled if its X-Profile header matches the profiling_token
+    setting, or at random with the profiling_sample_rate setting. Its profile
+    is saved in the profiling_dir directory, which keeps the latest
+    profiling_max_profiles profiles, and its id is returned in the
+    X-Profile-Id response header.
+
+    The profiler samples the whole process, so only one request is profiled
+    at a time and the others are served as is. When neither the token nor
+    the sample rate is set, requests pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app: ASGIApp = app
+        settings: config.Settings = config.get_settings()
+        self.token: bytes = settings.profiling_token.encode()
+        self.sample_rate: float = settings.profiling_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or (not self.token and self.sample_rate <= 0)
+            or not self._should_profile(scope)
+            or not profiling_lock.acquire(blocking=False)  # pylint: disable=consider-using-with
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id: str = uuid.uuid4().hex
+        profiler: SamplingProfiler = SamplingProfiler(
+            config.get_settings().profiling_interval_ms / 1000
+        )
+
+        async def send_with_profile_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, profile_id)
+
+            await send(message)
+
+        try:
+            profiler.start()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+
+            try:
+                path: str = await asyncio.to_thread(self._save, profile_id, profiler)
+                logger.info("Profiled %s %s in %s", scope["method"], scope["path"], path)
+            finally:
+                profiling_lock.release()
+
+    def _should_profile(self, scope: Scope) -> bool:
+        """Checks whether a request asks for a profile or is sampled."""
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+
+        return random.random() < self.sample_rate
+
+    @staticmethod
+    def _save(profile_id: str, profiler: SamplingProfiler) -> str:
+        """Saves the profile of a stopped profiler."""
+        settings: config.Settings = config.get_settings()
+
+        return save_profile(
+            profile_id,
+            profiler.samples(),
+            settings.profiling_dir,
+            settings.profiling_max_profiles,
+        )
+
+
+class BookmarksMiddleware:  # pylint: disable=too-few-public-methods
+    """Carries each student's bookmarks across the workers, through the client.
+
+    The bookmarks token a request carries in its Bookmarks header, or else in
+    its bookmarks cookie, is added to the bookmarks of the student the request
+    is made on behalf of. The bookmarks of that student are returned in the
+    Bookmarks header and the bookmarks cookie of the response, which expires
+    after the bookmarks_cookie_max_age_seconds setting, by when the replicas
+    have long caught up. See app.database.bookmarks.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app: ASGIApp = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers: dict[bytes, bytes] = dict(scope["headers"])
+        token: str = headers.get(BOOKMARKS_HEADER.lower().encode("latin-1"), b"").decode(
+            "latin-1"
+        ) or cookie_parser(headers.get(b"cookie", b"").decode("latin-1")).get(
+            BOOKMARKS_COOKIE
+        )
+        bookmarks: RequestBookmarks = RequestBookmarks(token or None)
+        context_token = current_request_bookmarks.set(bookmarks)
+
+        async def send_with_bookmarks(message: Message):
+            if message["type"] == "http.response.start":
+                response_token: str = bookmarks.response_token()
+
+                if response_token is not None:
+                    response_headers: MutableHeaders = MutableHeaders(scope=message)
+                    response_headers.append(BOOKMARKS_HEADER, response_token)
+                    response_headers.append(
+                        "Set-Cookie",
+                        f"{BOOKMARKS_COOKIE}={response_token}; Path=/; "
+                        f"Max-Age={config.get_settings().bookmarks_cookie_max_age_seconds}; "
+                        "HttpOnly; SameSite=Lax",
+                    )
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_bookmarks)
+        finally:
+            current_request_bookmarks.reset(context_token)
+
+
+class QueryInstrumentationMiddleware:  # pylint: disable=too-few-public-methods
+    """Records the db queries run on behalf of each request.
+
+    The queries run until the response starts are summarised in its
+    Server-Timing header and logged with the endpoint, with the per-query
+    totals as structured extras. The body of a streamed response is produced
+    after its headers, so its queries are not accounted for.
+
+    If the endpoint has a ceiling in the query_count_ceilings setting, keyed
+    like "GET /modules/", running more queries than the ceiling is logged as
+    a warning, or raises QueryCeilingExceeded if the
+    query_count_ceiling_action setting is "raise", as in tests.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app: ASGIApp = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries: RequestQueries = RequestQueries()
+        token = current_queries.set(queries)
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", report_queries(scope, queries)
+                )
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_queries.reset(token)
+
+
+def report_queries(scope: Scope, queries: RequestQueries) -> str:
+    """Logs the queries of a request and checks them against its ceiling.
+
+    Returns:
+      The queries formatted as a Server-Timing header value.
+    """
+    route = scope.get("route")
+    endpoint: str = f"{scope['method']} {route.path if route else scope['path']}"
+    count: int = queries.count()
+    duration: float = queries.total_duration()
+    by_name: dict[str, dict[str, float]] = queries.by_name()
+
+    logger.info(
+        "%s ran %d queries in %.1fms",
+        endpoint,
+        count,
+        duration,
+        extra={
+            "endpoint": endpoint,
+            "query_count": count,
+            "query_duration_ms": duration,
+            "queries": by_name,
+        },
+    )
+
+    settings: config.Settings = config.get_settings()
+    ceiling: int = settings.query_count_ceilings.get(endpoint)
+
+    if ceiling is not None and count > ceiling:
+        message: str = f"{endpoint} ran {count} queries, above its ceiling of {ceiling}"
+
+        if settings.query_count_ceiling_action == "raise":
+            raise QueryCeilingExceeded(message)
+
+        logger.warning(message, extra={"endpoint": endpoint, "query_count": count})
+
+    return server_timing(count, duration, by_name)
+
+
+def server_timing(
+    count: int, duration: float, by_name: dict[str, dict[str, float]]
+) -> str:
+    """Formats the queries of a request as a Server-Timing header value.
+
+    The first metric is the total time spent in the db, followed by one metric
+    per query name.
+    """
+    metrics: list[str] = [f'db;dur={duration:.2f};desc="{count} queries"']
+
+    for name, total in by_name.items():
+        metrics.append(
+            f'{name};dur={total["duration"]:.2f};'
+            f'desc="{total["calls"]} calls, {total["rows"]} rows"'
+        )
+
+    return ", ".join(metrics)
+
+
+def register_routes(routes: Iterable[BaseRoute]):
+    """Creates the latency histograms of every route up front."""
+    for route in routes:
+        for method in getattr(route, "methods", None) or ():
+            HTTP_REQUEST_DURATION.labels(method, route.path)
@@ -4,7 +4,7 @@ This package contains the Pydantic model defintiions used for modules.
 
 """
 from typing import Union
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, field_validator
 
 
 class ModuleCourseCodeAndName(BaseModel):
@@ -72,3 +72,121 @@ class Module(BaseModel):
     prerequisites: list[list[str]] = []
     mutually_exclusives: list[str] = []
     score: float = 0.0
+
+
+MODULE_RELATIONS: tuple[str, ...] = ("prerequisites", "mutually_exclusives")
+MODULE_FIELDS: tuple[str, ...] = tuple(
+    name for name in Module.model_fields if name not in MODULE_RELATIONS
+)
+IDENTIFYING_FIELDS: tuple[str, ...] = ("course_code", "course_name")
+
+
+class ModuleFieldset(BaseModel):
+    """Sparse fieldset of the modules to be returned
+
+    This is a Pydantic model for the fields= and include= parameters of the
+    endpoints returning modules. A fieldset is hashable, so that it can be
+    part of a cache or coalescing key.
+
+    Attributes:
+      fields:
+        The names of the MODULE_FIELDS to be returned, None for all of them.
+        The course code is always returned.
+      include:
+        The names of the MODULE_RELATIONS to be returned, None for those the
+        endpoint returns by default.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    fields: Union[tuple[str, ...], None] = None
+    include: Union[tuple[str, ...], None] = None
+
+    @field_validator("fields")
+    @classmethod
+    def check_fields(cls, fields: tuple[str, ...]) -> tuple[str, ...]:
+        """Rejects the names that are not in MODULE_FIELDS."""
+        return _check_names(fields, MODULE_FIELDS)
+
+    @field_validator("include")
+    @classmethod
+    def check_include(cls, include: tuple[str, ...]) -> tuple[str, ...]:
+        """Rejects the names that are not in MODULE_RELATIONS."""
+        return _check_names(include, MODULE_RELATIONS)
+
+    def is_sparse(self) -> bool:
+        """Returns whether the fieldset differs from the default one."""
+        return self.fields is not None or self.include is not None
+
+    def properties(self) -> tuple[str, ...]:
+        """Returns the fields to be retrieved, in the order of MODULE_FIELDS.
+
+        The course code and name are always retrieved, as a Module needs them.
+        """
+        return tuple(
+            name
+            for name in MODULE_FIELDS
+            if self.fields is None or name in self.fields or name in IDENTIFYING_FIELDS
+        )
+
+    def relations(self, default: tuple[str, ...] = MODULE_RELATIONS) -> tuple[str, ...]:
+        """Returns the relations to be retrieved, given the endpoint's default."""
+        include: tuple[str, ...] = default if self.include is None else self.include
+
+        return tuple(name for name in MODULE_RELATIONS if name in include)
+
+    def excluded(self, default: tuple[str, ...] = MODULE_RELATIONS) -> set[str]:
+        """Returns the names of the Module fields to be left out of responses."""
+        returned: set[str] = {"course_code", *self.relations(default)}
+        returned.update(MODULE_FIELDS if self.fields is None else self.fields)
+
+        return set(Module.model_fields) - returned
+
+
+def _check_names(names: tuple[str, ...], allowed: tuple[str, ...]) -> tuple[str, ...]:
+    """Checks names against a whitelist, dropping the duplicates."""
+    if names is None:
+        return None
+
+    unknown: list[str] = [name for name in names if name not in allowed]
+
+    if unknown:
+        raise ValueError(
+            f"Unknown names {', '.join(unknown)}, expected some of {', '.join(allowed)}"
+        )
+
+    return tuple(dict.fromkeys(names))
+
+
+class CatalogChanges(BaseModel):
+    """Changes of the catalog since a version.
+
+    The changes carry the current state of what changed, not the steps it
+    took, so applying them more than once or on top of a later copy is safe.
+
+    Attributes:
+      version:
+        The current version of the catalog.
+      full_resync:
+        Whether the changes since the version asked for are no longer logged,
+        in which case the catalog has to be downloaded again in full and the
+        other attributes are empty.
+      modules:
+        The modules added or whose properties changed, without their
+        prerequisites and mutually exclusives.
+      prerequisites:
+        The prerequisite groups of each module added or whose groups were
+        added, changed or removed, keyed by course code.
+      mutually_exclusives:
+        The mutually exclusive modules of each module added or whose mutually
+        exclusives changed, keyed by course code.
+      removed:
+        The course codes of the modules removed.
+    """
+
+    version: int
+    full_resync: bool = False
+    modules: list[Module] = []
+    prerequisites: dict[str, list[list[str]]] = {}
+    mutually_exclusives: dict[str, list[str]] = {}
+    removed: list[str] = []
@@ -4,9 +4,12 @@ This package contains the Pydantic model defintiions used for recommendations.
 
 """
 
-from pydantic import BaseModel
+from typing import Union
+from pydantic import BaseModel, Field
 from .module import Module
 
+BATCH_MAX_STUDENT_IDS = 10000
+
 
 class Recommendation(BaseModel):
     """Model for recommendations
@@ -18,7 +21,122 @@ class Recommendation(BaseModel):
         The list of modules recommended through collaborative filtering.
       cbf_recommendations:
         The list of modules recommended through content-based filtering.
+      timings:
+        The time taken in milliseconds by each recommendation sub-query,
+        keyed by sub-query name, along with the total time taken.
+      degraded:
+        Whether some sub-queries missed their time budget, in which case the
+        recommendations are partial or fall back on older or popular modules.
+      missed_sub_queries:
+        The names of the sub-queries that missed their time budget.
     """
 
     cf_recommendations: list[Module] = []
     cbf_recommendations: list[Module] = []
+    timings: dict[str, float] = {}
+    degraded: bool = False
+    missed_sub_queries: list[str] = []
+
+
+class RecommendationParams(BaseModel):
+    """Model for the parameters of recommendations
+
+    Attributes:
+      k:
+        The number of modules recommended by each recommender.
+      number_of_neighbours:
+        The number of most similar students whose modules are considered by
+        collaborative filtering.
+      max_similarity:
+        The similarity score at or above which a module is considered too
+        similar to a taken module to be recommended by content-based
+        filtering.
+    """
+
+    k: int = 10
+    number_of_neighbours: int = 10
+    max_similarity: float = 0.85
+
+
+class StoredRecommendation(BaseModel):
+    """Model for materialized recommendations
+
+    This is a Pydantic model for the recommendations of a student that have
+    been precomputed and stored in the db.
+
+    Attributes:
+      recommendation:
+        The stored recommendations of the student.
+      computed_at:
+        The unix timestamp of when the recommendations were computed. None if
+        the recommendations have never been computed.
+      stale_since:
+        The unix timestamp of when the recommendations were invalidated. None if
+        the recommendations are still fresh.
+      generation:
+        The number of times the recommendations have been invalidated. Used to
+        discard a recomputation that was overtaken by a newer invalidation.
+    """
+
+    recommendation: Recommendation = Recommendation()
+    computed_at: Union[float, None] = None
+    stale_since: Union[float, None] = None
+    generation: int = 0
+
+
+class StudentRecProfile(BaseModel):
+    """Model for what recommenders need to know about a student
+
+    Attributes:
+      course_codes:
+        The course codes of the modules taken by the student.
+      disciplines:
+        The disciplines of the student.
+      year_of_study:
+        The student's year of study.
+      number_of_neighbours:
+        The number of students the student is SIMILAR_TO_USER.
+    """
+
+    course_codes: list[str] = []
+    disciplines: list[str] = []
+    year_of_study: Union[int, None] = None
+    number_of_neighbours: int = 0
+
+
+class BatchRecommendationRequest(BaseModel):
+    """Model for batch recommendation requests
+
+    Either the ids of the students are given or the students are selected by
+    major and year of study. Students matching every given filter are selected.
+
+    Attributes:
+      student_ids:
+        The ids of the students to recommend modules to, at most
+        BATCH_MAX_STUDENT_IDS.
+      major:
+        The major of the students to recommend modules to.
+      year_of_study:
+        The year of study of the students to recommend modules to.
+    """
+
+    student_ids: list[str] = Field(default=[], max_length=BATCH_MAX_STUDENT_IDS)
+    major: Union[str, None] = None
+    year_of_study: Union[int, None] = None
+
+
+class BatchRecommendation(BaseModel):
+    """Model for a single student's result in a batch of recommendations
+
+    Attributes:
+      student_id:
+        The id of the student.
+      recommendation:
+        The recommendations of the student, if they could be computed.
+      error:
+        The reason why the recommendations could not be computed, if any.
+    """
+
+    student_id: str
+    recommendation: Union[Recommendation, None] = None
+    error: Union[str, None] = None
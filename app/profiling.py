@@ -0,0 +1,123 @@
+"""
+Sampling profiler for single requests.
+
+A SamplingProfiler samples the stacks of every thread of the process at a
+fixed interval from a background thread, and counts them in the collapsed
+stack format read by flamegraph.pl, speedscope and most flamegraph tools. Each
+line of a profile is a stack, root first, with frames separated by semicolons,
+followed by the number of samples it was seen in.
+
+The handlers of a request run on the event loop thread and in worker threads,
+so the whole process is sampled. Requests served concurrently with a profiled
+request show up in its profile, each stack being rooted at the name of its
+thread.
+"""
+
+import collections
+import os
+import sys
+import threading
+from types import FrameType
+
+PROFILE_SUFFIX = ".collapsed"
+
+
+class SamplingProfiler:
+    """Samples the stacks of the threads of the process until stopped.
+
+    Attributes:
+      interval:
+        The time between samples in seconds.
+      counts:
+        The number of samples of each collapsed stack.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval: float = interval
+        self.counts: collections.Counter[str] = collections.Counter()
+        self.stopped: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(
+            target=self._run, name="profiler", daemon=True
+        )
+
+    def start(self):
+        """Starts sampling."""
+        self.thread.start()
+
+    def stop(self):
+        """Stops sampling. The sample being taken, if any, is still counted."""
+        self.stopped.set()
+
+    def samples(self) -> collections.Counter:
+        """Waits for the profiler to stop and returns the samples."""
+        self.thread.join()
+
+        return self.counts
+
+    def _run(self):
+        """Samples the stacks until stopped, starting right away so that short
+        requests get at least one sample."""
+        own_id: int = threading.get_ident()
+
+        while True:
+            names: dict[int, str] = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+
+            for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if thread_id != own_id:
+                    self.counts[collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+
+            if self.stopped.wait(self.interval):
+                return
+
+
+def collapse(thread_name: str, frame: FrameType) -> str:
+    """Formats the stack ending at a frame as a collapsed stack."""
+    frames: list[str] = []
+
+    while frame is not None:
+        code = frame.f_code
+        frames.append(
+            f"{frame.f_globals.get('__name__', '?')}."
+            f"{getattr(code, 'co_qualname', code.co_name)}"
+        )
+        frame = frame.f_back
+
+    frames.append(thread_name)
+
+    return ";".join(reversed(frames)).replace(" ", "_")
+
+
+def save_profile(
+    profile_id: str, counts: collections.Counter, directory: str, max_profiles: int
+) -> str:
+    """Writes a profile to a directory, deleting the oldest profiles past the
+    maximum.
+
+    Returns:
+      The path of the profile.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path: str = os.path.join(directory, profile_id + PROFILE_SUFFIX)
+
+    with open(path, "w", encoding="utf-8") as profile:
+        for stack, count in counts.most_common():
+            profile.write(f"{stack} {count}\n")
+
+    profiles: list[os.DirEntry] = sorted(
+        (
+            entry
+            for entry in os.scandir(directory)
+            if entry.name.endswith(PROFILE_SUFFIX)
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+
+    for entry in profiles[: max(len(profiles) - max_profiles, 0)]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    return path
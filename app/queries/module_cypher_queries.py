@@ -1,35 +1,94 @@
 """
 CRUD Cypher queries for modules
+
+The queries returning modules are built from a *_TEMPLATE by filling in the
+projection of the module variable with module_projection. The constants hold
+the default projection of each query, and the db functions build the sparse
+ones at runtime, from the whitelisted properties and relations only.
 """
 
-GET_ALL_MODULES = (
+MODULE_PROPERTIES = (
+    "course_code",
+    "course_name",
+    "course_info",
+    "academic_units",
+    "broadening_and_deepening",
+    "faculty",
+    "grade_type",
+)
+MODULE_RELATION_PROJECTIONS = {
+    "prerequisites": (
+        "[({variable})<-[:ARE_PREREQUISITES]-(pg:PrerequisiteGroup) "
+        + "| [(pg)<-[:INSIDE]-(prereq:Module) | prereq.course_code]]"
+    ),
+    "mutually_exclusives": (
+        "[({variable})-[:MUTUALLY_EXCLUSIVE]->(mutual:Module) | mutual.course_code]"
+    ),
+}
+
+
+def module_projection(
+    variable: str, properties: tuple = MODULE_PROPERTIES, relations: tuple = ()
+) -> str:
+    """Returns the RETURN items of the properties and relations of a module.
+
+    Only the names of MODULE_PROPERTIES and MODULE_RELATION_PROJECTIONS are
+    projected, whatever else is asked for, so that no input ends up in the
+    query text. Each item is named after the Module field it fills.
+    """
+    items: list[str] = [
+        f"{variable}.{name} AS {name}" for name in MODULE_PROPERTIES if name in properties
+    ]
+    items.extend(
+        f"{projection.format(variable=variable)} AS {name}"
+        for name, projection in MODULE_RELATION_PROJECTIONS.items()
+        if name in relations
+    )
+
+    return ", ".join(items)
+
+
+GET_ALL_MODULES_TEMPLATE = (
     "MATCH (m:Module) "
     "WITH COUNT(m) AS total "
     "MATCH (m:Module) "
-    "RETURN m.course_code AS course_code, m.course_name AS course_name, m.course_info AS course_info, "  # pylint: disable=line-too-long
-    "m.faculty AS faculty, m.academic_units AS academic_units, m.broadening_and_deepening AS broadening_and_deepening, m.grade_type AS grade_type, total "  # pylint: disable=line-too-long
+    "RETURN {projection}, total "
     "SKIP $skip LIMIT $limit"
 )
 
-GET_MODULE = (
+GET_ALL_MODULES = GET_ALL_MODULES_TEMPLATE.format(
+    projection=module_projection("m", relations=tuple(MODULE_RELATION_PROJECTIONS))
+)
+
+GET_MODULE_TEMPLATE = (
     "MATCH (m:Module) "
     "WHERE m.course_code = $course_code "
-    "RETURN m.course_code AS course_code, m.course_name AS course_name, m.course_info AS course_info, "  # pylint: disable=line-too-long
-    "m.faculty AS faculty, m.academic_units AS academic_units, m.broadening_and_deepening AS broadening_and_deepening, m.grade_type AS grade_type"  # pylint: disable=line-too-long
+    "RETURN {projection}"
+)
+
+GET_MODULE = GET_MODULE_TEMPLATE.format(projection=module_projection("m"))
+
+GET_MODULE_WITH_RELATIONS = GET_MODULE_TEMPLATE.format(
+    projection=module_projection("m", relations=tuple(MODULE_RELATION_PROJECTIONS))
 )
 
-SEARCH_MODULES = (
+GET_MODULES_BY_COURSE_CODES = (
+    "MATCH (m:Module) "
+    "WHERE m.course_code IN $course_codes "
+    "RETURN "
+    + module_projection("m", relations=tuple(MODULE_RELATION_PROJECTIONS))
+)
+
+SEARCH_MODULES_TEMPLATE = (
     "CALL db.index.fulltext.queryNodes('moduleIndex', $search_term) YIELD node, score "
     + "WITH COUNT(*) AS total "
     + "CALL db.index.fulltext.queryNodes('moduleIndex', $search_term) YIELD node, score "
-    + "RETURN node.course_code AS course_code, node.course_name AS course_name, "
-    + "node.course_info AS course_info, node.academic_units AS academic_units, "
-    + "node.faculty AS faculty, node.grade_type AS grade_type, "
-    + "node.broadening_and_deepening AS broadening_and_deepening, "
-    + " score, total "
+    + "RETURN {projection}, score, total "
     + "SKIP $skip LIMIT $limit"
 )
 
+SEARCH_MODULES = SEARCH_MODULES_TEMPLATE.format(projection=module_projection("node"))
+
 GET_MODULES_COURSE_CODES = "MATCH (m:Module) " + "RETURN m.course_code AS course_code"
 
 GET_FACULTIES = (
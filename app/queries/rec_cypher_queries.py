@@ -6,13 +6,16 @@ GET_CB_MODULES_THAT_FULFILL_PREREQS = (
     "MATCH (s:Student)-[t:TAKES]->(m:Module) " +
     "WHERE s.student_id = $student_id " +
     "MATCH (m)-[sim:SIMILAR]->(rec:Module { community: m.community }) " +
-    "WHERE NOT (rec)<-[:MUTUALLY_EXCLUSIVE]->(m) AND sim.score < 0.85 " +
+    "WHERE NOT (rec)<-[:MUTUALLY_EXCLUSIVE]->(m) AND sim.score < $max_similarity " +
     "MATCH (rec)<-[:ARE_PREREQUISITES]-(prereq_group:PrerequisiteGroup)<-[:INSIDE]-(prereq:Module) " + # pylint: disable=line-too-long
     "MATCH (s:Student)-[t:TAKES]->(prereq:Module) " +
     "WHERE rec.broadening_and_deepening = true " +
+    "WITH rec, MAX(sim.score) AS score " +
+    "ORDER BY score DESC, rec.course_code " +
+    "LIMIT $k " +
     "RETURN rec.course_code AS course_code, rec.course_name AS course_name, rec.course_info AS course_info, " + # pylint: disable=line-too-long
     "rec.faculty AS faculty, rec.academic_units AS academic_units, rec.grade_type AS grade_type, " +
-    "rec.broadening_and_deepening AS broadening_and_deepening, sim.score AS score LIMIT 10"
+    "rec.broadening_and_deepening AS broadening_and_deepening, score"
 )
 
 
@@ -20,22 +23,24 @@ GET_CB_MODULES_WITH_NO_PREREQS = (
     "MATCH (s:Student)-[t:TAKES]->(m:Module) " +
     "WHERE s.student_id = $student_id " +
     "MATCH (m)-[sim:SIMILAR]->(rec:Module { community: m.community }) " +
-    "WHERE NOT (rec)<-[:MUTUALLY_EXCLUSIVE]->(m) AND sim.score < 0.85 " +
+    "WHERE NOT (rec)<-[:MUTUALLY_EXCLUSIVE]->(m) AND sim.score < $max_similarity " +
     "AND NOT EXISTS { " +
     "  MATCH (rec)<-[:ARE_PREREQUISITES]-(:PrerequisiteGroup)<-[:INSIDE]-(:Module) " +
     "}" +
     "AND rec.broadening_and_deepening = true " +
     "WITH s, rec, sim " +
-    "ORDER BY sim.score DESC " +
     "UNWIND s.disciplines AS disciplines " +
     "MATCH (filteredRec: Module { course_code: rec.course_code}) " +
     "WHERE filteredRec.discipline <> disciplines AND filteredRec.discipline <> 'Interdisciplinary Collaborative Core' " + # pylint: disable=line-too-long
     "AND filteredRec.discipline <> 'CN Yang Scholars Programme' AND filteredRec.discipline <> 'University Scholars Programme' " + # pylint: disable=line-too-long
     "AND filteredRec.discipline <> 'Renaissance Engineering' " +
+    "WITH filteredRec, MAX(sim.score) AS score " +
+    "ORDER BY score DESC, filteredRec.course_code " +
+    "LIMIT $k " +
     "RETURN filteredRec.course_code AS course_code, filteredRec.course_name AS course_name, " +
     "filteredRec.course_info AS course_info, filteredRec.academic_units AS academic_units, " +
     "filteredRec.broadening_and_deepening AS broadening_and_deepening, filteredRec.faculty AS faculty, " + # pylint: disable=line-too-long
-    "filteredRec.grade_type AS grade_type, sim.score AS score LIMIT 10"
+    "filteredRec.grade_type AS grade_type, score"
 )
 
 
@@ -44,23 +49,23 @@ GET_CF_MODULES_THAT_FULFILL_PREREQS = (
     "WHERE s1.student_id = $student_id " +
     "WITH s2.student_id AS neighborId, s1, r.jaccard_index AS score " +
     "ORDER BY score DESC, neighborId " +
-    "WITH s1, COLLECT(neighborId)[0..10] as neighbours " +
+    "WITH s1, COLLECT(neighborId)[0..$number_of_neighbours] as neighbours " +
     "UNWIND neighbours AS neighborId " +
     "WITH s1, neighborId " +
     "MATCH (s3:Student)-[:TAKES]->(m:Module) " +
     "WHERE s3.student_id = neighborId AND NOT (s1)-[:TAKES]->(m) " +
-    "WITH m AS coursesNotTaken, s1 " +
+    "WITH m AS coursesNotTaken, s1, neighborId " +
     "UNWIND s1.disciplines AS disciplines " +
-    "WITH coursesNotTaken, disciplines, s1 " +
+    "WITH coursesNotTaken, disciplines, s1, neighborId " +
     "MATCH (coursesNotTakenFiltered:Module { course_code: coursesNotTaken.course_code }) " +
     "WHERE coursesNotTaken.discipline <> disciplines AND coursesNotTaken.discipline <> 'Interdisciplinary Collaborative Core' " + # pylint: disable=line-too-long
     "AND coursesNotTaken.discipline <> 'CN Yang Scholars Programme' AND coursesNotTaken.discipline <> 'University Scholars Programme' " + # pylint: disable=line-too-long
-    "WITH DISTINCT coursesNotTakenFiltered, s1 " +
+    "WITH coursesNotTakenFiltered, s1, COUNT(DISTINCT neighborId) AS cnt " +
     "MATCH (coursesNotTakenFiltered)<-[:ARE_PREREQUISITES]-(prereq_group:PrerequisiteGroup)<-[:INSIDE]-(prereq:Module) " + # pylint: disable=line-too-long
     "MATCH (s1)-[t:TAKES]->(prereq:Module) " +
-    "WITH COUNT(distinct coursesNotTakenFiltered.course_code) AS cnt, coursesNotTakenFiltered " +
-    "ORDER BY cnt DESC " +
-    "WITH DISTINCT coursesNotTakenFiltered " +
+    "WITH DISTINCT coursesNotTakenFiltered, cnt " +
+    "ORDER BY cnt DESC, coursesNotTakenFiltered.course_code " +
+    "LIMIT $k " +
     "RETURN coursesNotTakenFiltered.course_code AS course_code, coursesNotTakenFiltered.course_name AS course_name, " + # pylint: disable=line-too-long
     "coursesNotTakenFiltered.course_info AS course_info, coursesNotTakenFiltered.faculty AS faculty, " + # pylint: disable=line-too-long
     "coursesNotTakenFiltered.academic_units AS academic_units, coursesNotTakenFiltered.grade_type AS grade_type, " + # pylint: disable=line-too-long
@@ -73,23 +78,129 @@ GET_CF_MODULES_WITH_NO_PREREQS = (
     "WHERE s1.student_id = $student_id " +
     "WITH s2.student_id AS neighborId, s1, r.jaccard_index AS score " +
     "ORDER BY score DESC, neighborId " +
-    "WITH s1, COLLECT(neighborId)[0..10] as neighbours " +
+    "WITH s1, COLLECT(neighborId)[0..$number_of_neighbours] as neighbours " +
     "UNWIND neighbours AS neighborId " +
     "WITH s1, neighborId " +
     "MATCH (s3:Student)-[:TAKES]->(m:Module) " +
     "WHERE s3.student_id = neighborId AND NOT (s1)-[:TAKES]->(m) " +
-    "WITH m AS coursesNotTaken, s1 " +
+    "WITH m AS coursesNotTaken, s1, neighborId " +
     "UNWIND s1.disciplines AS disciplines " +
-    "WITH coursesNotTaken, disciplines " +
+    "WITH coursesNotTaken, disciplines, neighborId " +
     "MATCH (coursesNotTakenFiltered:Module { course_code: coursesNotTaken.course_code }) " +
     "WHERE coursesNotTaken.discipline <> disciplines AND coursesNotTaken.discipline <> 'Interdisciplinary Collaborative Core' " + # pylint: disable=line-too-long
     "AND coursesNotTaken.discipline <> 'CN Yang Scholars Programme' AND coursesNotTaken.discipline <> 'University Scholars Programme' " + # pylint: disable=line-too-long
     "AND NOT EXISTS { MATCH (coursesNotTaken)<-[:ARE_PREREQUISITES]-(:PrerequisiteGroup)<-[:INSIDE]-(:Module) } " + # pylint: disable=line-too-long
-    "WITH COUNT(DISTINCT coursesNotTakenFiltered.course_code) AS cnt, coursesNotTakenFiltered " +
-    "ORDER BY cnt DESC " +
-    "WITH DISTINCT coursesNotTakenFiltered " +
+    "WITH COUNT(DISTINCT neighborId) AS cnt, coursesNotTakenFiltered " +
+    "ORDER BY cnt DESC, coursesNotTakenFiltered.course_code " +
+    "LIMIT $k " +
     "RETURN coursesNotTakenFiltered.course_code AS course_code, coursesNotTakenFiltered.course_name AS course_name, " + # pylint: disable=line-too-long
     "coursesNotTakenFiltered.course_info AS course_info, coursesNotTakenFiltered.faculty AS faculty, " + # pylint: disable=line-too-long
     "coursesNotTakenFiltered.academic_units AS academic_units, coursesNotTakenFiltered.grade_type AS grade_type, " + # pylint: disable=line-too-long
     "coursesNotTakenFiltered.broadening_and_deepening AS broadening_and_deepening" # pylint: disable=line-too-long
 )
+
+
+GET_STORED_RECOMMENDATIONS = (
+    "MATCH (s:Student { student_id: $student_id }) " +
+    "OPTIONAL MATCH (s)-[r:RECOMMENDED]->(m:Module) " +
+    "WITH s, r, m " +
+    "ORDER BY r.rank " +
+    "RETURN s.recs_computed_at AS computed_at, s.recs_stale_since AS stale_since, " +
+    "COALESCE(s.recs_generation, 0) AS generation, " +
+    "COLLECT(m { .course_code, .course_name, .course_info, .faculty, .academic_units, " + # pylint: disable=line-too-long
+    ".grade_type, .broadening_and_deepening, score: r.score, kind: r.kind }) AS recommendations" # pylint: disable=line-too-long
+)
+
+
+STORE_RECOMMENDATIONS = (
+    "MATCH (s:Student { student_id: $student_id }) " +
+    "WHERE COALESCE(s.recs_generation, 0) = $generation " +
+    "OPTIONAL MATCH (s)-[old:RECOMMENDED]->(:Module) " +
+    "DELETE old " +
+    "WITH DISTINCT s " +
+    "SET s.recs_computed_at = $computed_at, s.recs_stale_since = null " +
+    "WITH s " +
+    "UNWIND $recommendations AS rec " +
+    "MATCH (m:Module { course_code: rec.course_code }) " +
+    "MERGE (s)-[r:RECOMMENDED { kind: rec.kind }]->(m) " +
+    "SET r.rank = rec.rank, r.score = rec.score"
+)
+
+
+INVALIDATE_STORED_RECOMMENDATIONS = (
+    "MATCH (s:Student { student_id: $student_id }) " +
+    "SET s.recs_stale_since = COALESCE(s.recs_stale_since, $now), " +
+    "s.recs_generation = COALESCE(s.recs_generation, 0) + 1"
+)
+
+
+INVALIDATE_ALL_STORED_RECOMMENDATIONS = (
+    "MATCH (s:Student) " +
+    "SET s.recs_stale_since = COALESCE(s.recs_stale_since, $now), " +
+    "s.recs_generation = COALESCE(s.recs_generation, 0) + 1"
+)
+
+
+GET_MODULES_FOR_RECOMMENDER = (
+    "MATCH (m:Module) " +
+    "RETURN m.course_code AS course_code, m.course_name AS course_name, m.course_info AS course_info, " + # pylint: disable=line-too-long
+    "m.faculty AS faculty, m.academic_units AS academic_units, m.grade_type AS grade_type, " +
+    "m.broadening_and_deepening AS broadening_and_deepening, m.community AS community, " +
+    "m.discipline AS discipline, " +
+    "[(m)<-[:ARE_PREREQUISITES]-(:PrerequisiteGroup)<-[:INSIDE]-(prereq:Module) | prereq.course_code] AS prerequisites" # pylint: disable=line-too-long
+)
+
+
+GET_SIMILAR_EDGES = (
+    "MATCH (m:Module)-[sim:SIMILAR]->(rec:Module) " +
+    "RETURN m.course_code AS source, rec.course_code AS target, sim.score AS score"
+)
+
+
+GET_MUTUALLY_EXCLUSIVE_PAIRS = (
+    "MATCH (m:Module)-[:MUTUALLY_EXCLUSIVE]-(mutual:Module) " +
+    "RETURN m.course_code AS source, mutual.course_code AS target"
+)
+
+
+GET_STUDENT_REC_PROFILE = (
+    "MATCH (s:Student { student_id: $student_id }) " +
+    "RETURN s.disciplines AS disciplines, s.year_of_study AS year_of_study, " +
+    "[(s)-[:TAKES]->(m:Module) | m.course_code] AS course_codes, " +
+    "SIZE([(s)-[:SIMILAR_TO_USER]->(n:Student) | n.student_id]) AS number_of_neighbours"
+)
+
+
+GET_STUDENTS_FOR_RECOMMENDER = (
+    "MATCH (s:Student) " +
+    "RETURN s.student_id AS student_id, s.disciplines AS disciplines, " +
+    "[(s)-[:TAKES]->(m:Module) | m.course_code] AS course_codes"
+)
+
+
+GET_SIMILAR_STUDENTS = (
+    "MATCH (s1:Student)-[r:SIMILAR_TO_USER]->(s2:Student) " +
+    "WHERE s1.student_id = $student_id " +
+    "RETURN s2.student_id AS student_id, r.jaccard_index AS score " +
+    "ORDER BY score DESC, student_id"
+)
+
+
+WRITE_SIMILAR_STUDENTS = (
+    "UNWIND $rows AS row " +
+    "MATCH (s1:Student { student_id: row.student_id }) " +
+    "OPTIONAL MATCH (s1)-[old:SIMILAR_TO_USER]->(:Student) " +
+    "DELETE old " +
+    "WITH DISTINCT s1, row " +
+    "UNWIND row.neighbours AS neighbour " +
+    "MATCH (s2:Student { student_id: neighbour.student_id }) " +
+    "MERGE (s1)-[r:SIMILAR_TO_USER]->(s2) " +
+    "SET r.jaccard_index = neighbour.score"
+)
+
+
+GET_ENROLLMENT_COUNTS = (
+    "MATCH (s:Student)-[:TAKES]->(m:Module) " +
+    "RETURN m.course_code AS course_code, s.disciplines AS disciplines, " +
+    "s.year_of_study AS year_of_study, COUNT(*) AS count"
+)
@@ -39,3 +39,17 @@ ADD_MODULE_TAKEN = (
     "MERGE (s)-[:TAKES]->(m:Module { course_code: $course_code }) "
     "RETURN m.course_code AS course_code"
 )
+
+GET_ALL_STUDENT_IDS = (
+    "MATCH (s: Student) "
+    "RETURN s.student_id AS student_id "
+    "ORDER BY student_id"
+)
+
+FIND_STUDENT_IDS = (
+    "MATCH (s: Student) "
+    "WHERE ($major IS NULL OR s.major = $major) "
+    "AND ($year_of_study IS NULL OR s.year_of_study = $year_of_study) "
+    "RETURN s.student_id AS student_id "
+    "ORDER BY student_id"
+)
@@ -0,0 +1,318 @@
+"""In-process collaborative filtering recommender.
+
+The modules taken by every student are held as a sparse binary student by
+module matrix, stored both row-wise (the modules of each student) and
+column-wise (the students of each module). The Jaccard index between a student
+and every other student is obtained from the product of the student's row with
+the column-wise matrix, so only students sharing at least one module are ever
+visited. Unlike the precomputed SIMILAR_TO_USER edges, the neighbours are
+therefore always up to date with the students' modules.
+
+The results reproduce GET_CF_MODULES_THAT_FULFILL_PREREQS and
+GET_CF_MODULES_WITH_NO_PREREQS: the candidates are the modules taken by the
+nearest neighbours (ranked by Jaccard index, then by student id) that the
+student has not taken, ranked by the number of neighbours that took them and
+then by course code.
+"""
+
+import heapq
+import threading
+
+from ..database.repository import Repository
+from ..models.module import Module
+
+NUMBER_OF_NEIGHBOURS = 10
+EXCLUDED_DISCIPLINES = frozenset(
+    {
+        "Interdisciplinary Collaborative Core",
+        "CN Yang Scholars Programme",
+        "University Scholars Programme",
+    }
+)
+
+
+class CollaborativeRecommender:  # pylint: disable=too-many-instance-attributes
+    """Collaborative filtering recommender over a sparse student by module matrix.
+
+    Attributes:
+      course_codes:
+        The course code of each module, indexed by module index.
+      module_index:
+        The module index of each course code.
+      modules:
+        The Module of each module, indexed by module index.
+      student_ids:
+        The id of each student, indexed by student index.
+      student_index:
+        The student index of each student id.
+      rows:
+        The module indices taken by each student, indexed by student index.
+      columns:
+        The student indices that took each module, indexed by module index.
+      disciplines:
+        The disciplines of each student, indexed by student index.
+    """
+
+    def __init__(self, modules: list[dict[str, any]], students: list[dict[str, any]]):
+        """Builds the student by module matrix.
+
+        Args:
+          modules:
+            The modules as returned by Repository.get_modules_for_recommender.
+          students:
+            The students as returned by Repository.get_students_for_recommender.
+        """
+        self.course_codes: list[str] = [module["course_code"] for module in modules]
+        self.module_index: dict[str, int] = {
+            course_code: i for i, course_code in enumerate(self.course_codes)
+        }
+        self.modules: list[Module] = []
+        self.module_disciplines: list[str] = []
+        self.prerequisites: list[frozenset[int]] = []
+
+        for data in modules:
+            data = dict(data)
+            data.pop("community", None)
+            self.module_disciplines.append(data.pop("discipline"))
+            prereqs: list[str] = data.pop("prerequisites") or []
+            self.prerequisites.append(
+                frozenset(
+                    self.module_index[prereq]
+                    for prereq in prereqs
+                    if prereq in self.module_index
+                )
+            )
+            self.modules.append(Module(**data))
+
+        self.student_ids: list[str] = []
+        self.student_index: dict[str, int] = {}
+        self.rows: list[set[int]] = []
+        self.columns: list[set[int]] = [set() for _ in modules]
+        self.disciplines: list[list[str]] = []
+        self.lock: threading.Lock = threading.Lock()
+
+        for student in students:
+            self.update_student(
+                student["student_id"], student["course_codes"], student["disciplines"]
+            )
+
+    def update_student(
+        self, student_id: str, course_codes: list[str], disciplines: list[str] = None
+    ):
+        """Replaces the row of a single student.
+
+        Only the columns of the modules that were added or removed are touched.
+        A student that is not in the matrix yet is added to it.
+
+        Args:
+          student_id:
+            The id of the student.
+          course_codes:
+            The course codes of the modules now taken by the student.
+          disciplines:
+            The disciplines of the student. Left unchanged if None.
+        """
+        new_row: set[int] = {
+            self.module_index[course_code]
+            for course_code in course_codes or []
+            if course_code in self.module_index
+        }
+
+        with self.lock:
+            i: int = self.student_index.get(student_id)
+
+            if i is None:
+                i = len(self.student_ids)
+                self.student_index[student_id] = i
+                self.student_ids.append(student_id)
+                self.rows.append(set())
+                self.disciplines.append([])
+
+            old_row: set[int] = self.rows[i]
+
+            for j in old_row - new_row:
+                self.columns[j].discard(i)
+            for j in new_row - old_row:
+                self.columns[j].add(i)
+
+            self.rows[i] = new_row
+
+            if disciplines is not None:
+                self.disciplines[i] = list(disciplines)
+
+    def update_student_disciplines(self, student_id: str, disciplines: list[str]):
+        """Replaces the disciplines of a single student if they are in the matrix."""
+        with self.lock:
+            i: int = self.student_index.get(student_id)
+
+            if i is not None:
+                self.disciplines[i] = list(disciplines or [])
+
+    def neighbours(
+        self, student_id: str, number_of_neighbours: int = NUMBER_OF_NEIGHBOURS
+    ) -> list[tuple[str, float]]:
+        """Finds the students most similar to a student by Jaccard index.
+
+        Args:
+          student_id:
+            The id of the student.
+          number_of_neighbours:
+            The number of neighbours to return.
+
+        Returns:
+          A list of (student id, Jaccard index) tuples ordered by Jaccard index
+          and then by student id. Students sharing no module are never returned.
+        """
+        i: int = self.student_index.get(student_id)
+
+        if i is None:
+            return []
+
+        with self.lock:
+            row: set[int] = self.rows[i]
+            intersections: dict[int, int] = {}
+
+            for j in row:
+                for other in self.columns[j]:
+                    intersections[other] = intersections.get(other, 0) + 1
+
+            intersections.pop(i, None)
+            scores: dict[int, float] = {
+                other: count / (len(row) + len(self.rows[other]) - count)
+                for other, count in intersections.items()
+            }
+
+        nearest: list[int] = heapq.nsmallest(
+            number_of_neighbours,
+            scores,
+            key=lambda other: (-scores[other], self.student_ids[other]),
+        )
+
+        return [(self.student_ids[other], scores[other]) for other in nearest]
+
+    def recommend_fulfilling_prereqs(
+        self,
+        student_id: str,
+        k: int = None,
+        number_of_neighbours: int = NUMBER_OF_NEIGHBOURS,
+        neighbours: list[str] = None,
+    ) -> list[Module]:
+        """Recommends modules with a prerequisite that the student has taken.
+
+        Args:
+          student_id:
+            The id of the student.
+          k:
+            The number of modules to recommend. All candidates are returned if
+            None.
+          number_of_neighbours:
+            The number of neighbours whose modules are considered.
+          neighbours:
+            The ids of the neighbours to use instead of the nearest neighbours,
+            such as those given by the SIMILAR_TO_USER edges of the student.
+
+        Returns:
+          The recommended modules, best first.
+        """
+        return self._recommend(student_id, True, k, number_of_neighbours, neighbours)
+
+    def recommend_without_prereqs(
+        self,
+        student_id: str,
+        k: int = None,
+        number_of_neighbours: int = NUMBER_OF_NEIGHBOURS,
+        neighbours: list[str] = None,
+    ) -> list[Module]:
+        """Recommends modules that have no prerequisites.
+
+        Args:
+          student_id:
+            The id of the student.
+          k:
+            The number of modules to recommend. All candidates are returned if
+            None.
+          number_of_neighbours:
+            The number of neighbours whose modules are considered.
+          neighbours:
+            The ids of the neighbours to use instead of the nearest neighbours,
+            such as those given by the SIMILAR_TO_USER edges of the student.
+
+        Returns:
+          The recommended modules, best first.
+        """
+        return self._recommend(student_id, False, k, number_of_neighbours, neighbours)
+
+    def _recommend(  # pylint: disable=too-many-arguments
+        self,
+        student_id: str,
+        with_prereqs: bool,
+        k: int,
+        number_of_neighbours: int,
+        neighbours: list[str],
+    ) -> list[Module]:
+        """Counts the candidate modules taken by the student's neighbours."""
+        i: int = self.student_index.get(student_id)
+
+        if i is None:
+            return []
+
+        if neighbours is None:
+            neighbours = [
+                neighbour for neighbour, _ in self.neighbours(student_id, number_of_neighbours)
+            ]
+
+        row: set[int] = self.rows[i]
+        disciplines: set[str] = set(self.disciplines[i])
+        counts: dict[int, int] = {}
+
+        for neighbour in neighbours[:number_of_neighbours]:
+            other: int = self.student_index.get(neighbour)
+            if other is None:
+                continue
+
+            for j in self.rows[other] - row:
+                counts[j] = counts.get(j, 0) + 1
+
+        candidates: list[int] = [
+            j
+            for j in counts
+            if self._is_eligible(j, disciplines)
+            and bool(self.prerequisites[j]) == with_prereqs
+            and (not with_prereqs or not self.prerequisites[j].isdisjoint(row))
+        ]
+
+        def rank_key(j: int) -> tuple[int, str]:
+            return -counts[j], self.course_codes[j]
+
+        if k is None:
+            ranked: list[int] = sorted(candidates, key=rank_key)
+        else:
+            ranked: list[int] = heapq.nsmallest(k, candidates, key=rank_key)
+
+        return [self.modules[j] for j in ranked]
+
+    def _is_eligible(self, j: int, disciplines: set[str]) -> bool:
+        """Applies the discipline filter of the CF queries to a module."""
+        discipline: str = self.module_disciplines[j]
+
+        return (
+            discipline is not None
+            and discipline not in EXCLUDED_DISCIPLINES
+            and bool(disciplines - {discipline})
+        )
+
+
+def load_collaborative_recommender(repo: Repository) -> CollaborativeRecommender:
+    """Builds a collaborative filtering recommender from the graph in the db.
+
+    Args:
+      repo:
+        The repository to read from.
+
+    Returns:
+      The collaborative filtering recommender.
+    """
+    return CollaborativeRecommender(
+        repo.get_modules_for_recommender(),
+        repo.get_students_for_recommender(),
+    )
@@ -0,0 +1,251 @@
+"""In-process content-based recommender.
+
+The SIMILAR scores between modules are held in a compressed sparse row (CSR)
+layout built on flat arrays, with the per-module properties used for filtering
+held as masks. Recommending for a student then amounts to walking the rows of
+the modules the student has taken instead of traversing the graph in Cypher.
+
+The results reproduce GET_CB_MODULES_THAT_FULFILL_PREREQS and
+GET_CB_MODULES_WITH_NO_PREREQS, except that each module is recommended at most
+once (with the best score among its similar edges) and that the modules are
+always ranked by score, using the course code to break ties.
+"""
+
+import heapq
+from array import array
+
+from ..database.repository import Repository
+from ..models.module import Module
+
+MAX_SIMILARITY = 0.85
+EXCLUDED_DISCIPLINES = frozenset(
+    {
+        "Interdisciplinary Collaborative Core",
+        "CN Yang Scholars Programme",
+        "University Scholars Programme",
+        "Renaissance Engineering",
+    }
+)
+
+
+class ContentBasedRecommender:  # pylint: disable=too-many-instance-attributes
+    """Content-based recommender over a sparse module similarity matrix.
+
+    Attributes:
+      course_codes:
+        The course code of each module, indexed by module index.
+      index:
+        The module index of each course code.
+      modules:
+        The Module of each module, indexed by module index.
+      indptr:
+        The CSR row pointers. The similar edges of module i are stored from
+        indptr[i] up to indptr[i + 1] in indices, scores and prereq_edges.
+      indices:
+        The module index of the target of each similar edge.
+      scores:
+        The score of each similar edge.
+      prereq_edges:
+        A mask over the similar edges that is set when the source module is
+        one of the prerequisites of the target module.
+      with_prereq_mask:
+        A mask over the modules that is set for broadening and deepening
+        modules that have prerequisites.
+      no_prereq_mask:
+        A mask over the modules that is set for broadening and deepening
+        modules that have no prerequisites and whose discipline is not excluded.
+      disciplines:
+        The discipline of each module, indexed by module index.
+    """
+
+    def __init__(
+        self,
+        modules: list[dict[str, any]],
+        similar_edges: list[tuple[str, str, float]],
+        mutually_exclusive_pairs: list[tuple[str, str]],
+    ):
+        """Builds the similarity matrix and masks.
+
+        Similar edges that can never be recommended, either because the two
+        modules are in different communities or because they are mutually
+        exclusive, are dropped while building the matrix.
+
+        Args:
+          modules:
+            The modules as returned by Repository.get_modules_for_recommender.
+          similar_edges:
+            The (source, target, score) SIMILAR edges between modules.
+          mutually_exclusive_pairs:
+            The pairs of mutually exclusive modules.
+        """
+        self.course_codes: list[str] = [module["course_code"] for module in modules]
+        self.index: dict[str, int] = {
+            course_code: i for i, course_code in enumerate(self.course_codes)
+        }
+        self.modules: list[Module] = []
+        self.disciplines: list[str] = []
+        self.with_prereq_mask: bytearray = bytearray(len(modules))
+        self.no_prereq_mask: bytearray = bytearray(len(modules))
+        communities: list[any] = []
+        prerequisites: list[set[str]] = []
+
+        for i, data in enumerate(modules):
+            data = dict(data)
+            community: any = data.pop("community")
+            discipline: str = data.pop("discipline")
+            prereqs: set[str] = set(data.pop("prerequisites") or [])
+            broadening_and_deepening: bool = data["broadening_and_deepening"] is True
+
+            self.modules.append(Module(**data))
+            self.disciplines.append(discipline)
+            communities.append(community)
+            prerequisites.append(prereqs)
+
+            if broadening_and_deepening and prereqs:
+                self.with_prereq_mask[i] = 1
+            elif (
+                broadening_and_deepening
+                and discipline is not None
+                and discipline not in EXCLUDED_DISCIPLINES
+            ):
+                self.no_prereq_mask[i] = 1
+
+        exclusive: set[tuple[str, str]] = set(mutually_exclusive_pairs)
+        rows: list[list[tuple[int, float, int]]] = [[] for _ in modules]
+
+        for source, target, score in similar_edges:
+            if source not in self.index or target not in self.index or score is None:
+                continue
+
+            i: int = self.index[source]
+            j: int = self.index[target]
+
+            if communities[i] is None or communities[i] != communities[j]:
+                continue
+            if (source, target) in exclusive or (target, source) in exclusive:
+                continue
+
+            rows[i].append((j, score, int(source in prerequisites[j])))
+
+        self.indptr: array = array("l", [0])
+        self.indices: array = array("l")
+        self.scores: array = array("d")
+        self.prereq_edges: bytearray = bytearray()
+
+        for row in rows:
+            for j, score, is_prereq in row:
+                self.indices.append(j)
+                self.scores.append(score)
+                self.prereq_edges.append(is_prereq)
+            self.indptr.append(len(self.indices))
+
+    def recommend_fulfilling_prereqs(
+        self, course_codes: list[str], k: int = 10, max_similarity: float = MAX_SIMILARITY
+    ) -> list[Module]:
+        """Recommends modules that have a taken module as a prerequisite.
+
+        Args:
+          course_codes:
+            The course codes of the modules taken by the student.
+          k:
+            The number of modules to recommend. All candidates are returned if
+            None.
+          max_similarity:
+            Similar edges scoring at or above this are ignored.
+
+        Returns:
+          The recommended modules with their scores, best first.
+        """
+        return self._recommend(
+            course_codes, self.with_prereq_mask, True, None, k, max_similarity
+        )
+
+    def recommend_without_prereqs(
+        self,
+        course_codes: list[str],
+        disciplines: list[str],
+        k: int = 10,
+        max_similarity: float = MAX_SIMILARITY,
+    ) -> list[Module]:
+        """Recommends modules that have no prerequisites.
+
+        Only modules from a discipline other than one of the student's are
+        recommended.
+
+        Args:
+          course_codes:
+            The course codes of the modules taken by the student.
+          disciplines:
+            The disciplines of the student.
+          k:
+            The number of modules to recommend. All candidates are returned if
+            None.
+          max_similarity:
+            Similar edges scoring at or above this are ignored.
+
+        Returns:
+          The recommended modules with their scores, best first.
+        """
+        if not disciplines:
+            return []
+
+        return self._recommend(
+            course_codes, self.no_prereq_mask, False, set(disciplines), k, max_similarity
+        )
+
+    def _recommend(  # pylint: disable=too-many-arguments
+        self,
+        course_codes: list[str],
+        mask: bytearray,
+        prereq_edges_only: bool,
+        disciplines: set[str],
+        k: int,
+        max_similarity: float,
+    ) -> list[Module]:
+        """Scores the candidates reachable from the taken modules' rows."""
+        best: dict[int, float] = {}
+
+        for course_code in course_codes:
+            i: int = self.index.get(course_code)
+            if i is None:
+                continue
+
+            for pos in range(self.indptr[i], self.indptr[i + 1]):
+                j: int = self.indices[pos]
+                score: float = self.scores[pos]
+
+                if not mask[j] or score >= max_similarity:
+                    continue
+                if prereq_edges_only and not self.prereq_edges[pos]:
+                    continue
+                if disciplines is not None and not disciplines - {self.disciplines[j]}:
+                    continue
+                if score > best.get(j, float("-inf")):
+                    best[j] = score
+
+        def rank_key(j: int) -> tuple[float, str]:
+            return -best[j], self.course_codes[j]
+
+        if k is None:
+            ranked: list[int] = sorted(best, key=rank_key)
+        else:
+            ranked: list[int] = heapq.nsmallest(k, best, key=rank_key)
+
+        return [self.modules[j].model_copy(update={"score": best[j]}) for j in ranked]
+
+
+def load_content_based_recommender(repo: Repository) -> ContentBasedRecommender:
+    """Builds a content-based recommender from the graph in the db.
+
+    Args:
+      repo:
+        The repository to read from.
+
+    Returns:
+      The content-based recommender.
+    """
+    return ContentBasedRecommender(
+        repo.get_modules_for_recommender(),
+        repo.get_similar_edges(),
+        repo.get_mutually_exclusive_pairs(),
+    )
@@ -0,0 +1,257 @@
+"""MinHash signatures and an LSH banding index over the modules taken by students.
+
+Each student's set of taken modules is summarised by a MinHash signature. The
+signature is split into bands and every band is hashed into a bucket, so two
+students whose sets have a high Jaccard index are likely to share at least one
+bucket. Looking up a student's neighbours then only visits the students in the
+same buckets, and those candidates are re-ranked by their exact Jaccard index.
+
+With b bands of r rows, two sets with Jaccard index s become candidates with
+probability 1 - (1 - s^r)^b.
+"""
+
+import heapq
+import random
+import zlib
+
+from ..database.repository import Repository
+
+MERSENNE_PRIME = (1 << 61) - 1
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 64
+SIMILARITY_WRITE_BATCH_SIZE = 500
+
+
+class MinHashIndex:
+    """LSH index over the MinHash signatures of the students' taken modules.
+
+    Attributes:
+      num_permutations:
+        The length of each signature.
+      num_bands:
+        The number of bands each signature is split into.
+      rows_per_band:
+        The number of signature values in each band.
+      module_hashes:
+        The hash values of each module under every hash function, keyed by
+        course code.
+      sets:
+        The course codes taken by each student, keyed by student id.
+      signatures:
+        The signature of each student, keyed by student id.
+      buckets:
+        For each band, the ids of the students in each bucket.
+    """
+
+    def __init__(
+        self,
+        num_permutations: int = NUM_PERMUTATIONS,
+        num_bands: int = NUM_BANDS,
+        seed: int = 1,
+    ):
+        """Creates an empty index.
+
+        Args:
+          num_permutations:
+            The length of each signature. Must be divisible by num_bands.
+          num_bands:
+            The number of bands each signature is split into.
+          seed:
+            The seed of the hash functions.
+        """
+        if num_permutations % num_bands != 0:
+            raise ValueError("num_permutations must be divisible by num_bands")
+
+        rng: random.Random = random.Random(seed)
+        self.num_permutations: int = num_permutations
+        self.num_bands: int = num_bands
+        self.rows_per_band: int = num_permutations // num_bands
+        self.hash_params: list[tuple[int, int]] = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_permutations)
+        ]
+        self.module_hashes: dict[str, tuple[int, ...]] = {}
+        self.sets: dict[str, frozenset[str]] = {}
+        self.signatures: dict[str, tuple[int, ...]] = {}
+        self.buckets: list[dict[int, set[str]]] = [{} for _ in range(num_bands)]
+
+    def signature(self, course_codes: frozenset[str]) -> tuple[int, ...]:
+        """Computes the MinHash signature of a set of course codes.
+
+        The hash values of each module under every hash function are computed
+        once and cached, as the number of modules is far smaller than the
+        number of students.
+        """
+        if not course_codes:
+            return ()
+
+        return tuple(map(min, zip(*map(self.module_hash, course_codes))))
+
+    def module_hash(self, course_code: str) -> tuple[int, ...]:
+        """Returns the hash values of a module under every hash function."""
+        hashes: tuple[int, ...] = self.module_hashes.get(course_code)
+
+        if hashes is None:
+            x: int = zlib.crc32(course_code.encode())
+            hashes = tuple((a * x + b) % MERSENNE_PRIME for a, b in self.hash_params)
+            self.module_hashes[course_code] = hashes
+
+        return hashes
+
+    def band_keys(self, signature: tuple[int, ...]) -> list[int]:
+        """Hashes each band of a signature into a bucket key."""
+        rows: int = self.rows_per_band
+
+        return [
+            hash(signature[band * rows : (band + 1) * rows]) for band in range(self.num_bands)
+        ]
+
+    def add(self, student_id: str, course_codes: list[str]):
+        """Adds a student to the index, replacing any previous entry."""
+        self.remove(student_id)
+
+        course_code_set: frozenset[str] = frozenset(course_codes or [])
+        signature: tuple[int, ...] = self.signature(course_code_set)
+        self.sets[student_id] = course_code_set
+        self.signatures[student_id] = signature
+
+        if not signature:
+            return
+
+        for band, key in enumerate(self.band_keys(signature)):
+            self.buckets[band].setdefault(key, set()).add(student_id)
+
+    def remove(self, student_id: str):
+        """Removes a student from the index if present."""
+        signature: tuple[int, ...] = self.signatures.pop(student_id, None)
+        self.sets.pop(student_id, None)
+
+        if not signature:
+            return
+
+        for band, key in enumerate(self.band_keys(signature)):
+            bucket: set[str] = self.buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(student_id)
+                if not bucket:
+                    del self.buckets[band][key]
+
+    def candidates(self, student_id: str) -> set[str]:
+        """Returns the students sharing at least one bucket with a student."""
+        signature: tuple[int, ...] = self.signatures.get(student_id)
+
+        if not signature:
+            return set()
+
+        found: set[str] = set()
+
+        for band, key in enumerate(self.band_keys(signature)):
+            found.update(self.buckets[band].get(key, ()))
+
+        found.discard(student_id)
+
+        return found
+
+    def neighbours(self, student_id: str, k: int = 10) -> list[tuple[str, float]]:
+        """Finds the approximate nearest neighbours of a student.
+
+        Args:
+          student_id:
+            The id of the student.
+          k:
+            The number of neighbours to return.
+
+        Returns:
+          A list of (student id, exact Jaccard index) tuples ordered by Jaccard
+          index and then by student id.
+        """
+        course_codes: frozenset[str] = self.sets.get(student_id, frozenset())
+        scores: dict[str, float] = {}
+
+        for candidate in self.candidates(student_id):
+            other: frozenset[str] = self.sets[candidate]
+            intersection: int = len(course_codes & other)
+
+            if intersection:
+                scores[candidate] = intersection / (
+                    len(course_codes) + len(other) - intersection
+                )
+
+        nearest: list[str] = heapq.nsmallest(
+            k, scores, key=lambda candidate: (-scores[candidate], candidate)
+        )
+
+        return [(candidate, scores[candidate]) for candidate in nearest]
+
+
+def build_minhash_index(
+    students: list[dict[str, any]],
+    num_permutations: int = NUM_PERMUTATIONS,
+    num_bands: int = NUM_BANDS,
+) -> MinHashIndex:
+    """Builds an index over students.
+
+    Args:
+      students:
+        The students as returned by Repository.get_students_for_recommender.
+      num_permutations:
+        The length of each signature.
+      num_bands:
+        The number of bands each signature is split into.
+
+    Returns:
+      The index over the students.
+    """
+    index: MinHashIndex = MinHashIndex(num_permutations, num_bands)
+
+    for student in students:
+        index.add(student["student_id"], student["course_codes"])
+
+    return index
+
+
+def write_similar_students(
+    index: MinHashIndex,
+    repo: Repository,
+    k: int = 10,
+    batch_size: int = SIMILARITY_WRITE_BATCH_SIZE,
+) -> int:
+    """Replaces the SIMILAR_TO_USER edges with the top k neighbours in the index.
+
+    Args:
+      index:
+        The index over every student.
+      repo:
+        The repository to write to.
+      k:
+        The number of neighbours written for each student.
+      batch_size:
+        The number of students whose edges are written in a single query.
+
+    Returns:
+      The number of students whose edges were written.
+    """
+    batch: list[dict[str, any]] = []
+    written: int = 0
+
+    for student_id in index.sets:
+        batch.append(
+            {
+                "student_id": student_id,
+                "neighbours": [
+                    {"student_id": neighbour, "score": score}
+                    for neighbour, score in index.neighbours(student_id, k)
+                ],
+            }
+        )
+
+        if len(batch) == batch_size:
+            repo.write_similar_students(batch)
+            written += len(batch)
+            batch = []
+
+    if batch:
+        repo.write_similar_students(batch)
+        written += len(batch)
+
+    return written
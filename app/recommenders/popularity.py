@@ -0,0 +1,316 @@
+"""Module popularity counters for cold-start and fallback recommendations.
+
+The number of students taking each module is counted overall and per bucket
+of discipline and year of study. Counts are kept in a linked list of count
+nodes, highest count last, so incrementing or decrementing a module is O(1)
+and listing the k most popular modules is O(k) plus the number of modules
+skipped.
+"""
+
+import threading
+
+from ..database.repository import Repository
+from ..models.module import Module
+
+
+class _CountNode:  # pylint: disable=too-few-public-methods
+    """The modules sharing the same count."""
+
+    def __init__(self, count: int):
+        self.count: int = count
+        self.course_codes: dict[str, None] = {}
+        self.prev: "_CountNode" = None
+        self.next: "_CountNode" = None
+
+
+class CountIndex:
+    """Counts of course codes with O(1) updates and O(k) top-k listing."""
+
+    def __init__(self):
+        self.head: _CountNode = _CountNode(0)
+        self.tail: _CountNode = self.head
+        self.nodes: dict[str, _CountNode] = {}
+
+    def increment(self, course_code: str, amount: int = 1):
+        """Increases the count of a course code."""
+        if amount <= 0:
+            return
+
+        node: _CountNode = self.nodes.get(course_code, self.head)
+        count: int = node.count + amount
+        target: _CountNode = node
+
+        while target.next is not None and target.next.count <= count:
+            target = target.next
+
+        if target.count != count:
+            target = self._insert_after(target, count)
+
+        self._move(course_code, node, target)
+
+    def decrement(self, course_code: str):
+        """Decreases the count of a course code, never below zero."""
+        node: _CountNode = self.nodes.get(course_code)
+
+        if node is None:
+            return
+
+        target: _CountNode = node.prev
+
+        if target.count != node.count - 1:
+            target = self._insert_after(target, node.count - 1)
+
+        self._move(course_code, node, target)
+
+    def count(self, course_code: str) -> int:
+        """Returns the count of a course code."""
+        return self.nodes.get(course_code, self.head).count
+
+    def top(self, k: int, accept=None) -> list[tuple[str, int]]:
+        """Lists the k course codes with the highest counts.
+
+        Args:
+          k:
+            The number of course codes to list.
+          accept:
+            An optional predicate on the course code. Course codes for which it
+            returns False are skipped.
+
+        Returns:
+          A list of (course code, count) tuples, highest count first.
+        """
+        result: list[tuple[str, int]] = []
+        node: _CountNode = self.tail
+
+        while node is not self.head and len(result) < k:
+            for course_code in node.course_codes:
+                if accept is None or accept(course_code):
+                    result.append((course_code, node.count))
+                    if len(result) == k:
+                        break
+            node = node.prev
+
+        return result
+
+    def _insert_after(self, node: _CountNode, count: int) -> _CountNode:
+        """Inserts a new count node after the given node."""
+        new_node: _CountNode = _CountNode(count)
+        new_node.prev = node
+        new_node.next = node.next
+
+        if node.next is None:
+            self.tail = new_node
+        else:
+            node.next.prev = new_node
+
+        node.next = new_node
+
+        return new_node
+
+    def _move(self, course_code: str, source: _CountNode, target: _CountNode):
+        """Moves a course code between count nodes, dropping empty nodes."""
+        if source is not self.head:
+            del source.course_codes[course_code]
+
+            if not source.course_codes:
+                source.prev.next = source.next
+                if source.next is None:
+                    self.tail = source.prev
+                else:
+                    source.next.prev = source.prev
+
+        if target is self.head:
+            del self.nodes[course_code]
+        else:
+            target.course_codes[course_code] = None
+            self.nodes[course_code] = target
+
+
+class PopularityCounters:
+    """Enrollment counters of every module, overall and per discipline and year.
+
+    Attributes:
+      modules:
+        The Module of each course code.
+      overall:
+        The number of students taking each module.
+      buckets:
+        The number of students taking each module, keyed by (discipline, year
+        of study) of the students.
+    """
+
+    def __init__(self, modules: list[dict[str, any]], counts: list[dict[str, any]]):
+        """Builds the counters.
+
+        Args:
+          modules:
+            The modules as returned by Repository.get_modules_for_recommender.
+          counts:
+            The enrollment counts as returned by Repository.get_enrollment_counts.
+        """
+        self.modules: dict[str, Module] = {}
+
+        for data in modules:
+            data = dict(data)
+            for key in ("community", "discipline", "prerequisites"):
+                data.pop(key, None)
+            self.modules[data["course_code"]] = Module(**data)
+
+        self.overall: CountIndex = CountIndex()
+        self.buckets: dict[tuple[str, int], CountIndex] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+        for row in counts:
+            self.overall.increment(row["course_code"], row["count"])
+
+            for discipline in row["disciplines"] or [None]:
+                self._bucket(discipline, row["year_of_study"]).increment(
+                    row["course_code"], row["count"]
+                )
+
+    def record_changes(  # pylint: disable=too-many-arguments
+        self,
+        disciplines: list[str],
+        year_of_study: int,
+        added: list[str],
+        removed: list[str],
+        previous_disciplines: list[str] = None,
+        previous_year_of_study: int = None,
+        kept: list[str] = (),
+    ):
+        """Applies the modules added and removed by a single student.
+
+        If the student's disciplines or year of study changed too, the modules
+        they took before are counted under the previous ones, so the modules
+        they kept are moved to the buckets of the new ones along the way.
+
+        Args:
+          disciplines:
+            The disciplines of the student.
+          year_of_study:
+            The year of study of the student.
+          added:
+            The course codes of the modules the student started taking.
+          removed:
+            The course codes of the modules the student stopped taking.
+          previous_disciplines:
+            The disciplines of the student before the change.
+          previous_year_of_study:
+            The year of study of the student before the change. If None, the
+            disciplines and year of study did not change.
+          kept:
+            The course codes of the modules the student still takes.
+        """
+        if previous_year_of_study is None:
+            previous_disciplines, previous_year_of_study = disciplines, year_of_study
+
+        keys: set[tuple[str, int]] = {
+            (discipline, year_of_study) for discipline in disciplines or [None]
+        }
+        previous_keys: set[tuple[str, int]] = {
+            (discipline, previous_year_of_study) for discipline in previous_disciplines or [None]
+        }
+
+        with self.lock:
+            for course_code in added:
+                self.overall.increment(course_code)
+            for course_code in removed:
+                self.overall.decrement(course_code)
+
+            for key in keys | previous_keys:
+                bucket: CountIndex = self._bucket(*key)
+                incremented: list[str] = [] if key not in keys else (
+                    added if key in previous_keys else [*kept, *added]
+                )
+                decremented: list[str] = [] if key not in previous_keys else (
+                    removed if key in keys else [*kept, *removed]
+                )
+
+                for course_code in incremented:
+                    bucket.increment(course_code)
+                for course_code in decremented:
+                    bucket.decrement(course_code)
+
+    def recommend(  # pylint: disable=too-many-arguments
+        self,
+        k: int,
+        disciplines: list[str] = None,
+        year_of_study: int = None,
+        exclude: list[str] = (),
+        broadening_and_deepening: bool = False,
+    ) -> list[Module]:
+        """Recommends the most popular modules.
+
+        The modules popular among students of the same disciplines and year of
+        study come first, followed by the most popular modules overall.
+
+        Args:
+          k:
+            The number of modules to recommend.
+          disciplines:
+            The disciplines of the student.
+          year_of_study:
+            The year of study of the student.
+          exclude:
+            The course codes of the modules not to recommend, such as the
+            modules already taken.
+          broadening_and_deepening:
+            Whether to only recommend broadening and deepening modules.
+
+        Returns:
+          The recommended modules, most popular first.
+        """
+        seen: set[str] = set(exclude)
+
+        def accept(course_code: str) -> bool:
+            module: Module = self.modules.get(course_code)
+
+            return (
+                module is not None
+                and course_code not in seen
+                and (not broadening_and_deepening or module.broadening_and_deepening)
+            )
+
+        recommended: list[Module] = []
+
+        with self.lock:
+            indexes: list[CountIndex] = [
+                self.buckets[(discipline, year_of_study)]
+                for discipline in disciplines or []
+                if (discipline, year_of_study) in self.buckets
+            ] + [self.overall]
+
+            for index in indexes:
+                for course_code, _ in index.top(k - len(recommended), accept):
+                    seen.add(course_code)
+                    recommended.append(self.modules[course_code])
+
+                if len(recommended) == k:
+                    break
+
+        return recommended
+
+    def _bucket(self, discipline: str, year_of_study: int) -> CountIndex:
+        """Returns the counts of a discipline and year, creating them if needed."""
+        key: tuple[str, int] = (discipline, year_of_study)
+
+        if key not in self.buckets:
+            self.buckets[key] = CountIndex()
+
+        return self.buckets[key]
+
+
+def load_popularity_counters(repo: Repository) -> PopularityCounters:
+    """Builds the popularity counters from the graph in the db.
+
+    Args:
+      repo:
+        The repository to read from.
+
+    Returns:
+      The popularity counters.
+    """
+    return PopularityCounters(
+        repo.get_modules_for_recommender(),
+        repo.get_enrollment_counts(),
+    )
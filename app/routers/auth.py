@@ -6,9 +6,9 @@ This module contains the various API endpoints for authentication operations.
 from typing import Annotated
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordRequestForm
-from neo4j import Driver
 
-from ..dependencies import get_db_driver  # pylint: disable=import-error
+from ..database.repository import Repository
+from ..dependencies import get_repository  # pylint: disable=import-error
 from ..services.auth import register, authenticate_user
 from ..models.auth import Registration, AuthenticationResponse, Authentication
 
@@ -21,17 +21,17 @@ router = APIRouter(
 
 @router.post("/register", response_model=AuthenticationResponse)
 async def register_user(
-    registration: Registration, driver: Driver = Depends(get_db_driver)
+    registration: Registration, repo: Repository = Depends(get_repository)
 ) -> AuthenticationResponse:
     """API endpoint to register a new user."""
 
-    return register(registration, driver)
+    return await register(registration, repo)
 
 
 @router.post("/login", response_model=AuthenticationResponse)
 async def login_user(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    driver: Driver = Depends(get_db_driver)
+    repo: Repository = Depends(get_repository)
 ) -> AuthenticationResponse:
     """API endpoint to login and authenticate existing users."""
 
@@ -40,4 +40,4 @@ async def login_user(
         password=form_data.password
     )
 
-    return authenticate_user(login_details, driver)
+    return await authenticate_user(login_details, repo)
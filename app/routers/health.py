@@ -0,0 +1,25 @@
+"""API endpoints for the health of the app
+
+This module contains the probes used by the deployment to decide when to send
+traffic to the app.
+
+"""
+from fastapi import APIRouter, Response, status
+
+from ..services.warmup import ready
+
+router = APIRouter(
+    tags=["health"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/ready")
+async def get_readiness(response: Response) -> dict[str, str]:
+    """API endpoint reporting whether the app has warmed up and takes traffic."""
+
+    if not ready.is_set():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "warming up"}
+
+    return {"status": "ready"}
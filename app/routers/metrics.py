@@ -0,0 +1,24 @@
+"""API endpoint for the metrics of the app
+
+This module exposes the in-process metrics in the Prometheus text format.
+
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..metrics import exposition
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """API endpoint to scrape the metrics of the app."""
+
+    return PlainTextResponse(exposition(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -4,11 +4,19 @@ This module contains the various API endpoints for modules operations.
 
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from neo4j import Driver
-from ..dependencies import get_db_driver  # pylint: disable=import-error
-from ..models.module import Module, ModuleCourseCodeAndName
+from fastapi.responses import JSONResponse
+from ..database.repository import Repository
+from ..database.catalog_changes import VersionedCatalog
+from ..dependencies import (  # pylint: disable=import-error
+    get_module_fieldset,
+    get_repository,
+    get_versioned_catalog,
+)
+from ..models.module import CatalogChanges, Module, ModuleCourseCodeAndName, ModuleFieldset
 from ..services.module import (
+    get_catalog_changes,
     get_modules,
+    sparse_modules,
     search_modules,
     get_modules_course_codes,
     get_module,
@@ -26,18 +34,26 @@ router = APIRouter(
 async def read_modules(
     skip: int = 0,
     limit: int = 10,
-    driver: Driver = Depends(get_db_driver)
+    repo: Repository = Depends(get_repository),
+    fieldset: ModuleFieldset = Depends(get_module_fieldset),
 ) -> list[Module]:
     """API endpoint to read modules data from the db.
     
     """
 
-    return get_modules(skip, limit, driver)
+    modules: list[Module] = await get_modules(skip, limit, repo, fieldset)
+
+    if fieldset.is_sparse():
+        return JSONResponse(sparse_modules(modules, fieldset))
+
+    return modules
 
 
 @router.get("/{course-code}", response_model=Module)
 async def read_module(
-    course_code: str | None = None, driver: Driver = Depends(get_db_driver)
+    course_code: str | None = None,
+    repo: Repository = Depends(get_repository),
+    fieldset: ModuleFieldset = Depends(get_module_fieldset),
 ) -> Module:
     """API endpoint to read a single module from the db.
     
@@ -47,13 +63,16 @@ async def read_module(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No course code given"
         )
-    module: Module = get_module(course_code, driver)
+    module: Module = await get_module(course_code, repo, fieldset)
     if module is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Module with course code {course_code} is not found",
         )
 
+    if fieldset.is_sparse():
+        return JSONResponse(sparse_modules([module], fieldset)[0])
+
     return module
 
 
@@ -62,48 +81,73 @@ async def search(
     search_term: str,
     skip: int = 0,
     limit: int = 10,
-    driver: Driver = Depends(get_db_driver),
+    repo: Repository = Depends(get_repository),
+    fieldset: ModuleFieldset = Depends(get_module_fieldset),
 ) -> list[Module]:
     """API endpoint to search for relevant modules based on a search term.
     
     """
 
-    return search_modules(search_term, skip, limit, driver)
+    modules: list[Module] = await search_modules(search_term, skip, limit, repo, fieldset)
+
+    if fieldset.is_sparse():
+        return JSONResponse(sparse_modules(modules, fieldset, default_relations=()))
+
+    return modules
 
 
 @router.get("/get/course-codes", response_model=list[str])
-async def retrieve_course_codes(driver: Driver = Depends(get_db_driver)) -> list[str]:
+async def retrieve_course_codes(repo: Repository = Depends(get_repository)) -> list[str]:
     """API endpoint to get all modules' course codes.
     
     """
 
-    return get_modules_course_codes(driver)
+    return await get_modules_course_codes(repo)
 
 
 @router.get("/get/faculties", response_model=list[str])
-async def retrieve_faculties(driver: Driver = Depends(get_db_driver)) -> list[str]:
+async def retrieve_faculties(repo: Repository = Depends(get_repository)) -> list[str]:
     """API endpoint to get all faculties.
     
     """
 
-    return get_faculties(driver)
+    return await get_faculties(repo)
 
 
 @router.get("/faculty/{faculty}", response_model=list[ModuleCourseCodeAndName])
 async def retrieve_all_modules_in_a_faculty(
-    faculty: str, driver: Driver = Depends(get_db_driver)
+    faculty: str, repo: Repository = Depends(get_repository)
 ) -> list[ModuleCourseCodeAndName]:
     """API endpoint to get all modules in a faculty.
     
     """
 
-    return get_modules_in_a_faculty(faculty, driver)
+    return await get_modules_in_a_faculty(faculty, repo)
 
 
 @router.get("/get/number-of-modules")
-async def retrieve_total_number_of_modules(driver: Driver = Depends(get_db_driver)) -> int:
+async def retrieve_total_number_of_modules(
+    repo: Repository = Depends(get_repository),
+) -> int:
     """API endpoint to get total number of modules.
     
     """
 
-    return get_total_number_of_modules(driver)
+    return await get_total_number_of_modules(repo)
+
+
+@router.get("/changes", response_model=CatalogChanges)
+async def read_catalog_changes(
+    since: int,
+    catalog: VersionedCatalog = Depends(get_versioned_catalog),
+) -> CatalogChanges:
+    """API endpoint to get the changes of the catalog since a version.
+
+    Clients keeping a copy of the catalog pass the version of their copy and
+    apply the changes returned. When full_resync is set, they download the
+    catalog again, after asking for the changes once more to learn the
+    version to start from; the changes are current states, so applying some
+    twice is harmless.
+    """
+
+    return await get_catalog_changes(since, catalog)
@@ -1,14 +1,27 @@
 """
 Module for operations regarding recommendations in modules2students
 """
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Annotated, AsyncIterator
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from neo4j import Driver
 
-from ..dependencies import get_db_driver
-from ..models.rec import Recommendation
-from ..services.rec import get_recommendations
+from .. import config
+from ..database.repository import Repository
+from ..dependencies import get_module_fieldset, get_repository, get_shared_repository
+from ..models.module import ModuleFieldset
+from ..models.rec import (
+    BatchRecommendationRequest,
+    Recommendation,
+    RecommendationParams,
+)
+from ..services.rec import (
+    authorize_advisor,
+    get_recommendations,
+    resolve_batch_students,
+    stream_batch_recommendations,
+)
 
 router = APIRouter(
     prefix="/recommendations",
@@ -19,17 +32,67 @@ router = APIRouter(
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+@router.post("/batch")
+async def retrieve_batch_recommendations(
+    batch: BatchRecommendationRequest,
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> StreamingResponse:
+    """API endpoint for advisors to get the recommendations of many students.
+
+    The recommendations are streamed as newline-delimited JSON, one
+    BatchRecommendation per line, in the order they are ready. A batch
+    selecting more students than the rec_batch_max_students setting is
+    rejected.
+    """
+
+    authorize_advisor(token)
+    repo: Repository = get_shared_repository()
+    student_ids: list[str] = await run_in_threadpool(
+        resolve_batch_students, batch, repo, config.get_settings().rec_batch_max_students
+    )
+
+    async def ndjson() -> AsyncIterator[str]:
+        async for result in stream_batch_recommendations(student_ids, repo):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 @router.get("/{student_id}", response_model=Recommendation)
 async def retrieve_recommendations(
     token: Annotated[str, Depends(oauth2_scheme)],
     student_id: str | None = None,
-    driver: Driver = Depends(get_db_driver),
+    k: Annotated[int, Query(ge=1, le=100)] = 10,
+    number_of_neighbours: Annotated[int, Query(ge=0, le=100)] = 10,
+    max_similarity: Annotated[float, Query(gt=0, le=1)] = 0.85,
+    repo: Repository = Depends(get_repository),
+    fieldset: ModuleFieldset = Depends(get_module_fieldset),
 ) -> Recommendation:
-    """API endpoint to get a particular student's recommendations"""
+    """API endpoint to get a particular student's recommendations
+
+    The fields= and include= parameters trim the recommended modules of the
+    response. The recommendations are computed or stored in full, so they
+    only save serialization and network bytes.
+    """
 
     if str is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No student id given"
         )
 
-    return await get_recommendations(student_id, driver, token)
+    params: RecommendationParams = RecommendationParams(
+        k=k, number_of_neighbours=number_of_neighbours, max_similarity=max_similarity
+    )
+
+    recommendation: Recommendation = await get_recommendations(student_id, repo, token, params)
+
+    if fieldset.is_sparse():
+        excluded: dict[str, set[str]] = {"__all__": fieldset.excluded()}
+        return JSONResponse(
+            recommendation.model_dump(
+                mode="json",
+                exclude={"cf_recommendations": excluded, "cbf_recommendations": excluded},
+            )
+        )
+
+    return recommendation
@@ -4,9 +4,9 @@ Module for operations regarding students in modules2students
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from neo4j import Driver
 
-from ..dependencies import get_db_driver
+from ..database.repository import Repository
+from ..dependencies import get_repository
 from ..models.student import Student
 from ..services.student import get_student, update_student_details
 
@@ -20,7 +20,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 async def read_student(
     token: Annotated[str, Depends(oauth2_scheme)],
     student_id: str | None = None,
-    driver: Driver = Depends(get_db_driver),
+    repo: Repository = Depends(get_repository),
 ) -> Student:
     """API endpoint to get a particular student's information."""
 
@@ -29,7 +29,7 @@ async def read_student(
             status_code=status.HTTP_404_NOT_FOUND, detail="No student id given"
         )
 
-    student: Student = await get_student(student_id, driver, token)
+    student: Student = await get_student(student_id, repo, token)
 
     return student
 
@@ -38,10 +38,10 @@ async def read_student(
 async def update_student(
     student: Student,
     token: Annotated[str, Depends(oauth2_scheme)],
-    driver: Driver = Depends(get_db_driver)
+    repo: Repository = Depends(get_repository)
 ) -> Student:
     """API endpoint to update a student details."""
 
-    updated_student: Student = await update_student_details(student, driver, token)
+    updated_student: Student = await update_student_details(student, repo, token)
 
     return updated_student
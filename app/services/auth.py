@@ -1,35 +1,56 @@
 """Authentication functions."""
 
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from neo4j import Driver
+from functools import lru_cache
+from typing import Callable
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from passlib.context import CryptContext
 
 from .. import config
-from ..database import auth_db, student_db
+from ..database.bookmarks import use_student_bookmarks
+from ..database.repository import Repository
+from ..metrics import BCRYPT_DURATION, BCRYPT_QUEUE_DEPTH
 from ..models.auth import AuthenticationResponse, Registration, Authentication
 from ..models.student import Student, StudentDB
+from ..tracing import traced
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-settings = config.Settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-hash_key = settings.secret_key
 access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+bcrypt_durations = {
+    operation: BCRYPT_DURATION.labels(operation) for operation in ("hash", "verify")
+}
+
+
+@lru_cache
+def get_pwd_context() -> CryptContext:
+    """Returns the bcrypt context, creating it the first time."""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@lru_cache
+def get_bcrypt_executor() -> ThreadPoolExecutor:
+    """Returns the pool the bcrypt hashes and checks run on."""
+    return ThreadPoolExecutor(
+        max_workers=config.get_settings().bcrypt_workers, thread_name_prefix="bcrypt"
+    )
 
 
 def verify_password(plain_password, hashed_password) -> bool:
     """Verify that the password given is the same as the hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password) -> str:
     """Get the bcrypt hash of the given password."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -42,13 +63,16 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
         expire: datetime = datetime.now(timezone.utc) + timedelta(minutes=15)
 
     to_encode.update({"exp": expire})
-    encoded_jwt: str = jwt.encode(to_encode, hash_key, algorithm=ALGORITHM)
+    encoded_jwt: str = jwt.encode(
+        to_encode, config.get_settings().secret_key, algorithm=ALGORITHM
+    )
 
     return encoded_jwt
 
 
-def register(
-    registeration_details: Registration, driver: Driver
+@traced()
+async def register(
+    registeration_details: Registration, repo: Repository
 ) -> AuthenticationResponse:
     """Register a user
 
@@ -59,14 +83,16 @@ def register(
       register:
         The RegistrationModel containing the credentials to be used in the
         registration process.
-      driver:
-        An open instance of the neo4j Driver.
+      repo:
+        The repository to read from and write to.
 
     Returns:
       The AuthenticationResponseModel after registration.
     """
 
-    if student_db.get_student(registeration_details.student_id, driver) is not None:
+    use_student_bookmarks(registeration_details.student_id)
+
+    if repo.get_student(registeration_details.student_id) is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Student with id ${registeration_details.student_id} already exists!",
@@ -77,8 +103,10 @@ def register(
         email=registeration_details.email,
     )
 
-    hashed_password = get_password_hash(registeration_details.password)
-    auth_db.register_student(new_student, hashed_password, driver)
+    hashed_password = await _run_bcrypt(
+        "hash", get_password_hash, registeration_details.password
+    )
+    repo.register_student(new_student, hashed_password)
 
     access_token = create_access_token(new_student, access_token_expires)
 
@@ -87,14 +115,14 @@ def register(
     )
 
 
-def authenticate_user(
-    authenticate_details: Authentication, driver: Driver
+@traced()
+async def authenticate_user(
+    authenticate_details: Authentication, repo: Repository
 ) -> AuthenticationResponse:
     """Authtenticate existing users."""
 
-    student: StudentDB = student_db.get_student(
-        authenticate_details.username, driver
-    )
+    use_student_bookmarks(authenticate_details.username)
+    student: StudentDB = repo.get_student(authenticate_details.username)
 
     if student is None:
         raise HTTPException(
@@ -102,7 +130,9 @@ def authenticate_user(
             detail=f"Student with id ${authenticate_details.student_id} does not exist!",
         )
 
-    if not verify_password(authenticate_details.password, student.password):
+    if not await _run_bcrypt(
+        "verify", verify_password, authenticate_details.password, student.password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Wrong password!",
@@ -113,3 +143,29 @@ def authenticate_user(
     return AuthenticationResponse(
         access_token=access_token, user_id=authenticate_details.username
     )
+
+
+async def _run_bcrypt(operation: str, func: Callable, *args) -> any:
+    """Runs a bcrypt hash or check on the bcrypt pool.
+
+    bcrypt is deliberately slow, so it is kept off the event loop and bounded
+    by the bcrypt_workers setting. The calls waiting for a worker are reported
+    as the bcrypt queue depth.
+    """
+    started: list[bool] = [False]
+    start: float = time.perf_counter()
+    BCRYPT_QUEUE_DEPTH.inc()
+
+    def run() -> any:
+        started[0] = True
+        BCRYPT_QUEUE_DEPTH.dec()
+        return func(*args)
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            get_bcrypt_executor(), run
+        )
+    finally:
+        if not started[0]:
+            BCRYPT_QUEUE_DEPTH.dec()
+        bcrypt_durations[operation].observe(time.perf_counter() - start)
@@ -3,19 +3,42 @@
 This module contains the CRUD utility functions that
 deals with modules
 
+The catalog reads served to the routers are coalesced: identical calls made
+while one is in flight share its db call and result. They run the db call in
+a worker thread, so they are coroutines.
 """
 
-from neo4j import Driver, EagerResult, Record
-
-from ..database import module_db
-from ..models.module import Module, ModuleCourseCodeAndName
-from ..queries.module_cypher_queries import (
-    GET_PREREQUISITE_GROUPS_FOR_EACH_MODULE,
-    GET_MUTUALLY_EXCLUSIVES_FOR_EACH_MODULE,
+from ..coalescing import SingleFlight
+from ..database.catalog_changes import VersionedCatalog
+from ..database.repository import Repository
+from ..models.module import (
+    MODULE_RELATIONS,
+    CatalogChanges,
+    Module,
+    ModuleCourseCodeAndName,
+    ModuleFieldset,
 )
+from ..tracing import traced
+
+flights: dict[str, SingleFlight] = {
+    operation: SingleFlight(operation)
+    for operation in (
+        "get_modules",
+        "get_module",
+        "search_modules",
+        "get_modules_course_codes",
+        "get_faculties",
+        "get_modules_in_a_faculty",
+        "get_total_number_of_modules",
+        "get_catalog_changes",
+    )
+}
 
 
-def get_modules(skip: int, limit: int, driver: Driver) -> list[Module]:
+@traced()
+async def get_modules(
+    skip: int, limit: int, repo: Repository, fieldset: ModuleFieldset = None
+) -> list[Module]:
     """Retrieves modules from the db.
 
     Retrieves modules from the db based on the
@@ -26,17 +49,24 @@ def get_modules(skip: int, limit: int, driver: Driver) -> list[Module]:
         The number of modules to be skipped when retrieving.
       limit:
         The number of modules to be retrieved.
-      driver:
-        An open instance of neo4j.Driver
+      repo:
+        The repository to read from.
+      fieldset:
+        The fields and relations to be retrieved, all of them if None.
 
     Returns:
       A list of Modules
     """
 
-    return module_db.get_modules(skip, limit, driver)
+    return await flights["get_modules"].run(
+        (skip, limit, fieldset), repo.get_modules, skip, limit, fieldset
+    )
 
 
-def get_module(course_code: str, driver: Driver) -> Module:
+@traced()
+async def get_module(
+    course_code: str, repo: Repository, fieldset: ModuleFieldset = None
+) -> Module:
     """Retrieves a single module from the db
 
     Retrieves a single module from the db based
@@ -45,18 +75,25 @@ def get_module(course_code: str, driver: Driver) -> Module:
     Args:
       course_code:
         The course code of the module to be retrieved.
-      driver:
-        An open instance of neo4j.Driver
+      repo:
+        The repository to read from.
+      fieldset:
+        The fields and relations to be retrieved, all of them if None.
 
     Returns:
       The retrieved module or None if no such module with the
       given course code exists.
     """
 
-    return module_db.get_module(course_code, driver)
+    return await flights["get_module"].run(
+        (course_code, fieldset), repo.get_module, course_code, fieldset
+    )
 
 
-def search_modules(search_term: str, skip: int, limit: int, driver: Driver) -> list[Module]:
+@traced()
+async def search_modules(
+    search_term: str, skip: int, limit: int, repo: Repository, fieldset: ModuleFieldset = None
+) -> list[Module]:
     """Searches for modules based on a search term.
 
     Searches for relevant modules based on the provided search term.
@@ -70,51 +107,64 @@ def search_modules(search_term: str, skip: int, limit: int, driver: Driver) -> l
         The number of modules to be skipped
       limit:
         The number of modules to be returned
-      driver:
-        An open instance of neo4j.Driver
+      repo:
+        The repository to read from.
+      fieldset:
+        The fields and relations to be retrieved. All the fields and no
+        relations if None.
 
     Returns:
       A list of modules that are relevant to the search term.
     """
 
-    return module_db.search_modules(search_term, skip, limit, driver)
+    return await flights["search_modules"].run(
+        (search_term, skip, limit, fieldset),
+        repo.search_modules,
+        search_term,
+        skip,
+        limit,
+        fieldset,
+    )
 
 
-def get_modules_course_codes(driver: Driver) -> list[str]:
+@traced()
+async def get_modules_course_codes(repo: Repository) -> list[str]:
     """Retrieves all course codes of all modules in the db.
 
     Retrieves the course codes for all of the modules in
     the db.
 
     Args:
-      driver:
-        An open neo4j.Driver instance.
+      repo:
+        The repository to read from.
 
     Returns:
       A list of course codes of all the modules in the db.
     """
 
-    return module_db.get_modules_course_codes(driver)
+    return await flights["get_modules_course_codes"].run((), repo.get_modules_course_codes)
 
 
-def get_faculties(driver: Driver) -> list[str]:
+@traced()
+async def get_faculties(repo: Repository) -> list[str]:
     """Retrieves all the faculties of modules.
 
     Retrieves all faculties which modules can belong to
     from the db.
 
     Args:
-      driver:
-        An open instance of neo4j.Driver.
+      repo:
+        The repository to read from.
 
     Returns:
       A list of all the faculties that modules can belong to.
     """
 
-    return module_db.get_faculties(driver)
+    return await flights["get_faculties"].run((), repo.get_faculties)
 
 
-def get_modules_in_a_faculty(faculty: str, driver: Driver) -> list[ModuleCourseCodeAndName]:
+@traced()
+async def get_modules_in_a_faculty(faculty: str, repo: Repository) -> list[ModuleCourseCodeAndName]:
     """Retrieves all modules that belong to a faculty.
 
     Retrieves all modules that belong to a specific faculty
@@ -124,17 +174,20 @@ def get_modules_in_a_faculty(faculty: str, driver: Driver) -> list[ModuleCourseC
     Args:
       faculty:
         The faculty which modules shall be retrieved.
-      driver:
-        An open instance of the neo4j.Driver.
+      repo:
+        The repository to read from.
 
     Returns:
       A list of all modules that belong to a specific faculty.
     """
 
-    return module_db.get_modules_in_a_faculty(faculty, driver)
+    return await flights["get_modules_in_a_faculty"].run(
+        faculty, repo.get_modules_in_a_faculty, faculty
+    )
 
 
-def get_prerequisite_groups_for_each_module(course_code: str, driver: Driver) -> list[list[str]]:
+@traced()
+def get_prerequisite_groups_for_each_module(course_code: str, repo: Repository) -> list[list[str]]:
     """Retrieves all prerequisite groups for a module.
 
     Retrieves all prerequisite groups for a module which is
@@ -144,29 +197,19 @@ def get_prerequisite_groups_for_each_module(course_code: str, driver: Driver) ->
       course_code:
         Course code of the module from which to retreive
         its prerequisite groups.
-      driver:
-        An open instance of a neo4j.Driver.
+      repo:
+        The repository to read from.
 
     Returns:
       A list of list of strings. Each inner list contains the course codes
       that make up that particular prerequisite group.
     """
-    query: str = GET_PREREQUISITE_GROUPS_FOR_EACH_MODULE
-
-    eager_result: EagerResult = driver.execute_query(
-        query, course_code=course_code, database_="neo4j"
-    )
-    records: list[Record] = eager_result.records
-    prerequisite_groups: list[list[str]] = []
 
-    for record in records:
-        data: dict[str, any] = record.data()
-        prerequisite_groups.append(data["prereqInfo"])
+    return repo.get_prerequisite_groups_for_each_module(course_code)
 
-    return prerequisite_groups
 
-
-def get_mutually_exclusives_for_each_module(course_code: str, driver: Driver) -> list[str]:
+@traced()
+def get_mutually_exclusives_for_each_module(course_code: str, repo: Repository) -> list[str]:
     """
     Retreive the modules that are mutually exclusive to the current module.
 
@@ -176,36 +219,70 @@ def get_mutually_exclusives_for_each_module(course_code: str, driver: Driver) ->
       course_code:
         The course code of the module for which its mutually exclusive modules
         will be retrieved.
-      driver:
-        An open instance of the neo4j.Driver.
+      repo:
+        The repository to read from.
 
     Returns:
       A list of course codes of the mutually exclusive modules.
     """
-    query: str = GET_MUTUALLY_EXCLUSIVES_FOR_EACH_MODULE
-
-    eager_result: EagerResult = driver.execute_query(
-        query, course_code=course_code, database_="neo4j"
-    )
-    records: list[Record] = eager_result.records
-    mutually_exclusives: list[str] = []
-
-    for record in records:
-        data: dict[str, any] = record.data()
-        mutually_exclusives.append(data["mutualCourseCode"])
 
-    return mutually_exclusives
+    return repo.get_mutually_exclusives_for_each_module(course_code)
 
 
-def get_total_number_of_modules(driver: Driver) -> int:
+@traced()
+async def get_total_number_of_modules(repo: Repository) -> int:
     """Retrieve the total number of modules.
 
     Args:
-      driver:
-        An open instance of the neo4j.Driver.
+      repo:
+        The repository to read from.
 
     Returns:
       The total number of modules in the db.
     """
 
-    return module_db.get_total_number_of_modules(driver)
+    return await flights["get_total_number_of_modules"].run((), repo.get_total_number_of_modules)
+
+
+@traced()
+async def get_catalog_changes(since: int, catalog: VersionedCatalog) -> CatalogChanges:
+    """Retrieves the changes of the catalog since a version.
+
+    Args:
+      since:
+        The version of the catalog the changes are wanted from.
+      catalog:
+        The versioned catalog to read from.
+
+    Returns:
+      The modules, prerequisite groups and mutually exclusives added, changed
+      or removed since the version, or a full resync if the changes since the
+      version are no longer logged.
+    """
+
+    return await flights["get_catalog_changes"].run(
+        since, catalog.get_catalog_changes, since
+    )
+
+
+def sparse_modules(
+    modules: list[Module],
+    fieldset: ModuleFieldset,
+    default_relations: tuple[str, ...] = MODULE_RELATIONS,
+) -> list[dict[str, any]]:
+    """Serializes modules with only the fields and relations of a fieldset.
+
+    Args:
+      modules:
+        The modules to be serialized.
+      fieldset:
+        The fieldset of the response.
+      default_relations:
+        The relations the endpoint returns when the fieldset does not say.
+
+    Returns:
+      The JSON-compatible dicts of the modules.
+    """
+    excluded: set[str] = fieldset.excluded(default_relations)
+
+    return [module.model_dump(mode="json", exclude=excluded) for module in modules]
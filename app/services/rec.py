@@ -2,45 +2,114 @@
 CRUD utility functions for recommendation endpoints.
 """
 
-from typing import Annotated
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, AsyncIterator, Callable, Iterable
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from neo4j import Driver
+from neo4j.exceptions import Neo4jError
 from jose import JWTError, jwt
 
 from .. import config
-from ..database import rec_db
+from ..database.bookmarks import use_student_bookmarks
+from ..database.instrumentation import current_queries
+from ..database.repository import Repository
+from ..dependencies import get_shared_repository
+from ..metrics import CACHE_REQUESTS, REC_DEGRADED_RESPONSES, REC_SUB_QUERY_TIMEOUTS
 from ..models.module import Module
-from ..models.rec import Recommendation
+from ..models.student import Student
+from ..models.rec import (
+    BatchRecommendation,
+    BatchRecommendationRequest,
+    Recommendation,
+    RecommendationParams,
+    StoredRecommendation,
+    StudentRecProfile,
+)
+from ..recommenders.content_based import (
+    ContentBasedRecommender,
+    load_content_based_recommender,
+)
+from ..recommenders.collaborative import (
+    CollaborativeRecommender,
+    load_collaborative_recommender,
+)
+from ..recommenders.popularity import PopularityCounters, load_popularity_counters
+from ..tracing import current_span, span, traced
 
 ALGORITHM = "HS256"
+REC_QUERY_WORKERS = 16
 
+REC_SUB_QUERIES: dict[str, Callable[[str, Repository], list[Module]]] = {
+    "cb_fulfil_prereq": lambda student_id, repo, **kwargs: (
+        repo.get_cb_recs_that_fulfil_prereq(student_id, **kwargs)
+    ),
+    "cb_no_prereq": lambda student_id, repo, **kwargs: (
+        repo.get_cb_recs_that_have_no_prereq(student_id, **kwargs)
+    ),
+    "cf_fulfil_prereq": lambda student_id, repo, **kwargs: (
+        repo.get_cf_recs_that_fulfill_prereq(student_id, **kwargs)
+    ),
+    "cf_no_prereq": lambda student_id, repo, **kwargs: (
+        repo.get_cf_recs_that_have_no_prereq(student_id, **kwargs)
+    ),
+}
+
+logger = logging.getLogger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-settings = config.Settings()
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Could not validate credentials",
     headers={"WWW-Authenticate": "Bearer"},
 )
+forbidden_exception = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="Only advisors can retrieve recommendations in batches",
+)
+rec_query_executor = ThreadPoolExecutor(
+    max_workers=REC_QUERY_WORKERS, thread_name_prefix="rec-query"
+)
+rec_store_hits = CACHE_REQUESTS.labels("rec_store", "hit")
+rec_store_stale_hits = CACHE_REQUESTS.labels("rec_store", "stale")
+rec_store_misses = CACHE_REQUESTS.labels("rec_store", "miss")
+refreshing_students: dict[str, asyncio.Task] = {}
+recommender_lock = threading.Lock()
+cb_recommender: ContentBasedRecommender = None
+cf_recommender: CollaborativeRecommender = None
+popularity_counters: PopularityCounters = None
+in_process_loaded_at: dict[str, float] = {}
+in_process_reloading: set[str] = set()
 
 
+@traced()
 async def get_recommendations(
-    student_id: str, driver: Driver, token: Annotated[str, Depends(oauth2_scheme)]
+    student_id: str,
+    repo: Repository,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    params: RecommendationParams = None,
 ) -> Recommendation:
     """Retrieve a student's recommendations from the db.
 
     This function retrieves a student's recommendations from the db
     based on the student id supplied. The function takes in the
-    student id, an open instance of the neo4j.Driver and the JWT access
-    token.
+    student id, the repository and the JWT access token.
 
     Args:
       student_id:
         The id of the student whose information we want to retrieve.
-      driver:
-        An open instance of the neo4j.Driver.
+      repo:
+        The repository to read from and write to.
       token:
         JWT access token.
+      params:
+        The parameters of the recommendations. The materialized
+        recommendations are only served for the default parameters, others
+        are computed on every request.
 
     Returns:
       The information of the student encapsulated in a RecommendationModel model.
@@ -50,7 +119,7 @@ async def get_recommendations(
 
     try:
         payload: dict[str, any] = jwt.decode(
-            token, settings.secret_key, algorithms=[ALGORITHM]
+            token, config.get_settings().secret_key, algorithms=[ALGORITHM]
         )
         username = payload.get("user_id")
         if username is None or username != student_id:
@@ -58,32 +127,910 @@ async def get_recommendations(
     except JWTError as exc:
         raise credentials_exception from exc
 
-    recs: Recommendation = Recommendation()
+    use_student_bookmarks(username)
+
+    if params is not None and params != RecommendationParams():
+        return await compute_recommendations(
+            username,
+            repo,
+            config.get_settings().rec_request_deadline_seconds,
+            params=params,
+        )
+
+    return await get_materialized_recommendations(username, repo)
+
+
+@traced()
+async def get_materialized_recommendations(
+    student_id: str, repo: Repository
+) -> Recommendation:
+    """Serves a student's recommendations from the materialized store.
+
+    Fresh stored recommendations are returned as they are. Stale stored
+    recommendations are still returned if they were invalidated within the
+    stale-while-revalidate window, in which case a recomputation is scheduled
+    in the background. Otherwise the recommendations are recomputed and stored
+    before being returned.
+
+    Args:
+      student_id:
+        The id of the student whose recommendations are retrieved.
+      repo:
+        The repository to read from and write to.
+
+    Returns:
+      The recommendations of the student.
+    """
+    stored: StoredRecommendation = await _run_in_executor(
+        repo.get_stored_recommendations, student_id
+    )
+
+    if stored is None:
+        return Recommendation()
+
+    if stored.computed_at is not None:
+        if stored.stale_since is None:
+            rec_store_hits.inc()
+            return stored.recommendation
+
+        stale_for: float = time.time() - stored.stale_since
+
+        if stale_for <= config.get_settings().rec_store_stale_while_revalidate_seconds:
+            rec_store_stale_hits.inc()
+            schedule_recommendations_refresh(student_id)
+            return stored.recommendation
+
+    rec_store_misses.inc()
+
+    return await refresh_recommendations(
+        student_id,
+        stored.generation,
+        repo,
+        config.get_settings().rec_request_deadline_seconds,
+        stored.recommendation if stored.computed_at is not None else None,
+    )
+
+
+@traced()
+async def refresh_recommendations(
+    student_id: str,
+    generation: int,
+    repo: Repository,
+    deadline: float = None,
+    fallback: Recommendation = None,
+) -> Recommendation:
+    """Recomputes a student's recommendations and materializes them.
+
+    Degraded recommendations are returned but never stored.
+
+    Args:
+      student_id:
+        The id of the student whose recommendations are recomputed.
+      generation:
+        The generation of the stored recommendations read before recomputing.
+        The result is not stored if the recommendations have been invalidated
+        again in the meantime.
+      repo:
+        The repository to read from and write to.
+      deadline:
+        The time budget in seconds of the recomputation, if any.
+      fallback:
+        The recommendations to fall back on if some sub-queries miss their
+        time budget.
+
+    Returns:
+      The recomputed recommendations of the student.
+    """
+    computed_at: float = time.time()
+    recs: Recommendation = await compute_recommendations(
+        student_id, repo, deadline, fallback
+    )
+
+    if recs.degraded:
+        return recs
+
+    await _run_in_executor(
+        repo.store_recommendations,
+        student_id,
+        recs,
+        generation,
+        computed_at,
+    )
+
+    return recs
+
+
+def invalidate_recommendations(student_id: str, repo: Repository):
+    """Marks a student's stored recommendations as stale and recomputes them.
+
+    To be called whenever the modules taken by the student change. The
+    recomputation runs in the background.
+
+    Args:
+      student_id:
+        The id of the student whose recommendations are invalidated.
+      repo:
+        The repository to read from and write to.
+    """
+    repo.invalidate_stored_recommendations(student_id, time.time())
+    schedule_recommendations_refresh(student_id)
+
+
+def schedule_recommendations_refresh(student_id: str):
+    """Schedules a background recomputation of a student's recommendations.
+
+    At most one recomputation per student is in flight at any time.
+    """
+    if student_id in refreshing_students:
+        return
+
+    task: asyncio.Task = asyncio.get_running_loop().create_task(
+        _refresh_in_background(student_id)
+    )
+    refreshing_students[student_id] = task
+    task.add_done_callback(lambda _: refreshing_students.pop(student_id, None))
+
+
+@traced()
+async def precompute_recommendations(
+    repo: Repository, chunk_size: int = None, concurrency: int = None
+) -> int:
+    """Precomputes and stores the recommendations of every student.
+
+    The students are split into chunks which are processed in parallel. A
+    student deleted since the students were listed is skipped, and a student
+    whose recommendations cannot be computed is logged and skipped, without
+    stopping the other students.
+
+    Args:
+      repo:
+        The repository to read from and write to.
+      chunk_size:
+        The number of students in each chunk. Defaults to the
+        rec_precompute_chunk_size setting.
+      concurrency:
+        The number of chunks processed at the same time. Defaults to the
+        rec_precompute_concurrency setting.
+
+    Returns:
+      The number of students whose recommendations were precomputed and
+      stored.
+    """
+    chunk_size = chunk_size or config.get_settings().rec_precompute_chunk_size
+    concurrency = concurrency or config.get_settings().rec_precompute_concurrency
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+
+    student_ids: list[str] = repo.get_all_student_ids()
+    chunks: list[list[str]] = [
+        student_ids[i : i + chunk_size] for i in range(0, len(student_ids), chunk_size)
+    ]
+
+    async def precompute_chunk(chunk: list[str]) -> int:
+        precomputed: int = 0
+
+        async with semaphore:
+            for student_id in chunk:
+                try:
+                    stored: StoredRecommendation = await _run_in_executor(
+                        repo.get_stored_recommendations, student_id
+                    )
+                    if stored is None:
+                        continue
+
+                    recs: Recommendation = await refresh_recommendations(
+                        student_id, stored.generation, repo
+                    )
+                    precomputed += not recs.degraded
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logger.exception("Failed to precompute recommendations of %s", student_id)
+
+        return precomputed
+
+    return sum(await asyncio.gather(*(precompute_chunk(chunk) for chunk in chunks)))
+
+
+def authorize_advisor(token: Annotated[str, Depends(oauth2_scheme)]) -> str:
+    """Checks that the JWT access token belongs to an advisor.
+
+    Args:
+      token:
+        JWT access token.
+
+    Returns:
+      The id of the advisor. Raises exceptions if the token is invalid or does
+      not belong to one of the advisors of the advisor_ids setting.
+    """
+    try:
+        payload: dict[str, any] = jwt.decode(
+            token, config.get_settings().secret_key, algorithms=[ALGORITHM]
+        )
+    except JWTError as exc:
+        raise credentials_exception from exc
+
+    username: str = payload.get("user_id")
+
+    if username is None:
+        raise credentials_exception
+    if username not in config.get_settings().advisor_ids:
+        raise forbidden_exception
+
+    return username
+
+
+def resolve_batch_students(
+    batch: BatchRecommendationRequest, repo: Repository, max_students: int = None
+) -> list[str]:
+    """Lists the ids of the students selected by a batch request.
+
+    The explicitly given ids come first, in the given order, followed by the
+    students matching the major and year of study filters, if any are given.
+    Duplicate ids are dropped.
+
+    Args:
+      batch:
+        The batch recommendation request.
+      repo:
+        The repository to read from.
+      max_students:
+        The number of students a batch may select at most, None if unbounded.
+
+    Returns:
+      The ids of the selected students.
+
+    Raises:
+      HTTPException: The batch selects more than max_students students.
+    """
+    student_ids: dict[str, None] = dict.fromkeys(batch.student_ids)
+    _check_batch_size(student_ids, max_students)
+
+    if batch.major is not None or batch.year_of_study is not None:
+        student_ids.update(
+            dict.fromkeys(
+                repo.find_student_ids(batch.major, batch.year_of_study)
+            )
+        )
+        _check_batch_size(student_ids, max_students)
+
+    return list(student_ids)
+
+
+async def stream_batch_recommendations(
+    student_ids: Iterable[str], repo: Repository, concurrency: int = None
+) -> AsyncIterator[BatchRecommendation]:
+    """Computes the recommendations of many students with bounded parallelism.
+
+    At most concurrency students are processed at the same time and the
+    results are yielded as soon as they are ready, so the results are not in
+    the order of the student ids. Fresh materialized recommendations are
+    served as they are. Other students have their recommendations recomputed
+    without any deadline and stored. A student whose recommendations cannot be
+    computed is reported with an error instead of failing the whole batch.
+
+    Args:
+      student_ids:
+        The ids of the students. Consumed lazily.
+      repo:
+        The repository to read from and write to. All the students share it,
+        and with it the connection pool of the db.
+      concurrency:
+        The number of students processed at the same time. Defaults to the
+        rec_batch_concurrency setting.
+
+    Yields:
+      The recommendations of each student.
+    """
+    concurrency = concurrency or config.get_settings().rec_batch_concurrency
+    remaining = iter(student_ids)
+    pending: set[asyncio.Task] = set()
+
+    def submit() -> bool:
+        student_id: str = next(remaining, None)
+
+        if student_id is None:
+            return False
+
+        pending.add(asyncio.create_task(_batch_recommendation(student_id, repo)))
+
+        return True
+
+    try:
+        while len(pending) < concurrency and submit():
+            pass
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                pending.discard(task)
+                submit()
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@traced()
+async def run_rec_queries(
+    student_id: str,
+    repo: Repository,
+    sub_queries: dict[str, Callable[[str, Repository], list[Module]]] = None,
+    deadline: float = None,
+) -> tuple[dict[str, list[Module]], dict[str, float], list[str]]:
+    """Runs the recommendation sub-queries concurrently.
+
+    Each sub-query is submitted to a bounded thread pool. The Neo4j
+    repository hands every query its own session, so the queries run on
+    separate connections and the overall latency is roughly that of the slowest query.
+    Results are collected as they complete.
+
+    A sub-query misses its budget if the db terminates it for exceeding its
+    transaction timeout or if it has not completed by the deadline.
+
+    Args:
+      student_id:
+        The id of the student to retrieve recommendations for.
+      repo:
+        The repository to read from.
+      sub_queries:
+        The sub-queries to run, keyed by name. Defaults to every sub-query.
+      deadline:
+        The time in seconds after which the sub-queries still running are
+        given up on. No deadline if None.
+
+    Returns:
+      A tuple of the results keyed by sub-query name, the time taken by each
+      sub-query in milliseconds and the names of the sub-queries that missed
+      their budget.
+    """
+    if sub_queries is None:
+        sub_queries = REC_SUB_QUERIES
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    give_up_at: float = None if deadline is None else loop.time() + deadline
+    pending: dict[asyncio.Future, str] = {
+        loop.run_in_executor(
+            rec_query_executor,
+            contextvars.copy_context().run,
+            _timed_rec_query,
+            name,
+            rec_query,
+            student_id,
+            repo,
+        ): name
+        for name, rec_query in sub_queries.items()
+    }
+    results: dict[str, list[Module]] = {}
+    timings: dict[str, float] = {}
+    missed: list[str] = []
+
+    while pending:
+        timeout: float = None if give_up_at is None else max(give_up_at - loop.time(), 0)
+        done, _ = await asyncio.wait(
+            pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+
+        if not done:
+            break
+
+        for future in done:
+            name: str = pending.pop(future)
 
-    cb_recs_fulfil_prereq: list[
-        Module
-    ] = rec_db.get_cb_recs_that_fulfil_prereq(username, driver)
+            try:
+                results[name], timings[name] = future.result()
+            except Neo4jError as exc:
+                if "TransactionTimedOut" not in (exc.code or ""):
+                    raise
+                missed.append(name)
 
-    cb_recs_no_prereq: list[Module] = rec_db.get_cb_recs_that_have_no_prereq(
-        username, driver
+    for future, name in pending.items():
+        future.cancel()
+        missed.append(name)
+
+    for name in missed:
+        REC_SUB_QUERY_TIMEOUTS.labels(name).inc()
+
+    return results, timings, missed
+
+
+def get_rec_sub_queries(
+    profile: StudentRecProfile, params: RecommendationParams = None
+) -> dict[str, Callable[[str, Repository], list[Module]]]:
+    """Returns the recommendation sub-queries worth running for a student.
+
+    The "cypher" backend runs the sub-queries in the db, each with a
+    transaction timeout. The "in_process" backend answers them from the
+    in-process recommenders instead. Either way the parameters are bound to
+    the sub-queries so that only the k best modules of each are returned. No
+    sub-query is returned for a student who has not taken any module, and the
+    collaborative sub-queries are left out when no neighbour is asked for. The
+    "cypher" backend also leaves them out for a student without
+    SIMILAR_TO_USER edges, as they could not recommend anything, while the
+    "in_process" backend finds the neighbours from the current enrollments,
+    whatever the stored edges, and recommends nothing if it finds none.
+
+    Args:
+      profile:
+        The profile of the student.
+      params:
+        The parameters of the recommendations. Defaults to the default
+        RecommendationParams.
+
+    Returns:
+      The sub-queries keyed by name.
+    """
+    if params is None:
+        params = RecommendationParams()
+
+    if not profile.course_codes:
+        return {}
+
+    in_process: bool = config.get_settings().recommender_backend == "in_process"
+
+    if in_process:
+        sub_queries: dict[str, Callable[[str, Repository], list[Module]]] = {
+            "cb_fulfil_prereq": functools.partial(
+                _in_process_cb_recs_that_fulfil_prereq, profile, params
+            ),
+            "cb_no_prereq": functools.partial(
+                _in_process_cb_recs_that_have_no_prereq, profile, params
+            ),
+            "cf_fulfil_prereq": functools.partial(
+                _in_process_cf_recs_that_fulfill_prereq, params
+            ),
+            "cf_no_prereq": functools.partial(_in_process_cf_recs_that_have_no_prereq, params),
+        }
+    else:
+        cb_params: dict[str, any] = {
+            "timeout": config.get_settings().rec_query_timeout_seconds,
+            "k": params.k,
+            "max_similarity": params.max_similarity,
+        }
+        cf_params: dict[str, any] = {
+            "timeout": config.get_settings().rec_query_timeout_seconds,
+            "k": params.k,
+            "number_of_neighbours": params.number_of_neighbours,
+        }
+        sub_queries = {
+            name: functools.partial(
+                rec_query, **(cf_params if name.startswith("cf_") else cb_params)
+            )
+            for name, rec_query in REC_SUB_QUERIES.items()
+        }
+
+    if params.number_of_neighbours == 0 or (
+        not in_process and profile.number_of_neighbours == 0
+    ):
+        for name in ("cf_fulfil_prereq", "cf_no_prereq"):
+            del sub_queries[name]
+
+    return sub_queries
+
+
+def get_cb_recommender(repo: Repository) -> ContentBasedRecommender:
+    """Returns the in-process content-based recommender, loading it if needed.
+
+    See _get_in_process for how it is kept up to date.
+    """
+    return _get_in_process("cb_recommender", load_content_based_recommender, repo)
+
+
+def get_cf_recommender(repo: Repository) -> CollaborativeRecommender:
+    """Returns the in-process collaborative recommender, loading it if needed.
+
+    See _get_in_process for how it is kept up to date.
+    """
+    return _get_in_process("cf_recommender", load_collaborative_recommender, repo)
+
+
+def get_popularity_counters(repo: Repository) -> PopularityCounters:
+    """Returns the module popularity counters, loading them if needed.
+
+    See _get_in_process for how they are kept up to date.
+    """
+    return _get_in_process("popularity_counters", load_popularity_counters, repo)
+
+
+def _get_in_process(name: str, load: Callable[[Repository], any], repo: Repository) -> any:
+    """Returns an in-process model, loading it if needed.
+
+    Each worker only applies the changes of the students it serves to its own
+    models, so a model loaded longer than the in_process_reload_seconds
+    setting ago is reloaded from the db, which holds every worker's changes,
+    in a background thread, while the loaded model keeps serving. The models
+    of a worker thus miss the changes made through other workers for at most
+    about that long. Setting it to 0 never reloads them, which only suits a
+    single worker.
+
+    Args:
+      name:
+        The name of the module global holding the model.
+      load:
+        The function loading the model from a repository.
+      repo:
+        The repository to load the model from the first time.
+
+    Returns:
+      The model.
+    """
+    reload_seconds: float = config.get_settings().in_process_reload_seconds
+
+    with recommender_lock:
+        model: any = globals()[name]
+
+        if model is None:
+            model = load(repo)
+            globals()[name] = model
+            in_process_loaded_at[name] = time.monotonic()
+        elif (
+            reload_seconds > 0
+            and time.monotonic() - in_process_loaded_at.get(name, 0) >= reload_seconds
+            and name not in in_process_reloading
+        ):
+            in_process_reloading.add(name)
+            threading.Thread(
+                target=_reload_in_process,
+                args=(name, load),
+                name=f"reload-{name}",
+                daemon=True,
+            ).start()
+
+    return model
+
+
+def _reload_in_process(name: str, load: Callable[[Repository], any]):
+    """Reloads an in-process model from the shared repository and swaps it in."""
+    try:
+        model: any = load(get_shared_repository())
+
+        with recommender_lock:
+            globals()[name] = model
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Failed to reload the in-process %s", name)
+    finally:
+        with recommender_lock:
+            in_process_loaded_at[name] = time.monotonic()
+            in_process_reloading.discard(name)
+
+
+def record_module_changes(  # pylint: disable=too-many-arguments
+    disciplines: list[str],
+    year_of_study: int,
+    added: list[str],
+    removed: list[str],
+    previous: Student = None,
+    kept: list[str] = (),
+):
+    """Applies the modules added and removed by a student to the popularity
+    counters, if loaded.
+
+    If the student's disciplines or year of study changed, the modules they
+    kept are moved from the counters of the previous ones to those of the new
+    ones.
+
+    Args:
+      disciplines:
+        The disciplines of the student.
+      year_of_study:
+        The year of study of the student.
+      added:
+        The course codes of the modules the student started taking.
+      removed:
+        The course codes of the modules the student stopped taking.
+      previous:
+        The student before the change, whose disciplines and year of study
+        the modules taken before were counted under. Defaults to the current
+        ones.
+      kept:
+        The course codes of the modules the student still takes.
+    """
+    if popularity_counters is not None:
+        popularity_counters.record_changes(
+            disciplines,
+            year_of_study,
+            added,
+            removed,
+            previous.disciplines if previous is not None else None,
+            previous.year_of_study if previous is not None else None,
+            kept,
+        )
+
+
+def update_in_process_recommenders(
+    student_id: str, course_codes: list[str] = None, disciplines: list[str] = None
+):
+    """Applies a change to a student to the in-process recommenders, if loaded.
+
+    Only the student's row of the collaborative recommender is updated.
+
+    Args:
+      student_id:
+        The id of the student that changed.
+      course_codes:
+        The course codes of the modules now taken by the student, if changed.
+      disciplines:
+        The disciplines of the student, if changed.
+    """
+    if cf_recommender is None:
+        return
+
+    if course_codes is not None:
+        cf_recommender.update_student(student_id, course_codes, disciplines)
+    elif disciplines is not None:
+        cf_recommender.update_student_disciplines(student_id, disciplines)
+
+
+@traced()
+async def compute_recommendations(
+    student_id: str,
+    repo: Repository,
+    deadline: float = None,
+    fallback: Recommendation = None,
+    params: RecommendationParams = None,
+) -> Recommendation:
+    """Computes a student's recommendations without any authentication.
+
+    The student's profile is looked up first so that the sub-queries that
+    cannot recommend anything for the student are skipped. Whichever list of
+    recommendations ends up empty is filled with popular modules instead.
+
+    The profile lookup has the same transaction timeout as the sub-queries
+    and counts against the deadline. If it misses its budget, no sub-query is
+    run and the fallback recommendations are returned, or the popular modules
+    if there is no fallback, flagged as degraded.
+
+    If a sub-query misses its budget, the partial results of the other
+    sub-queries are returned. A list whose sub-queries all missed their budget
+    is taken from the fallback recommendations, or from the popular modules if
+    there is no fallback, and the recommendations are flagged as degraded.
+
+    Args:
+      student_id:
+        The id of the student to compute recommendations for.
+      repo:
+        The repository to read from and write to.
+      deadline:
+        The time budget in seconds of the whole computation. No deadline if
+        None.
+      fallback:
+        The recommendations to fall back on, such as the last materialized
+        recommendations of the student.
+      params:
+        The parameters of the recommendations. Defaults to the default
+        RecommendationParams.
+
+    Returns:
+      The recommendations together with the time taken by each sub-query.
+    """
+    if params is None:
+        params = RecommendationParams()
+
+    start: float = time.perf_counter()
+
+    try:
+        profile: StudentRecProfile = await asyncio.wait_for(
+            _run_in_executor(
+                repo.get_student_rec_profile,
+                student_id,
+                config.get_settings().rec_query_timeout_seconds,
+            ),
+            deadline,
+        )
+    except (asyncio.TimeoutError, Neo4jError) as exc:
+        if isinstance(exc, Neo4jError) and "TransactionTimedOut" not in (exc.code or ""):
+            raise
+        return _recommendations_without_profile(start, fallback, params)
+
+    profile_time: float = (time.perf_counter() - start) * 1000
+
+    if deadline is not None:
+        deadline = max(deadline - profile_time / 1000, 0)
+
+    results, timings, missed = await run_rec_queries(
+        student_id, repo, get_rec_sub_queries(profile, params), deadline
     )
+    timings["profile"] = profile_time
+    recs: Recommendation = Recommendation(timings=timings, missed_sub_queries=missed)
 
-    cf_recs_fulfill_prereq: list[
-        Module
-    ] = rec_db.get_cf_recs_that_fulfill_prereq(username, driver)
-    cf_recs_no_prereq: list[Module] = rec_db.get_cf_recs_that_have_no_prereq(
-        username, driver
+    cb_recs: list[Module] = results.get("cb_no_prereq", []) + results.get(
+        "cb_fulfil_prereq", []
+    )
+    cf_recs: list[Module] = results.get("cf_no_prereq", []) + results.get(
+        "cf_fulfil_prereq", []
     )
 
-    cb_recs: list[Module] = cb_recs_no_prereq + cb_recs_fulfil_prereq
-    cf_recs: list[Module] = cf_recs_no_prereq + cf_recs_fulfill_prereq
+    cb_recs.sort(key=lambda x: x.score, reverse=True)
+
+    if missed:
+        recs.degraded = True
+
+        if not cb_recs and any(name.startswith("cb_") for name in missed):
+            cb_recs = fallback.cbf_recommendations if fallback is not None else []
+        if not cf_recs and any(name.startswith("cf_") for name in missed):
+            cf_recs = fallback.cf_recommendations if fallback is not None else []
+
+        REC_DEGRADED_RESPONSES.labels(
+            "materialized" if fallback is not None else "partial"
+        ).inc()
+
+    if not cb_recs or not cf_recs:
+        popularity_start: float = time.perf_counter()
+        counters: PopularityCounters = popularity_counters
 
-    cb_recs.sort(key=lambda x: x.score , reverse=True)
+        if counters is not None:
+            counters = get_popularity_counters(repo)
+        elif not missed:
+            counters = await _run_in_executor(get_popularity_counters, repo)
 
-    cb_recs_top_10: list[Module] = cb_recs[:10]
-    cf_recs_top_10: list[Module] = cf_recs[:10]
+        if counters is not None:
+            if not cb_recs:
+                cb_recs = counters.recommend(
+                    params.k, exclude=profile.course_codes, broadening_and_deepening=True
+                )
+            if not cf_recs:
+                cf_recs = counters.recommend(
+                    params.k,
+                    profile.disciplines,
+                    profile.year_of_study,
+                    profile.course_codes,
+                )
 
-    recs.cbf_recommendations = cb_recs_top_10
-    recs.cf_recommendations = cf_recs_top_10
+        timings["popularity"] = (time.perf_counter() - popularity_start) * 1000
+
+    timings["total"] = (time.perf_counter() - start) * 1000
+    recs.cbf_recommendations = cb_recs[: params.k]
+    recs.cf_recommendations = cf_recs[: params.k]
+
+    return recs
+
+
+def _recommendations_without_profile(
+    start: float, fallback: Recommendation, params: RecommendationParams
+) -> Recommendation:
+    """Returns the fallback recommendations, or the popular modules if there
+    is no fallback, for a student whose profile lookup missed its budget.
+
+    The popularity counters are only used if already loaded, and cannot leave
+    out the modules the student takes, which are part of the profile.
+    """
+    REC_SUB_QUERY_TIMEOUTS.labels("profile").inc()
+    REC_DEGRADED_RESPONSES.labels("materialized" if fallback is not None else "partial").inc()
+    recs: Recommendation = Recommendation(
+        timings={"profile": (time.perf_counter() - start) * 1000},
+        degraded=True,
+        missed_sub_queries=["profile"],
+    )
+
+    if fallback is not None:
+        recs.cbf_recommendations = fallback.cbf_recommendations[: params.k]
+        recs.cf_recommendations = fallback.cf_recommendations[: params.k]
+    elif popularity_counters is not None:
+        recs.cbf_recommendations = popularity_counters.recommend(
+            params.k, broadening_and_deepening=True
+        )
+        recs.cf_recommendations = popularity_counters.recommend(params.k)
+
+    recs.timings["total"] = (time.perf_counter() - start) * 1000
 
     return recs
+
+
+def _timed_rec_query(
+    name: str,
+    rec_query: Callable[[str, Repository], list[Module]],
+    student_id: str,
+    repo: Repository,
+) -> tuple[list[Module], float]:
+    """Runs a single recommendation sub-query and measures it in milliseconds."""
+    start: float = time.perf_counter()
+
+    with span(f"rec_sub_query.{name}", {"sub_query": name}):
+        modules: list[Module] = rec_query(student_id, repo)
+
+    return modules, (time.perf_counter() - start) * 1000
+
+
+async def _refresh_in_background(student_id: str):
+    """Recomputes a student's recommendations using the shared repository."""
+    # The task inherits the context of the request that scheduled it, but its
+    # queries are not run on behalf of that request.
+    current_queries.set(None)
+    current_span.set(None)
+    use_student_bookmarks(student_id)
+    repo: Repository = get_shared_repository()
+
+    try:
+        stored: StoredRecommendation = await _run_in_executor(
+            repo.get_stored_recommendations, student_id
+        )
+        if stored is not None:
+            await refresh_recommendations(student_id, stored.generation, repo)
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Failed to refresh recommendations of %s", student_id)
+
+
+def _check_batch_size(student_ids: dict[str, None], max_students: int):
+    """Rejects a batch selecting more than max_students students."""
+    if max_students is not None and len(student_ids) > max_students:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can select at most {max_students} students",
+        )
+
+
+async def _batch_recommendation(student_id: str, repo: Repository) -> BatchRecommendation:
+    """Retrieves or recomputes the recommendations of a student of a batch."""
+    use_student_bookmarks(student_id)
+
+    try:
+        stored: StoredRecommendation = await _run_in_executor(
+            repo.get_stored_recommendations, student_id
+        )
+
+        if stored is None:
+            return BatchRecommendation(student_id=student_id, error="Student not found")
+
+        if stored.computed_at is not None and stored.stale_since is None:
+            rec_store_hits.inc()
+            recommendation: Recommendation = stored.recommendation
+        else:
+            rec_store_misses.inc()
+            recommendation = await refresh_recommendations(
+                student_id, stored.generation, repo
+            )
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        logger.exception("Batch recommendations failed for student %s", student_id)
+        return BatchRecommendation(student_id=student_id, error=str(exc))
+
+    return BatchRecommendation(student_id=student_id, recommendation=recommendation)
+
+
+async def _run_in_executor(func: Callable, *args) -> any:
+    """Runs a blocking db call on the recommendation query executor, in a copy
+    of the caller's context."""
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(
+        rec_query_executor, contextvars.copy_context().run, func, *args
+    )
+
+
+def _in_process_cb_recs_that_fulfil_prereq(  # pylint: disable=unused-argument
+    profile: StudentRecProfile,
+    params: RecommendationParams,
+    student_id: str,
+    repo: Repository,
+) -> list[Module]:
+    """In-process counterpart of Repository.get_cb_recs_that_fulfil_prereq."""
+    return get_cb_recommender(repo).recommend_fulfilling_prereqs(
+        profile.course_codes, params.k, params.max_similarity
+    )
+
+
+def _in_process_cb_recs_that_have_no_prereq(  # pylint: disable=unused-argument
+    profile: StudentRecProfile,
+    params: RecommendationParams,
+    student_id: str,
+    repo: Repository,
+) -> list[Module]:
+    """In-process counterpart of Repository.get_cb_recs_that_have_no_prereq."""
+    return get_cb_recommender(repo).recommend_without_prereqs(
+        profile.course_codes, profile.disciplines, params.k, params.max_similarity
+    )
+
+
+def _in_process_cf_recs_that_fulfill_prereq(
+    params: RecommendationParams, student_id: str, repo: Repository
+) -> list[Module]:
+    """In-process counterpart of Repository.get_cf_recs_that_fulfill_prereq."""
+    return get_cf_recommender(repo).recommend_fulfilling_prereqs(
+        student_id, params.k, params.number_of_neighbours
+    )
+
+
+def _in_process_cf_recs_that_have_no_prereq(
+    params: RecommendationParams, student_id: str, repo: Repository
+) -> list[Module]:
+    """In-process counterpart of Repository.get_cf_recs_that_have_no_prereq."""
+    return get_cf_recommender(repo).recommend_without_prereqs(
+        student_id, params.k, params.number_of_neighbours
+    )
@@ -5,26 +5,28 @@ from collections import deque
 from typing import Annotated
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from neo4j import Driver
 from jose import JWTError, jwt
 
 from .. import config
 from ..models.student import Student
 from ..models.module import Module
-from ..database import module_db, student_db
+from ..database.bookmarks import use_student_bookmarks
+from ..database.repository import Repository
+from ..tracing import traced
+from . import rec as rec_service
 
 ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-settings = config.Settings()
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Could not validate credentials",
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+@traced()
 async def get_student(
-    student_id: str, driver: Driver, token: Annotated[str, Depends(oauth2_scheme)]
+    student_id: str, repo: Repository, token: Annotated[str, Depends(oauth2_scheme)]
 ) -> Student:
     """Retrieve a student's information from the db.
 
@@ -35,8 +37,8 @@ async def get_student(
     Args:
       student_id:
         The id of the student whose information we want to retrieve.
-      driver:
-        An open instance of the neo4j.Driver.
+      repo:
+        The repository to read from.
       token:
         JWT access token.
 
@@ -47,14 +49,17 @@ async def get_student(
     username: str = ""
 
     try:
-        payload: dict[str, any] = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
+        payload: dict[str, any] = jwt.decode(
+            token, config.get_settings().secret_key, algorithms=[ALGORITHM]
+        )
         username = payload.get("user_id")
         if username is None or username != student_id:
             raise credentials_exception
     except JWTError as exc:
         raise credentials_exception from exc
 
-    student: Student = student_db.get_student(username, driver)
+    use_student_bookmarks(username)
+    student: Student = repo.get_student(username)
 
     if student is None:
         raise credentials_exception
@@ -62,8 +67,9 @@ async def get_student(
     return student
 
 
+@traced()
 async def update_student_details(
-    student_update: Student, driver: Driver, token: Annotated[str, Depends(oauth2_scheme)]
+    student_update: Student, repo: Repository, token: Annotated[str, Depends(oauth2_scheme)]
 ) -> Student:
     """Updates the details of the student in the db.
 
@@ -73,8 +79,8 @@ async def update_student_details(
     Args:
       student_update:
         A StudentBase model containing the information used to update the student's details.
-      driver:
-        An open instance of the neo4j.Driver.
+      repo:
+        The repository to read from and write to.
       token:
         JWT access token.
 
@@ -84,20 +90,24 @@ async def update_student_details(
     username: str = ""
 
     try:
-        payload: dict[str, any] = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
+        payload: dict[str, any] = jwt.decode(
+            token, config.get_settings().secret_key, algorithms=[ALGORITHM]
+        )
         username = payload.get("user_id")
         if username is None or username != student_update.student_id:
             raise credentials_exception
     except JWTError as exc:
         raise credentials_exception from exc
-    cur_student: Student = student_db.get_student(username, driver)
+
+    use_student_bookmarks(username)
+    cur_student: Student = repo.get_student(username)
 
     if cur_student is None:
         raise credentials_exception
 
     updated_modules_course_codes: list[str] = student_update.course_codes
-    updated_modules: list[Module] = module_db.get_modules_based_on_course_codes(
-        updated_modules_course_codes, driver)
+    updated_modules: list[Module] = repo.get_modules_based_on_course_codes(
+        updated_modules_course_codes)
 
     if len(updated_modules_course_codes) != len(updated_modules):
         raise HTTPException(
@@ -106,7 +116,7 @@ async def update_student_details(
         )
 
     course_codes_of_eligible_modules: list[str] = check_prerequisites_fulfillment(
-        updated_modules, driver)
+        updated_modules, repo)
 
     if len(course_codes_of_eligible_modules) != len(updated_modules_course_codes):
         raise HTTPException(
@@ -114,16 +124,24 @@ async def update_student_details(
             detail="Prerequisites have not been fulfilled for some of the modules."
         )
 
-    updated_student: Student = student_db.update_student(student_update, driver)
+    updated_student: Student = repo.update_student(student_update)
+    rec_service.update_in_process_recommenders(
+        updated_student.student_id, disciplines=updated_student.disciplines
+    )
 
     updated_modules_course_codes = update_student_modules(
-        student_update.student_id, student_update.course_codes, driver
+        student_update.student_id,
+        student_update.course_codes,
+        repo,
+        updated_student,
+        cur_student,
     )
     updated_student.course_codes = updated_modules_course_codes
 
     return updated_student
 
-def search_for_modules(modules: list[str], driver: Driver) -> list[str]:
+@traced()
+def search_for_modules(modules: list[str], repo: Repository) -> list[str]:
     """Checks whether a list of modules exist in the db.
 
     Checks whether a list of modules exist in the db by searching for their
@@ -133,47 +151,85 @@ def search_for_modules(modules: list[str], driver: Driver) -> list[str]:
       modules:
         A list of strings containing the course codes of the modules to be
         checked.
-      driver:
-        An open instance of a neo4j.Driver.
+      repo:
+        The repository to read from.
 
     Returns:
       A list of strings containing the course codes of modules that exist in
       the db.
     """
 
-    return module_db.search_for_modules(modules, driver)
+    return repo.search_for_modules(modules)
 
 
-def check_modules_existence(modules: list[str], driver: Driver) -> bool:
+@traced()
+def check_modules_existence(modules: list[str], repo: Repository) -> bool:
     """Function to check whether the list of modules exist in the db"""
-    retrieved_modules: list[str] = module_db.search_for_modules(modules, driver)
+    retrieved_modules: list[str] = repo.search_for_modules(modules)
 
     return len(retrieved_modules) == len(modules)
 
 
-def update_student_modules(student_id: str, modules: list[str], driver: Driver) -> list[str]:
-    """Function to update the modules of a student"""
+@traced()
+def update_student_modules(
+    student_id: str,
+    modules: list[str],
+    repo: Repository,
+    student: Student = None,
+    previous_student: Student = None,
+) -> list[str]:
+    """Function to update the modules of a student
+
+    The student's disciplines and year of study, if given, are used to keep
+    the module popularity counters up to date. If the student before the
+    update is given too and their disciplines or year of study changed, the
+    modules they keep are moved to the counters of the new ones.
+    """
 
-    if check_modules_existence(modules, driver) is False:
+    if check_modules_existence(modules, repo) is False:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Some of the course codes entered are invalid!",
         )
 
-    current_modules: list[Module] = student_db.get_modules_currently_taken(student_id, driver)
+    current_modules: list[Module] = repo.get_modules_currently_taken(student_id)
     current_modules_set: set[str] = set(current_module.course_code
                                         for current_module in current_modules)
     new_modules_set: set[str] = set(modules)
     modules_to_be_removed: list[str] = list(current_modules_set.difference(new_modules_set))
     modules_to_be_added: list[str] = list(new_modules_set.difference(current_modules_set))
 
-    student_db.remove_modules(student_id, modules_to_be_removed, driver)
-    student_db.add_modules(student_id, modules_to_be_added, driver)
+    repo.remove_modules(student_id, modules_to_be_removed)
+    repo.add_modules(student_id, modules_to_be_added)
+
+    if modules_to_be_removed or modules_to_be_added:
+        rec_service.invalidate_recommendations(student_id, repo)
+        rec_service.update_in_process_recommenders(student_id, course_codes=modules)
+
+    cohort_changed: bool = (
+        student is not None
+        and previous_student is not None
+        and (
+            set(student.disciplines or []) != set(previous_student.disciplines or [])
+            or student.year_of_study != previous_student.year_of_study
+        )
+    )
+
+    if student is not None and (modules_to_be_removed or modules_to_be_added or cohort_changed):
+        rec_service.record_module_changes(
+            student.disciplines,
+            student.year_of_study,
+            modules_to_be_added,
+            modules_to_be_removed,
+            previous_student,
+            list(current_modules_set.intersection(new_modules_set)),
+        )
 
     return modules
 
 
-def check_prerequisites_fulfillment(modules: list[Module], driver: Driver) -> list[str]: # pylint: disable=too-many-locals
+@traced()
+def check_prerequisites_fulfillment(modules: list[Module], repo: Repository) -> list[str]: # pylint: disable=too-many-locals
     """Checks whether the list of modules fulfil their prerequisites.
 
     Checks whether the list of modules fulfil their prerequisites that is to
@@ -199,8 +255,8 @@ def check_prerequisites_fulfillment(modules: list[Module], driver: Driver) -> li
 
         if prereq_groups is not None and prereq_groups:
             for prerequisite_group in prereq_groups:
-                prereq_modules: list[Module] = module_db.get_modules_based_on_course_codes(
-                    prerequisite_group, driver)
+                prereq_modules: list[Module] = repo.get_modules_based_on_course_codes(
+                    prerequisite_group)
 
                 for prereq_module in prereq_modules:
                     if prereq_module.course_code not in out_degree:
@@ -215,7 +271,7 @@ def check_prerequisites_fulfillment(modules: list[Module], driver: Driver) -> li
     course_codes_of_eligible_modules: list[str] = []
     queue: deque[str] = deque()
 
-    for course_code in in_degree.items():
+    for course_code in in_degree:
         if in_degree[course_code] is None or len(in_degree[course_code]) == 0:
             queue.append(course_code)
 
@@ -223,7 +279,7 @@ def check_prerequisites_fulfillment(modules: list[Module], driver: Driver) -> li
         cur_course_code: str = queue.popleft()
         course_codes_of_eligible_modules.append(cur_course_code)
 
-        next_modules: list[str] = out_degree[cur_course_code]
+        next_modules: list[str] = out_degree.get(cur_course_code)
 
         if next_modules is not None and len(next_modules) > 0:
             for next_module in next_modules:
@@ -0,0 +1,116 @@
+"""
+Warm-up of the app before it takes traffic.
+
+The first requests served by a cold app would otherwise pay for connecting to
+the db, for the db planning each query and for loading the in-process
+indexes. warm_up does all of that once at startup, and the app reports being
+ready only after it has completed.
+"""
+
+import asyncio
+import logging
+import time
+
+from neo4j import READ_ACCESS, WRITE_ACCESS, Driver, RoutingControl
+
+from .. import config
+from ..database.instrumentation import QUERY_NAMES, WRITE_CLAUSES
+from ..dependencies import (
+    get_catalog_file,
+    get_memory_repository,
+    get_shared_driver,
+    get_shared_repository,
+)
+from . import auth as auth_service
+from . import rec as rec_service
+
+logger = logging.getLogger(__name__)
+ready: asyncio.Event = asyncio.Event()
+
+
+async def warm_up():
+    """Warms up the app and marks it ready, retrying until it succeeds."""
+    while True:
+        start: float = time.perf_counter()
+
+        try:
+            await asyncio.to_thread(warm_up_once)
+        except Exception:  # pylint: disable=broad-exception-caught
+            retry_seconds: float = config.get_settings().warmup_retry_seconds
+            logger.exception("Warm-up failed, retrying in %gs", retry_seconds)
+            await asyncio.sleep(retry_seconds)
+            continue
+
+        ready.set()
+        logger.info("Warm-up completed in %.0fms", (time.perf_counter() - start) * 1000)
+        return
+
+
+def warm_up_once():
+    """Opens the db connections, primes the query plans, maps the catalog and
+    loads the in-process indexes."""
+    settings: config.Settings = config.get_settings()
+
+    auth_service.get_pwd_context()
+    auth_service.get_bcrypt_executor()
+
+    if settings.catalog_file:
+        get_catalog_file()
+
+    if settings.repository_backend == "memory":
+        get_memory_repository()
+    else:
+        driver: Driver = get_shared_driver()
+        driver.verify_connectivity()
+        open_connections(driver, settings.warmup_connections)
+        prime_query_plans(driver)
+
+    if settings.recommender_backend == "in_process":
+        repo = get_shared_repository()
+        rec_service.get_cb_recommender(repo)
+        rec_service.get_cf_recommender(repo)
+
+
+def open_connections(driver: Driver, count: int):
+    """Fills the connection pool of a driver with a number of connections to
+    the readers and as many to the writer.
+
+    Each open transaction holds a connection, so the transactions are all
+    opened before any is closed to make the pool open distinct connections.
+    """
+    sessions: list = []
+
+    try:
+        for access_mode in (READ_ACCESS, WRITE_ACCESS):
+            for _ in range(count):
+                session = driver.session(database="neo4j", default_access_mode=access_mode)
+                sessions.append(session)
+                transaction = session.begin_transaction()
+                transaction.run("RETURN 1").consume()
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def prime_query_plans(driver: Driver):
+    """Has the db plan each query of the queries package.
+
+    The queries are run with EXPLAIN, which plans them, caching the plans for
+    the requests to come, without running them. Queries that fail to plan are
+    logged and skipped. The queries are run on the wrapped driver, if any, so
+    that they are not recorded as app queries. Each query is planned where it
+    is routed, on a reader unless it writes.
+    """
+    raw_driver: Driver = getattr(driver, "driver", driver)
+
+    for query, name in list(QUERY_NAMES.items()):
+        routing: RoutingControl = (
+            RoutingControl.WRITE if WRITE_CLAUSES.search(query) else RoutingControl.READ
+        )
+
+        try:
+            raw_driver.execute_query(
+                f"EXPLAIN {query}", routing_=routing, database_="neo4j"
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.warning("Cannot plan query %s", name, exc_info=True)
@@ -0,0 +1,302 @@
+"""
+Tracing of the requests through the routers, services and db.
+
+A span records a named, timed operation, such as a service call or a single
+Cypher query. Spans are nested through a contextvar: a span started while
+another is current becomes its child, including in worker threads that run
+in a copy of the context, so the recommendation sub-queries show up as
+parallel children of the request that ran them.
+
+Finished spans are handed to the exporter installed with set_exporter. The app
+installs the one picked by the tracing_exporter setting: "memory" keeps the
+latest spans in memory, "file" appends them as JSON lines to the tracing_file
+setting, and anything else disables tracing. When tracing is disabled,
+starting a span costs a single check.
+"""
+
+import collections
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import random
+import re
+import threading
+import time
+from typing import Callable, Iterator, Protocol
+
+from . import config
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:  # pylint: disable=too-many-instance-attributes
+    """A timed operation of a trace.
+
+    Attributes:
+      name:
+        The name of the operation.
+      trace_id:
+        The id of the trace the span belongs to, as 32 hex digits.
+      span_id:
+        The id of the span, as 16 hex digits.
+      parent_id:
+        The id of the parent span. None for the root span of a trace.
+      start_time:
+        The time the span started, in seconds since the epoch.
+      duration:
+        The time taken by the operation in milliseconds. None until it ends.
+      attributes:
+        Details of the operation, such as the name of a query.
+      status:
+        "ok", or "error" if the operation raised.
+      thread:
+        The name of the thread the operation ran on.
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_time",
+        "duration",
+        "attributes",
+        "status",
+        "thread",
+        "_start",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str = None,
+        attributes: dict[str, any] = None,
+    ):
+        self.name: str = name
+        self.trace_id: str = trace_id
+        self.span_id: str = f"{random.getrandbits(64):016x}"
+        self.parent_id: str = parent_id
+        self.start_time: float = time.time()
+        self.duration: float = None
+        self.attributes: dict[str, any] = dict(attributes or {})
+        self.status: str = "ok"
+        self.thread: str = threading.current_thread().name
+        self._start: float = time.perf_counter()
+
+    def set_attribute(self, key: str, value: any):
+        """Records a detail of the operation."""
+        self.attributes[key] = value
+
+    def end(self):
+        """Marks the operation as finished."""
+        self.duration = (time.perf_counter() - self._start) * 1000
+
+    def traceparent(self) -> str:
+        """Returns the W3C traceparent header value identifying the span."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict[str, any]:
+        """Returns the span as a JSON serialisable dict."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration,
+            "attributes": self.attributes,
+            "status": self.status,
+            "thread": self.thread,
+        }
+
+
+class SpanExporter(Protocol):  # pylint: disable=too-few-public-methods
+    """Receives the spans as they finish."""
+
+    def export(self, span: Span):
+        """Exports a finished span."""
+
+
+class InMemoryExporter:
+    """Keeps the latest finished spans in memory.
+
+    Attributes:
+      spans:
+        The finished spans, oldest first.
+    """
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: collections.deque[Span] = collections.deque(maxlen=max_spans)
+
+    def export(self, span: Span):
+        """Keeps a finished span, dropping the oldest one if full."""
+        self.spans.append(span)
+
+    def get_trace(self, trace_id: str) -> list[Span]:
+        """Returns the spans of a trace in the order they started."""
+        return sorted(
+            (span for span in list(self.spans) if span.trace_id == trace_id),
+            key=lambda span: span.start_time,
+        )
+
+    def clear(self):
+        """Drops every span."""
+        self.spans.clear()
+
+
+class FileExporter:  # pylint: disable=too-few-public-methods
+    """Appends the finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.lock: threading.Lock = threading.Lock()
+
+    def export(self, span: Span):
+        """Appends a finished span to the file."""
+        line: str = json.dumps(span.to_dict(), default=str)
+
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as span_file:
+                span_file.write(line + "\n")
+
+
+current_span: contextvars.ContextVar[Span] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def exporter_from_settings() -> SpanExporter:
+    """Creates the exporter picked by the tracing_exporter setting."""
+    settings = config.get_settings()
+
+    if settings.tracing_exporter == "memory":
+        return InMemoryExporter(settings.tracing_memory_spans)
+    if settings.tracing_exporter == "file":
+        return FileExporter(settings.tracing_file)
+
+    return None
+
+
+exporter: SpanExporter = None
+
+
+def set_exporter(new_exporter: SpanExporter):
+    """Installs the exporter of the finished spans. None disables tracing."""
+    global exporter  # pylint: disable=global-statement
+    exporter = new_exporter
+
+
+def get_exporter() -> SpanExporter:
+    """Returns the exporter of the finished spans, None if tracing is disabled."""
+    return exporter
+
+
+@contextlib.contextmanager
+def span(
+    name: str,
+    attributes: dict[str, any] = None,
+    traceparent: str = None,
+) -> Iterator[Span]:
+    """Times the operation run in the with block as a span.
+
+    The span is a child of the current span, or the root of a new trace.
+
+    Args:
+      name:
+        The name of the operation.
+      attributes:
+        Details of the operation.
+      traceparent:
+        A W3C traceparent header value. If valid and there is no current span,
+        the span continues the trace of the caller.
+
+    Yields:
+      The span, or None if tracing is disabled.
+    """
+    if exporter is None:
+        yield None
+        return
+
+    parent: Span = current_span.get()
+
+    if parent is not None:
+        new_span: Span = Span(name, parent.trace_id, parent.span_id, attributes)
+    else:
+        match = TRACEPARENT.match(traceparent or "")
+        new_span = (
+            Span(name, match.group(1), match.group(2), attributes)
+            if match
+            else Span(name, f"{random.getrandbits(128):032x}", None, attributes)
+        )
+
+    token = current_span.set(new_span)
+
+    try:
+        yield new_span
+    except BaseException as exc:
+        new_span.status = "error"
+        new_span.set_attribute("error", repr(exc))
+        raise
+    finally:
+        new_span.end()
+        current_span.reset(token)
+        exporter.export(new_span)
+
+
+def traced(name: str = None) -> Callable[[Callable], Callable]:
+    """Decorates a function, sync or async, to run each call in a span.
+
+    Args:
+      name:
+        The name of the spans. Defaults to the module and name of the
+        function, such as "services.student.get_student".
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name: str = name or (
+            f"{func.__module__.split('.', 1)[-1]}.{func.__qualname__}"
+        )
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if exporter is None:
+                    return await func(*args, **kwargs)
+
+                with span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if exporter is None:
+                return func(*args, **kwargs)
+
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_methods(prefix: str) -> Callable[[type], type]:
+    """Decorates a class so that each call of its public methods runs in a span.
+
+    The spans are named after the prefix and the method, such as
+    "repository.get_student".
+    """
+
+    def decorator(cls: type) -> type:
+        for attribute, value in list(vars(cls).items()):
+            if not attribute.startswith("_") and inspect.isfunction(value):
+                setattr(cls, attribute, traced(f"{prefix}.{attribute}")(value))
+
+        return cls
+
+    return decorator
@@ -0,0 +1,199 @@
+"""
+Checks the catalog delta sync and measures its payload against a full download.
+
+A synthetic catalog is built as a versioned catalog file, then rebuilt a few
+times with modules renamed, added and removed, and with prerequisite groups
+and mutually exclusives changed. A client copy of each version, patched with
+the changes GET /modules/changes returns since that version, must match the
+latest catalog, while changes the log no longer holds must ask for a full
+resync. The sizes of the changes and of the full catalog are reported.
+
+Usage:
+  python -m benchmarks.catalog_changes [--modules 1000] [--changes 10]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+from app.database.catalog_changes import write_versioned_catalog
+from app.models.module import Module
+from tests.seeding import configure_app
+from tests.synthetic import generate_modules
+
+
+def synthetic_catalog(size: int) -> dict[str, Module]:
+    """Generates a catalog of modules, keyed by course code."""
+    modules: dict[str, Module] = {}
+
+    for module in generate_modules(size, prerequisite_rate=0.5):
+        modules[module["course_code"]] = Module(
+            **{
+                **{name: module[name] for name in Module.model_fields if name in module},
+                "prerequisites": [module["prerequisites"]] if module["prerequisites"] else [],
+            }
+        )
+
+    return modules
+
+
+def edit(catalog: dict[str, Module], step: int, changes: int) -> dict[str, Module]:
+    """Returns a copy of a catalog with some of each kind of change."""
+    edited: dict[str, Module] = dict(catalog)
+    course_codes: list[str] = sorted(edited)
+    offset: int = step * changes * 4
+
+    for i in range(changes):
+        renamed, regrouped, excluded, removed = course_codes[offset + i :: changes][:4]
+        edited[renamed] = edited[renamed].model_copy(
+            update={"course_name": f"{edited[renamed].course_name} ({step})"}
+        )
+        edited[regrouped] = edited[regrouped].model_copy(
+            update={"prerequisites": [*edited[regrouped].prerequisites, [course_codes[0]]]}
+        )
+        edited[excluded] = edited[excluded].model_copy(
+            update={"mutually_exclusives": [course_codes[1]]}
+        )
+        del edited[removed]
+
+        added: str = f"N{step:02d}{i:03d}"
+        edited[added] = edited[renamed].model_copy(
+            update={
+                "course_code": added,
+                "course_name": f"New module {added}",
+                "prerequisites": [[renamed]],
+                "mutually_exclusives": [],
+            }
+        )
+
+    return edited
+
+
+def apply(copy: dict[str, Module], changes: dict[str, any]) -> dict[str, Module]:
+    """Patches a client copy of the catalog with the changes of the endpoint."""
+    patched: dict[str, Module] = dict(copy)
+
+    for course_code in changes["removed"]:
+        patched.pop(course_code, None)
+
+    for module in changes["modules"]:
+        previous: Module = patched.get(module["course_code"])
+        patched[module["course_code"]] = Module(
+            **{
+                **module,
+                "prerequisites": [] if previous is None else previous.prerequisites,
+                "mutually_exclusives": [] if previous is None else previous.mutually_exclusives,
+            }
+        )
+
+    for course_code, groups in changes["prerequisites"].items():
+        patched[course_code] = patched[course_code].model_copy(
+            update={"prerequisites": groups}
+        )
+
+    for course_code, exclusives in changes["mutually_exclusives"].items():
+        patched[course_code] = patched[course_code].model_copy(
+            update={"mutually_exclusives": exclusives}
+        )
+
+    return patched
+
+
+def comparable(catalog: dict[str, Module]) -> dict[str, dict[str, any]]:
+    """Returns the modules of a catalog in a form that compares by content."""
+    return {
+        course_code: {
+            **module.model_dump(exclude={"total", "score"}),
+            "prerequisites": sorted(sorted(group) for group in module.prerequisites),
+            "mutually_exclusives": sorted(module.mutually_exclusives),
+        }
+        for course_code, module in catalog.items()
+    }
+
+
+async def check(args: argparse.Namespace, path: str) -> list[str]:
+    """Builds the versions of the catalog and checks the changes between them.
+
+    Returns:
+      The failures.
+    """
+    # pylint: disable=import-outside-toplevel
+    import httpx
+
+    from app.main import app
+
+    failures: list[str] = []
+    catalogs: list[dict[str, Module]] = [synthetic_catalog(args.modules)]
+    versions: list[int] = [write_versioned_catalog(path, list(catalogs[0].values()))]
+
+    for step in range(3):
+        catalogs.append(edit(catalogs[-1], step, args.changes))
+        versions.append(write_versioned_catalog(path, list(catalogs[-1].values())))
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+    ) as client:
+        full = await client.get("/modules/", params={"limit": len(catalogs[-1])})
+        print(f"Full catalog: {len(full.content)} bytes")
+
+        for copy, version in zip(catalogs, versions):
+            response = await client.get("/modules/changes", params={"since": version})
+            changes: dict[str, any] = response.json()
+            print(f"Changes since version {version}: {len(response.content)} bytes")
+
+            if changes["full_resync"] or changes["version"] != versions[-1]:
+                failures.append(f"The changes since version {version} were not returned")
+            elif comparable(apply(copy, changes)) != comparable(catalogs[-1]):
+                failures.append(f"The changes since version {version} do not patch the copy")
+
+        for since in (versions[0] - 1, versions[-1] + 1):
+            response = await client.get("/modules/changes", params={"since": since})
+            if not response.json()["full_resync"]:
+                failures.append(f"The changes since unknown version {since} did not resync")
+
+        # Each edit makes 7 changes per change asked for, so the log only
+        # keeps the latest version.
+        catalogs.append(edit(catalogs[-1], 3, args.changes))
+        versions.append(
+            write_versioned_catalog(path, list(catalogs[-1].values()), args.changes * 7)
+        )
+
+        for since, resync in ((versions[-3], True), (versions[-2], False)):
+            response = await client.get("/modules/changes", params={"since": since})
+            if response.json()["full_resync"] != resync:
+                failures.append(
+                    f"The changes since version {since} of a truncated log "
+                    f"{'did not resync' if resync else 'resynced'}"
+                )
+
+    return failures
+
+
+def main():
+    """Entry point of the check."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", type=int, default=1000)
+    parser.add_argument("--changes", type=int, default=10)
+    args = parser.parse_args()
+
+    configure_app()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path: str = os.path.join(directory, "catalog.bin")
+        os.environ["CATALOG_FILE"] = path
+        os.environ["CATALOG_CHECK_INTERVAL_SECONDS"] = "0"
+        failures: list[str] = asyncio.run(check(args, path))
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    if failures:
+        sys.exit(1)
+
+    print("Every version patched with its changes matches the latest catalog")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compares the in-process content-based recommender against the Cypher path.
+
+For a sample of students, both content-based sub-queries are run in the db and
+in-process. The results are checked for agreement and the latencies of both
+paths are reported.
+
+Usage:
+  python -m benchmarks.cb_recommender [--students 100] [--repeat 5]
+"""
+
+import argparse
+import time
+
+from neo4j import GraphDatabase
+
+from app import config
+from app.database import rec_db, student_db
+from app.database.repository import Neo4jRepository
+from app.recommenders.content_based import load_content_based_recommender
+from benchmarks.stats import percentiles
+
+
+def agrees(cypher_recs: list, in_process_recs: list) -> bool:
+    """Checks that every Cypher recommendation is an in-process candidate.
+
+    The Cypher queries may return a module more than once and the fulfilling
+    prerequisites query is unordered, so only membership and scores are
+    compared against the full list of in-process candidates.
+    """
+    candidates: dict[str, float] = {
+        module.course_code: module.score for module in in_process_recs
+    }
+
+    return all(
+        module.course_code in candidates
+        and module.score <= candidates[module.course_code]
+        for module in cypher_recs
+    )
+
+
+def main():  # pylint: disable=too-many-locals
+    """Entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    settings = config.get_settings()
+
+    with GraphDatabase.driver(
+        settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+    ) as driver:
+        start: float = time.perf_counter()
+        recommender = load_content_based_recommender(Neo4jRepository(driver))
+        print(
+            f"Loaded {len(recommender.course_codes)} modules and "
+            f"{len(recommender.indices)} similar edges "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+        student_ids: list[str] = student_db.get_all_student_ids(driver)[: args.students]
+        cypher_latencies: list[float] = []
+        in_process_latencies: list[float] = []
+        disagreements: int = 0
+
+        for student_id in student_ids:
+            profile = rec_db.get_student_rec_profile(student_id, driver)
+            course_codes, disciplines = profile.course_codes, profile.disciplines
+
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                cypher_with_prereq = rec_db.get_cb_recs_that_fulfil_prereq(student_id, driver)
+                cypher_no_prereq = rec_db.get_cb_recs_that_have_no_prereq(student_id, driver)
+                cypher_latencies.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                recommender.recommend_fulfilling_prereqs(course_codes)
+                recommender.recommend_without_prereqs(course_codes, disciplines)
+                in_process_latencies.append(time.perf_counter() - start)
+
+            all_with_prereq = recommender.recommend_fulfilling_prereqs(course_codes, k=None)
+            all_no_prereq = recommender.recommend_without_prereqs(
+                course_codes, disciplines, k=None
+            )
+            if not agrees(cypher_with_prereq, all_with_prereq) or not agrees(
+                cypher_no_prereq, all_no_prereq
+            ):
+                disagreements += 1
+                print(f"Results disagree for student {student_id}")
+
+    print(f"Students: {len(student_ids)}, disagreements: {disagreements}")
+    print(f"Cypher:     {percentiles(cypher_latencies)}")
+    print(f"In-process: {percentiles(in_process_latencies)}")
+
+
+if __name__ == "__main__":
+    main()
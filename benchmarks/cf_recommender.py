@@ -0,0 +1,103 @@
+"""
+Compares the in-process collaborative recommender against the Cypher path.
+
+For a sample of students, both collaborative sub-queries are run in the db and
+in-process. The in-process recommender is given the student's SIMILAR_TO_USER
+neighbours so that the candidates must match the Cypher results exactly. The
+overlap between the SIMILAR_TO_USER neighbours and the Jaccard neighbours
+computed from the current modules is reported along with the latencies.
+
+Usage:
+  python -m benchmarks.cf_recommender [--students 100] [--repeat 5]
+"""
+
+import argparse
+import time
+
+from neo4j import GraphDatabase
+
+from app import config
+from app.database import rec_db, student_db
+from app.database.repository import Neo4jRepository
+from app.recommenders.collaborative import (
+    NUMBER_OF_NEIGHBOURS,
+    load_collaborative_recommender,
+)
+from benchmarks.stats import percentiles
+
+
+def main():  # pylint: disable=too-many-locals
+    """Entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    settings = config.get_settings()
+
+    with GraphDatabase.driver(
+        settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+    ) as driver:
+        start: float = time.perf_counter()
+        recommender = load_collaborative_recommender(Neo4jRepository(driver))
+        print(
+            f"Loaded {len(recommender.student_ids)} students and "
+            f"{len(recommender.course_codes)} modules "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+        student_ids: list[str] = student_db.get_all_student_ids(driver)[: args.students]
+        cypher_latencies: list[float] = []
+        in_process_latencies: list[float] = []
+        disagreements: int = 0
+        neighbour_overlap: list[float] = []
+
+        for student_id in student_ids:
+            neighbours: list[str] = [
+                neighbour
+                for neighbour, _ in rec_db.get_similar_students(student_id, driver)
+            ][:NUMBER_OF_NEIGHBOURS]
+
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                cypher_with_prereq = rec_db.get_cf_recs_that_fulfill_prereq(student_id, driver)
+                cypher_no_prereq = rec_db.get_cf_recs_that_have_no_prereq(student_id, driver)
+                cypher_latencies.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                recommender.recommend_fulfilling_prereqs(student_id, k=10)
+                recommender.recommend_without_prereqs(student_id, k=10)
+                in_process_latencies.append(time.perf_counter() - start)
+
+            with_prereq = recommender.recommend_fulfilling_prereqs(
+                student_id, k=10, neighbours=neighbours
+            )
+            no_prereq = recommender.recommend_without_prereqs(
+                student_id, k=10, neighbours=neighbours
+            )
+            if {m.course_code for m in cypher_with_prereq} != {
+                m.course_code for m in with_prereq
+            } or {m.course_code for m in cypher_no_prereq} != {
+                m.course_code for m in no_prereq
+            }:
+                disagreements += 1
+                print(f"Results disagree for student {student_id}")
+
+            if neighbours:
+                fresh: set[str] = {
+                    neighbour for neighbour, _ in recommender.neighbours(student_id)
+                }
+                neighbour_overlap.append(len(fresh.intersection(neighbours)) / len(neighbours))
+
+    print(f"Students: {len(student_ids)}, disagreements: {disagreements}")
+    if neighbour_overlap:
+        print(
+            "Mean overlap of SIMILAR_TO_USER and fresh Jaccard neighbours: "
+            f"{sum(neighbour_overlap) / len(neighbour_overlap):.2%}"
+        )
+    print(f"Cypher:     {percentiles(cypher_latencies)}")
+    print(f"In-process: {percentiles(in_process_latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Checks that identical concurrent catalog requests share one db call.
+
+The app is served by the in-memory backend, slowed down so that the requests
+overlap as they would on a loaded db. For each catalog route, a number of
+identical requests are sent at once and must run a single repository call
+between them, while as many requests for different pages must each run their
+own. The coalescing counters exposed on /metrics are then reported.
+
+Usage:
+  python -m benchmarks.coalescing [--concurrency 50] [--delay-ms 50]
+"""
+
+import argparse
+import asyncio
+import sys
+
+from benchmarks.endpoints import ENDPOINTS
+from tests.fakes import CountingRepository, SlowRepository
+from tests.seeding import configure_app, reset_app, seed
+
+CATALOG_ENDPOINTS = [name for name in ENDPOINTS if name.startswith("GET /modules")]
+
+
+async def concurrent_calls(
+    client, repo: CountingRepository, requests: list[dict[str, any]]
+) -> tuple[int, set[int]]:
+    """Sends requests at once.
+
+    Returns:
+      The number of repository calls they made and their status codes.
+    """
+    before: int = repo.queries
+    responses = await asyncio.gather(*(client.request(**request) for request in requests))
+
+    return repo.queries - before, {response.status_code for response in responses}
+
+
+async def check(args: argparse.Namespace) -> list[str]:
+    """Sends the identical and distinct concurrent requests.
+
+    Returns:
+      The failures.
+    """
+    # pylint: disable=import-outside-toplevel
+    import httpx
+
+    from app.main import app
+
+    seeded, context = seed(
+        10,
+        argparse.Namespace(
+            modules=args.modules, prerequisite_rate=0.3, seed=0, modules_per_student=10
+        ),
+    )
+    repo: CountingRepository = CountingRepository(
+        SlowRepository(seeded, args.delay_ms / 1000)
+    )
+    reset_app(repo)
+    failures: list[str] = []
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://benchmark",
+    ) as client:
+        for name in CATALOG_ENDPOINTS:
+            build = ENDPOINTS[name][0]
+            request: dict[str, any] = build(context)
+            calls, statuses = await concurrent_calls(
+                client, repo, [request] * args.concurrency
+            )
+            print(f"{name}: {args.concurrency} identical requests, {calls} calls")
+
+            if calls != 1 or statuses != {200}:
+                failures.append(
+                    f"{name}: {args.concurrency} identical requests made {calls} calls "
+                    f"with statuses {sorted(statuses)}, expected 1 call"
+                )
+
+        calls, statuses = await concurrent_calls(
+            client,
+            repo,
+            [
+                {"method": "GET", "url": "/modules/", "params": {"skip": skip, "limit": 1}}
+                for skip in range(args.concurrency)
+            ],
+        )
+        print(f"GET /modules/: {args.concurrency} distinct requests, {calls} calls")
+
+        if calls != args.concurrency or statuses != {200}:
+            failures.append(
+                f"GET /modules/: {args.concurrency} distinct requests made {calls} calls "
+                f"with statuses {sorted(statuses)}, expected {args.concurrency}"
+            )
+
+        metrics = await client.get("/metrics")
+        for line in metrics.text.splitlines():
+            if line.startswith("coalesced_calls_total"):
+                print(line)
+
+    return failures
+
+
+def main():
+    """Entry point of the check."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay-ms", type=float, default=50)
+    parser.add_argument("--modules", type=int, default=100)
+    args = parser.parse_args()
+
+    configure_app()
+    failures: list[str] = asyncio.run(check(args))
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
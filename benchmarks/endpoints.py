@@ -0,0 +1,379 @@
+"""
+Benchmarks every API route against a seeded in-memory backend.
+
+For each data size, a synthetic graph is generated and loaded into an
+InMemoryRepository, which the app is configured to use. Every route of the
+routers is then driven through an ASGI client, without any network, and the
+throughput, p50/p95/p99 latency, allocations and repository round-trips per
+request are recorded. Each repository call stands for one db round-trip, so a
+route that issues a query per module shows up as many round-trips per request.
+Some routes are requested by their literal paths, as their path parameters are
+not valid identifiers and are matched verbatim.
+
+The results are compared against a checked-in baseline and the run fails if a
+route regresses past the tolerances: any extra round-trip, or latency or
+allocations growing by more than the given fractions. Pass --update-baseline to
+record the current results as the new baseline instead.
+
+Allocations are the peak memory traced by tracemalloc while serving a request,
+client included, in a separate pass so that tracing does not skew latencies.
+
+Usage:
+  python -m benchmarks.endpoints [--sizes 1000 5000] [--requests 100]
+      [--baseline benchmarks/baselines/endpoints.json] [--update-baseline]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from benchmarks.stats import percentile_values
+from tests.fakes import CountingRepository
+from tests.seeding import ADVISOR_ID, PASSWORD, Context, configure_app, reset_app, seed
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "endpoints.json")
+BATCH_SIZE = 20
+WARMUP_REQUESTS = 5
+ALLOCATION_REQUESTS = 20
+
+
+def read_student(context: Context) -> dict[str, any]:
+    """Builds a GET /students/{student_id} request."""
+    student_id: str = context.student()["student_id"]
+
+    return {
+        "method": "GET",
+        "url": f"/students/{student_id}",
+        "headers": context.auth(student_id),
+    }
+
+
+def update_student(context: Context) -> dict[str, any]:
+    """Builds a PUT /students/ request that keeps the student's modules."""
+    student: dict[str, any] = context.student()
+
+    return {
+        "method": "PUT",
+        "url": "/students/",
+        "headers": context.auth(student["student_id"]),
+        "json": {
+            "student_id": student["student_id"],
+            "email": student["email"],
+            "year_of_study": student["year_of_study"],
+            "disciplines": student["disciplines"],
+            "course_codes": student["course_codes"],
+        },
+    }
+
+
+def register(context: Context) -> dict[str, any]:
+    """Builds a POST /auth/register request for a new student."""
+    context.registered += 1
+    student_id: str = f"R{context.registered:07d}"
+
+    return {
+        "method": "POST",
+        "url": "/auth/register",
+        "json": {
+            "student_id": student_id,
+            "password": PASSWORD,
+            "email": f"{student_id}@example.com",
+        },
+    }
+
+
+def login(context: Context) -> dict[str, any]:
+    """Builds a POST /auth/login request."""
+    return {
+        "method": "POST",
+        "url": "/auth/login",
+        "data": {"username": context.student()["student_id"], "password": PASSWORD},
+    }
+
+
+def recommendations(context: Context) -> dict[str, any]:
+    """Builds a GET /recommendations/{student_id} request."""
+    student_id: str = context.student()["student_id"]
+
+    return {
+        "method": "GET",
+        "url": f"/recommendations/{student_id}",
+        "headers": context.auth(student_id),
+    }
+
+
+def recommendations_with_params(context: Context) -> dict[str, any]:
+    """Builds a GET /recommendations/{student_id} request that bypasses the store."""
+    request: dict[str, any] = recommendations(context)
+    request["params"] = {"k": 5}
+
+    return request
+
+
+def batch_recommendations(context: Context) -> dict[str, any]:
+    """Builds a POST /recommendations/batch request."""
+    return {
+        "method": "POST",
+        "url": "/recommendations/batch",
+        "headers": context.auth(ADVISOR_ID),
+        "json": {
+            "student_ids": [
+                student["student_id"]
+                for student in context.rng.sample(context.students, BATCH_SIZE)
+            ]
+        },
+    }
+
+
+ENDPOINTS: dict[str, tuple[Callable[[Context], dict[str, any]], float]] = {
+    "GET /": (lambda context: {"method": "GET", "url": "/"}, 1),
+    "GET /modules/": (
+        lambda context: {"method": "GET", "url": "/modules/", "params": {"limit": 20}},
+        1,
+    ),
+    "GET /modules/{course-code}": (
+        lambda context: {
+            "method": "GET",
+            "url": "/modules/{course-code}",
+            "params": {"course_code": context.module()["course_code"]},
+        },
+        1,
+    ),
+    "GET /modules/search/{search-term}": (
+        lambda context: {
+            "method": "GET",
+            "url": "/modules/search/{search-term}",
+            "params": {"search_term": context.module()["course_name"]},
+        },
+        1,
+    ),
+    "GET /modules/get/course-codes": (
+        lambda context: {"method": "GET", "url": "/modules/get/course-codes"},
+        1,
+    ),
+    "GET /modules/get/faculties": (
+        lambda context: {"method": "GET", "url": "/modules/get/faculties"},
+        1,
+    ),
+    "GET /modules/faculty/{faculty}": (
+        lambda context: {
+            "method": "GET",
+            "url": f"/modules/faculty/{context.module()['faculty']}",
+        },
+        1,
+    ),
+    "GET /modules/get/number-of-modules": (
+        lambda context: {"method": "GET", "url": "/modules/get/number-of-modules"},
+        1,
+    ),
+    "GET /students/{student_id}": (read_student, 1),
+    "PUT /students/": (update_student, 1),
+    # bcrypt dominates the authentication routes, so fewer requests are made.
+    "POST /auth/register": (register, 0.1),
+    "POST /auth/login": (login, 0.1),
+    "GET /recommendations/{student_id}": (recommendations, 1),
+    "GET /recommendations/{student_id}?k": (recommendations_with_params, 1),
+    "POST /recommendations/batch": (batch_recommendations, 0.2),
+}
+
+
+async def drain_background_work():
+    """Waits for the recommendation refreshes scheduled by a request."""
+    # pylint: disable=import-outside-toplevel
+    from app.services import rec as rec_service
+
+    while rec_service.refreshing_students:
+        await asyncio.gather(*list(rec_service.refreshing_students.values()))
+
+
+async def benchmark_endpoint(  # pylint: disable=too-many-locals
+    client,
+    repo: CountingRepository,
+    context: Context,
+    build: Callable[[Context], dict[str, any]],
+    requests: int,
+) -> dict[str, any]:
+    """Drives a single route and measures it.
+
+    Background work scheduled by a request, such as recomputing stale
+    recommendations, is waited for and counted against the request.
+    """
+    for _ in range(WARMUP_REQUESTS):
+        await client.request(**build(context))
+        await drain_background_work()
+
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    queries_before: int = repo.queries
+    start: float = time.perf_counter()
+
+    for _ in range(requests):
+        request: dict[str, any] = build(context)
+        request_start: float = time.perf_counter()
+        response = await client.request(**request)
+        await response.aread()
+        latencies.append(time.perf_counter() - request_start)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        await drain_background_work()
+
+    elapsed: float = time.perf_counter() - start
+    queries: int = repo.queries - queries_before
+    peaks: list[int] = []
+    tracemalloc.start()
+
+    try:
+        for _ in range(min(requests, ALLOCATION_REQUESTS)):
+            request = build(context)
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            response = await client.request(**request)
+            await response.aread()
+            await drain_background_work()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": requests,
+        "statuses": statuses,
+        "throughput_rps": requests / elapsed,
+        "latency_ms": percentile_values(latencies),
+        "alloc_kib": sum(peaks) / len(peaks) / 1024,
+        "queries_per_request": queries / requests,
+    }
+
+
+async def benchmark_size(
+    size: int, args: argparse.Namespace, endpoints: list[str]
+) -> dict[str, any]:
+    """Seeds a backend of the given size and benchmarks the routes on it."""
+    # pylint: disable=import-outside-toplevel
+    import httpx
+
+    from app.main import app
+
+    seeded, context = seed(size, args)
+    repo: CountingRepository = CountingRepository(seeded)
+    reset_app(repo)
+    results: dict[str, any] = {}
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://benchmark",
+    ) as client:
+        for name in endpoints:
+            build, share = ENDPOINTS[name]
+            results[name] = await benchmark_endpoint(
+                client, repo, context, build, max(1, round(args.requests * share))
+            )
+            print(f"{size} {name}: {json.dumps(results[name])}")
+
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict[str, any]],
+    baseline: dict[str, dict[str, any]],
+    args: argparse.Namespace,
+) -> list[str]:
+    """Compares the results against the baseline.
+
+    Returns:
+      A description of every regression. Routes and sizes missing from the
+      baseline are not compared.
+    """
+    regressions: list[str] = []
+
+    for size, endpoints in results.items():
+        for name, result in endpoints.items():
+            expected: dict[str, any] = baseline.get(size, {}).get(name)
+
+            if expected is None:
+                continue
+
+            def check(metric: str, value: float, limit: float):
+                if value > limit:
+                    regressions.append(
+                        f"{size} {name}: {metric} {value:.2f} exceeds {limit:.2f}"
+                    )
+
+            check(
+                "queries_per_request",
+                result["queries_per_request"],
+                expected["queries_per_request"] + 1e-9,
+            )
+            check(
+                "p50_ms",
+                result["latency_ms"]["p50"],
+                expected["latency_ms"]["p50"] * (1 + args.latency_tolerance),
+            )
+            check(
+                "alloc_kib",
+                result["alloc_kib"],
+                expected["alloc_kib"] * (1 + args.alloc_tolerance),
+            )
+
+            for status_code in result["statuses"]:
+                if status_code not in expected["statuses"]:
+                    regressions.append(f"{size} {name}: new status {status_code}")
+
+    return regressions
+
+
+def main():
+    """Entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--modules", type=int, default=500)
+    parser.add_argument("--modules-per-student", type=int, default=30)
+    parser.add_argument("--prerequisite-rate", type=float, default=0.3)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5)
+    parser.add_argument("--alloc-tolerance", type=float, default=0.25)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    configure_app()
+    results: dict[str, dict[str, any]] = {
+        str(size): asyncio.run(benchmark_size(size, args, args.endpoints))
+        for size in args.sizes
+    }
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"config": vars(args), "results": results}, output, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+            output.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        raise SystemExit(f"No baseline at {args.baseline}, run with --update-baseline")
+
+    with open(args.baseline, encoding="utf-8") as baseline:
+        regressions: list[str] = find_regressions(results, json.load(baseline), args)
+
+    for regression in regressions:
+        print(regression, file=sys.stderr)
+
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regressions against {args.baseline}")
+
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+Evaluates the quality and latency of the recommenders on a synthetic cohort.
+
+A synthetic graph of students, modules, prerequisites and similar edges is
+generated and a fraction of the modules of a sample of students is held out.
+Each recommender is built from the remaining TAKES and asked for the top k
+modules of every sampled student. The precision@k and recall@k against the
+held-out modules are reported along with the p50/p95/p99 latency and, for
+the services/rec path, the number of repository operations per request.
+
+The in-process recommenders are always evaluated. With --memory, the
+services/rec path is evaluated against an InMemoryRepository holding the
+synthetic graph, a baseline that needs no db. With --neo4j, the synthetic graph
+is also loaded into the configured db, which must be empty, and the
+services/rec path is evaluated against it. Either way the configured
+recommender backend is used.
+
+Results are written as JSON so that runs can be compared.
+
+Usage:
+  python -m benchmarks.evaluate_recommenders [--students 5000] [--modules 1000]
+      [--k 10] [--holdout 0.2] [--sample 500] [--output results.json] [--memory] [--neo4j]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Callable
+
+from app.database import rec_db
+from app.database.memory_repository import InMemoryRepository
+from app.models.module import Module
+from app.recommenders.collaborative import CollaborativeRecommender
+from app.recommenders.content_based import ContentBasedRecommender
+from app.recommenders.popularity import PopularityCounters
+from tests.fakes import CountingRepository
+from benchmarks.stats import percentile_values
+from tests.synthetic import (
+    generate_modules,
+    generate_similar_edges,
+    generate_students,
+)
+
+LOAD_BATCH_SIZE = 1000
+
+COUNT_NODES = "MATCH (n) RETURN COUNT(n) AS count"
+
+LOAD_MODULES = "UNWIND $rows AS row CREATE (m:Module) SET m = row"
+
+LOAD_PREREQUISITES = (
+    "UNWIND $rows AS row "
+    "MATCH (m:Module { course_code: row.course_code }) "
+    "CREATE (g:PrerequisiteGroup)-[:ARE_PREREQUISITES]->(m) "
+    "WITH g, row "
+    "UNWIND row.prerequisites AS prerequisite "
+    "MATCH (p:Module { course_code: prerequisite }) "
+    "CREATE (p)-[:INSIDE]->(g)"
+)
+
+LOAD_SIMILAR_EDGES = (
+    "UNWIND $rows AS row "
+    "MATCH (a:Module { course_code: row.source }), (b:Module { course_code: row.target }) "
+    "CREATE (a)-[:SIMILAR { score: row.score }]->(b)"
+)
+
+LOAD_STUDENTS = (
+    "UNWIND $rows AS row "
+    "CREATE (s:Student { student_id: row.student_id, disciplines: row.disciplines, "
+    "year_of_study: row.year_of_study }) "
+    "WITH s, row "
+    "UNWIND row.course_codes AS course_code "
+    "MATCH (m:Module { course_code: course_code }) "
+    "CREATE (s)-[:TAKES]->(m)"
+)
+
+
+class CountingDriver:
+    """Wraps a neo4j.Driver to count the queries it runs."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.queries: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def execute_query(self, *args, **kwargs):
+        """Runs a query on the wrapped driver and counts it."""
+        with self.lock:
+            self.queries += 1
+
+        return self.driver.execute_query(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.driver, name)
+
+
+def hold_out(
+    students: list[dict[str, any]], fraction: float, sample: int, seed: int
+) -> tuple[list[dict[str, any]], dict[str, set[str]]]:
+    """Hides a fraction of the modules of a sample of students.
+
+    Returns:
+      A tuple of the students with their remaining modules and the held-out
+      course codes of each sampled student.
+    """
+    rng: random.Random = random.Random(seed)
+    sampled: set[str] = {
+        student["student_id"]
+        for student in rng.sample(students, min(sample, len(students)))
+        if len(student["course_codes"]) >= 2
+    }
+    training: list[dict[str, any]] = []
+    held_out: dict[str, set[str]] = {}
+
+    for student in students:
+        if student["student_id"] not in sampled:
+            training.append(student)
+            continue
+
+        course_codes: list[str] = list(student["course_codes"])
+        rng.shuffle(course_codes)
+        hidden: int = max(1, round(len(course_codes) * fraction))
+        held_out[student["student_id"]] = set(course_codes[:hidden])
+        training.append({**student, "course_codes": sorted(course_codes[hidden:])})
+
+    return training, held_out
+
+
+def enrollment_counts(students: list[dict[str, any]]) -> list[dict[str, any]]:
+    """Counts enrollments like rec_db.get_enrollment_counts."""
+    counts: dict[tuple[str, tuple[str, ...], int], int] = {}
+
+    for student in students:
+        for course_code in student["course_codes"]:
+            key = (course_code, tuple(student["disciplines"]), student["year_of_study"])
+            counts[key] = counts.get(key, 0) + 1
+
+    return [
+        {
+            "course_code": course_code,
+            "disciplines": list(disciplines),
+            "year_of_study": year_of_study,
+            "count": count,
+        }
+        for (course_code, disciplines, year_of_study), count in counts.items()
+    ]
+
+
+def evaluate(
+    recommend: Callable[[str], dict[str, list[Module]]],
+    held_out: dict[str, set[str]],
+    k: int,
+    count_queries: Callable[[], int] = None,
+) -> dict[str, any]:
+    """Evaluates a recommender on the held-out modules of the sampled students.
+
+    Args:
+      recommend:
+        Returns the named lists of recommended modules of a student.
+      held_out:
+        The held-out course codes of each sampled student.
+      k:
+        The number of recommendations evaluated in each list.
+      count_queries:
+        Returns the number of db queries run so far, None if the recommender
+        runs none.
+
+    Returns:
+      The latency percentiles in milliseconds, the number of queries per
+      request if they are counted and the mean precision@k and recall@k of
+      each list.
+    """
+    latencies: list[float] = []
+    hits: dict[str, list[tuple[float, float]]] = {}
+    queries_before: int = 0 if count_queries is None else count_queries()
+
+    for student_id, hidden in held_out.items():
+        start: float = time.perf_counter()
+        lists: dict[str, list[Module]] = recommend(student_id)
+        latencies.append(time.perf_counter() - start)
+
+        for name, modules in lists.items():
+            found: int = len({module.course_code for module in modules[:k]} & hidden)
+            hits.setdefault(name, []).append((found / k, found / len(hidden)))
+
+    result: dict[str, any] = {
+        "requests": len(held_out),
+        "latency_ms": percentile_values(latencies),
+        "lists": {
+            name: {
+                f"precision_at_{k}": sum(p for p, _ in scores) / len(scores),
+                f"recall_at_{k}": sum(r for _, r in scores) / len(scores),
+            }
+            for name, scores in hits.items()
+        },
+    }
+
+    if count_queries is not None:
+        result["queries_per_request"] = (count_queries() - queries_before) / max(
+            len(held_out), 1
+        )
+
+    return result
+
+
+def in_process_systems(
+    modules: list[dict[str, any]],
+    similar_edges: list[tuple[str, str, float]],
+    students: list[dict[str, any]],
+    k: int,
+) -> dict[str, Callable[[str], dict[str, list[Module]]]]:
+    """Builds the in-process recommenders over the training students."""
+    profiles: dict[str, dict[str, any]] = {
+        student["student_id"]: student for student in students
+    }
+    content_based = ContentBasedRecommender(modules, similar_edges, [])
+    collaborative = CollaborativeRecommender(modules, students)
+    popularity = PopularityCounters(modules, enrollment_counts(students))
+
+    def recommend_content_based(student_id: str) -> dict[str, list[Module]]:
+        profile: dict[str, any] = profiles[student_id]
+        recs: list[Module] = content_based.recommend_without_prereqs(
+            profile["course_codes"], profile["disciplines"], k
+        ) + content_based.recommend_fulfilling_prereqs(profile["course_codes"], k)
+        recs.sort(key=lambda x: x.score, reverse=True)
+
+        return {"content_based": recs}
+
+    def recommend_collaborative(student_id: str) -> dict[str, list[Module]]:
+        return {
+            "collaborative": collaborative.recommend_without_prereqs(student_id, k)
+            + collaborative.recommend_fulfilling_prereqs(student_id, k)
+        }
+
+    def recommend_popular(student_id: str) -> dict[str, list[Module]]:
+        profile: dict[str, any] = profiles[student_id]
+
+        return {
+            "popularity": popularity.recommend(
+                k, profile["disciplines"], profile["year_of_study"], profile["course_codes"]
+            )
+        }
+
+    return {
+        "in_process_content_based": recommend_content_based,
+        "in_process_collaborative": recommend_collaborative,
+        "in_process_popularity": recommend_popular,
+    }
+
+
+def load_graph(  # pylint: disable=too-many-arguments
+    driver,
+    modules: list[dict[str, any]],
+    similar_edges: list[tuple[str, str, float]],
+    students: list[dict[str, any]],
+    neighbours: dict[str, list[tuple[str, float]]],
+):
+    """Loads the synthetic graph into an empty db."""
+    if driver.execute_query(COUNT_NODES, database_="neo4j").records[0]["count"]:
+        raise SystemExit("Refusing to load the synthetic graph into a non-empty db")
+
+    def load(query: str, rows: list[dict[str, any]]):
+        for i in range(0, len(rows), LOAD_BATCH_SIZE):
+            driver.execute_query(query, rows=rows[i : i + LOAD_BATCH_SIZE], database_="neo4j")
+
+    load(
+        LOAD_MODULES,
+        [
+            {key: value for key, value in module.items() if key != "prerequisites"}
+            for module in modules
+        ],
+    )
+    load(LOAD_PREREQUISITES, [module for module in modules if module["prerequisites"]])
+    load(
+        LOAD_SIMILAR_EDGES,
+        [
+            {"source": source, "target": target, "score": score}
+            for source, target, score in similar_edges
+        ],
+    )
+    load(LOAD_STUDENTS, students)
+
+    rows: list[dict[str, any]] = [
+        {
+            "student_id": student_id,
+            "neighbours": [
+                {"student_id": neighbour, "score": score} for neighbour, score in nearest
+            ],
+        }
+        for student_id, nearest in neighbours.items()
+    ]
+    for i in range(0, len(rows), LOAD_BATCH_SIZE):
+        rec_db.write_similar_students(rows[i : i + LOAD_BATCH_SIZE], driver)
+
+
+def build_memory_repository(
+    modules: list[dict[str, any]],
+    similar_edges: list[tuple[str, str, float]],
+    students: list[dict[str, any]],
+    neighbours: dict[str, list[tuple[str, float]]],
+) -> InMemoryRepository:
+    """Builds an in-memory repository holding the synthetic graph."""
+    repo: InMemoryRepository = InMemoryRepository()
+
+    for module in modules:
+        repo.add_module(module)
+        if module["prerequisites"]:
+            repo.add_prerequisite_group(module["course_code"], module["prerequisites"])
+    for source, target, score in similar_edges:
+        repo.add_similar(source, target, score)
+    for student in students:
+        repo.add_student(student)
+
+    repo.write_similar_students(
+        [
+            {
+                "student_id": student_id,
+                "neighbours": [
+                    {"student_id": neighbour, "score": score} for neighbour, score in nearest
+                ],
+            }
+            for student_id, nearest in neighbours.items()
+        ]
+    )
+
+    return repo
+
+
+def evaluate_service(
+    repo,
+    held_out: dict[str, set[str]],
+    k: int,
+    count_queries: Callable[[], int] = None,
+) -> dict[str, any]:
+    """Evaluates services/rec against a repository holding the synthetic graph."""
+    # Imported here as the settings are only required when the service is used.
+    # pylint: disable=import-outside-toplevel
+    from app.models.rec import RecommendationParams
+    from app.services.rec import compute_recommendations
+
+    params = RecommendationParams(k=k)
+    loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+
+    def recommend(student_id: str) -> dict[str, list[Module]]:
+        recs = loop.run_until_complete(
+            compute_recommendations(student_id, repo, params=params)
+        )
+
+        return {
+            "content_based": recs.cbf_recommendations,
+            "collaborative": recs.cf_recommendations,
+        }
+
+    # Warms up the plan cache and loads any in-process recommender.
+    recommend(next(iter(held_out)))
+
+    try:
+        return evaluate(recommend, held_out, k, count_queries)
+    finally:
+        loop.close()
+
+
+def evaluate_neo4j_service(  # pylint: disable=too-many-arguments
+    modules: list[dict[str, any]],
+    similar_edges: list[tuple[str, str, float]],
+    students: list[dict[str, any]],
+    neighbours: dict[str, list[tuple[str, float]]],
+    held_out: dict[str, set[str]],
+    k: int,
+) -> dict[str, any]:
+    """Loads the synthetic graph into the db and evaluates services/rec on it."""
+    # pylint: disable=import-outside-toplevel
+    from neo4j import GraphDatabase
+
+    from app import config
+    from app.database.repository import Neo4jRepository
+
+    settings = config.get_settings()
+
+    with GraphDatabase.driver(
+        settings.neo4j_uri, auth=(settings.neo4j_user, settings.neo4j_password)
+    ) as neo4j_driver:
+        load_graph(neo4j_driver, modules, similar_edges, students, neighbours)
+        driver = CountingDriver(neo4j_driver)
+
+        return evaluate_service(
+            Neo4jRepository(driver), held_out, k, lambda: driver.queries
+        )
+
+
+def main():  # pylint: disable=too-many-locals
+    """Entry point of the evaluation."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--modules", type=int, default=1000)
+    parser.add_argument("--modules-per-student", type=int, default=30)
+    parser.add_argument("--prerequisite-rate", type=float, default=0.3)
+    parser.add_argument("--similar-edges", type=int, default=10)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--sample", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", action="store_true")
+    parser.add_argument("--neo4j", action="store_true")
+    parser.add_argument("--output", default="recommender_evaluation.json")
+    args = parser.parse_args()
+
+    modules = generate_modules(args.modules, args.prerequisite_rate, args.seed)
+    similar_edges = generate_similar_edges(modules, args.similar_edges, args.seed)
+    students, held_out = hold_out(
+        generate_students(args.students, args.modules, args.modules_per_student, seed=args.seed),
+        args.holdout,
+        args.sample,
+        args.seed,
+    )
+
+    results: dict[str, any] = {}
+
+    for name, recommend in in_process_systems(modules, similar_edges, students, args.k).items():
+        results[name] = evaluate(recommend, held_out, args.k)
+
+    if args.memory or args.neo4j:
+        collaborative = CollaborativeRecommender(modules, students)
+        neighbours: dict[str, list[tuple[str, float]]] = {
+            student["student_id"]: collaborative.neighbours(student["student_id"])
+            for student in students
+        }
+
+        if args.memory:
+            repo = CountingRepository(
+                build_memory_repository(modules, similar_edges, students, neighbours)
+            )
+            results["memory_service"] = evaluate_service(
+                repo, held_out, args.k, lambda: repo.queries
+            )
+
+        if args.neo4j:
+            results["service"] = evaluate_neo4j_service(
+                modules, similar_edges, students, neighbours, held_out, args.k
+            )
+
+    report: dict[str, any] = {"config": vars(args), "systems": results}
+
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2)
+
+    for name, result in results.items():
+        print(f"{name}: {json.dumps(result)}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
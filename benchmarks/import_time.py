@@ -0,0 +1,119 @@
+"""
+Measures the time taken to import the app against a budget.
+
+The app is imported in fresh interpreters with -X importtime, and the median
+cumulative import time of app.main is compared against the budget. The
+modules that take the longest to import are reported, as well as whether the
+settings were read during the import, which should be left to the first
+request or the warm-up.
+
+Usage:
+  python -m benchmarks.import_time [--runs 5] [--budget-ms 1000]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from tests.seeding import SETTINGS_ENV
+
+MODULE = "app.main"
+SETTINGS_CHECK = (
+    f"import {MODULE}; from app import config; "
+    "print(config.get_settings.cache_info().currsize)"
+)
+
+
+def import_times(env: dict[str, str]) -> dict[str, tuple[float, float]]:
+    """Imports the app in a fresh interpreter.
+
+    Returns:
+      The self and cumulative import times of each module in milliseconds,
+      keyed by module name.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: dict[str, tuple[float, float]] = {}
+
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+
+    return times
+
+
+def reads_settings_on_import(env: dict[str, str]) -> bool:
+    """Checks whether importing the app reads the settings."""
+    completed = subprocess.run(
+        [sys.executable, "-c", SETTINGS_CHECK],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return completed.stdout.strip() != "0"
+
+
+def main():
+    """Entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    env: dict[str, str] = {**SETTINGS_ENV, **os.environ}
+    runs: list[dict[str, tuple[float, float]]] = [
+        import_times(env) for _ in range(args.runs)
+    ]
+    total: float = statistics.median(run[MODULE][1] for run in runs)
+    last: dict[str, tuple[float, float]] = runs[-1]
+
+    print(f"{MODULE}: {total:.0f}ms (median of {args.runs}), budget {args.budget_ms:.0f}ms")
+    print("Slowest app modules (self):")
+    for name, (self_ms, _) in sorted(
+        ((name, times) for name, times in last.items() if name.startswith("app.")),
+        key=lambda item: item[1][0],
+        reverse=True,
+    )[: args.top]:
+        print(f"  {name}: {self_ms:.1f}ms")
+
+    print("Slowest top-level dependencies (cumulative):")
+    for name, (_, cumulative_ms) in sorted(
+        (
+            (name, times)
+            for name, times in last.items()
+            if "." not in name and name != "app"
+        ),
+        key=lambda item: item[1][1],
+        reverse=True,
+    )[: args.top]:
+        print(f"  {name}: {cumulative_ms:.1f}ms")
+
+    failures: list[str] = []
+
+    if total > args.budget_ms:
+        failures.append(f"Import took {total:.0f}ms, above the budget of {args.budget_ms:.0f}ms")
+    if reads_settings_on_import(env):
+        failures.append("Importing the app reads the settings")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
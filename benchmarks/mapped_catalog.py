@@ -0,0 +1,121 @@
+"""
+Measures the memory a worker needs for the catalog, mapped versus loaded.
+
+For each catalog size, a synthetic catalog is written both as a catalog file
+and as an in-memory repository snapshot. A fresh interpreter then reads every
+module either through the mapped catalog or after loading the snapshot, and
+reports how much its private (RssAnon) and file-backed, shareable (RssFile)
+resident memory grew. The private memory is what every worker pays on its
+own, so it should stay flat for the mapped catalog as the catalog grows.
+
+Linux only, as the memory is read from /proc/self/status.
+
+Usage:
+  python -m benchmarks.mapped_catalog [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.database.catalog import CatalogFile, CatalogRepository, write_catalog
+from app.database.memory_repository import InMemoryRepository
+from tests.synthetic import generate_modules
+
+COURSE_INFO = "Covers the fundamentals of the discipline. " * 10
+
+
+def resident_memory() -> dict[str, int]:
+    """Returns the RssAnon and RssFile of the process in KiB."""
+    memory: dict[str, int] = {}
+
+    with open("/proc/self/status", encoding="utf-8") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            if name in ("RssAnon", "RssFile"):
+                memory[name] = int(value.split()[0])
+
+    return memory
+
+
+def build(size: int, directory: str) -> tuple[str, str]:
+    """Writes a synthetic catalog as a catalog file and as a snapshot.
+
+    Returns:
+      The paths of the catalog file and of the snapshot.
+    """
+    repo: InMemoryRepository = InMemoryRepository()
+
+    for module in generate_modules(size, prerequisite_rate=0.5):
+        repo.add_module({**module, "course_info": COURSE_INFO})
+        if module["prerequisites"]:
+            repo.add_prerequisite_group(module["course_code"], module["prerequisites"])
+
+    catalog_path: str = os.path.join(directory, f"catalog-{size}.bin")
+    snapshot_path: str = os.path.join(directory, f"snapshot-{size}.json")
+    write_catalog(catalog_path, repo.get_modules(0, size))
+
+    with open(snapshot_path, "w", encoding="utf-8") as snapshot:
+        json.dump(repo.snapshot(), snapshot)
+
+    return catalog_path, snapshot_path
+
+
+def measure(mode: str, path: str):
+    """Reads every module of a catalog and prints the memory growth as JSON."""
+    before: dict[str, int] = resident_memory()
+    start: float = time.perf_counter()
+
+    if mode == "mapped":
+        repo = CatalogRepository(None, CatalogFile(path))
+    else:
+        repo = InMemoryRepository.from_file(path)
+
+    loaded: float = time.perf_counter() - start
+
+    for course_code in repo.get_modules_course_codes():
+        repo.get_module(course_code)
+
+    after: dict[str, int] = resident_memory()
+    print(
+        json.dumps(
+            {
+                "load_ms": loaded * 1000,
+                "rss_anon_kib": after["RssAnon"] - before["RssAnon"],
+                "rss_file_kib": after["RssFile"] - before["RssFile"],
+            }
+        )
+    )
+
+
+def main():
+    """Entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        measure(*args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            catalog_path, snapshot_path = build(size, directory)
+
+            for mode, path in (("mapped", catalog_path), ("loaded", snapshot_path)):
+                completed = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.mapped_catalog", "--measure", mode, path],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                print(f"{size} {mode}: {completed.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    main()
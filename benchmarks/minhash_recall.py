@@ -0,0 +1,83 @@
+"""
+Measures the recall and build time of the MinHash LSH index on synthetic cohorts.
+
+For each cohort size, the LSH index and the exact sparse Jaccard recommender
+are built over the same students. The top k neighbours of a sample of students
+are found with both and the recall of the LSH neighbours against the exact
+neighbours is reported along with build and query times.
+
+Usage:
+  python -m benchmarks.minhash_recall [--sizes 1000 5000 20000] [--k 10]
+"""
+
+import argparse
+import time
+
+from app.recommenders.collaborative import CollaborativeRecommender
+from app.recommenders.minhash import NUM_BANDS, NUM_PERMUTATIONS, build_minhash_index
+from benchmarks.stats import percentiles
+from tests.synthetic import generate_modules, generate_students
+
+
+def main():  # pylint: disable=too-many-locals
+    """Entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--modules", type=int, default=2000)
+    parser.add_argument("--modules-per-student", type=int, default=30)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--permutations", type=int, default=NUM_PERMUTATIONS)
+    parser.add_argument("--bands", type=int, default=NUM_BANDS)
+    args = parser.parse_args()
+
+    modules: list[dict[str, any]] = generate_modules(args.modules)
+
+    for size in args.sizes:
+        students = generate_students(size, args.modules, args.modules_per_student)
+
+        start: float = time.perf_counter()
+        index = build_minhash_index(students, args.permutations, args.bands)
+        lsh_build: float = time.perf_counter() - start
+
+        start = time.perf_counter()
+        exact = CollaborativeRecommender(modules, students)
+        exact_build: float = time.perf_counter() - start
+
+        step: int = max(1, size // args.sample)
+        lsh_latencies: list[float] = []
+        exact_latencies: list[float] = []
+        recalls: list[float] = []
+
+        for student in students[::step]:
+            student_id: str = student["student_id"]
+
+            start = time.perf_counter()
+            approximate = index.neighbours(student_id, args.k)
+            lsh_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            expected = exact.neighbours(student_id, args.k)
+            exact_latencies.append(time.perf_counter() - start)
+
+            if expected:
+                # Compare by score so that ties at the k-th place do not count
+                # as misses.
+                threshold: float = expected[-1][1]
+                found: int = sum(1 for _, score in approximate if score >= threshold)
+                recalls.append(min(found, len(expected)) / len(expected))
+
+        print(f"Students: {size}")
+        print(f"  build:  lsh={lsh_build:.2f}s exact={exact_build:.2f}s")
+        print(
+            f"  all-pairs estimate: "
+            f"lsh={lsh_build + sum(lsh_latencies) / len(lsh_latencies) * size:.2f}s "
+            f"exact={exact_build + sum(exact_latencies) / len(exact_latencies) * size:.2f}s"
+        )
+        print(f"  recall@{args.k}: {sum(recalls) / max(len(recalls), 1):.3f}")
+        print(f"  lsh query:   {percentiles(lsh_latencies)}")
+        print(f"  exact query: {percentiles(exact_latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Checks the read/write routing and the bookmarks of the db functions.
+
+The db functions are run against a stand-in for a Neo4j cluster, made of a
+leader and of a read replica that lags behind it, through the app's
+InstrumentedDriver. The stand-in records where each query is routed and the
+bookmarks it carries, without running it.
+
+Every method of the Neo4jRepository is called once, and each query routed to
+the readers must not write, while each query routed to the writer must. Then
+a student adds a module and reads their modules back, which must carry the
+bookmark of the write and make the replica catch up, while the reads of
+another student and the catalog reads must carry no bookmarks. The student's
+next read, served by another worker that was handed the bookmarks token of
+the write, must carry its bookmark too, unlike a read of another student
+handed the same token or a tampered one.
+
+Usage:
+  python -m benchmarks.routing
+"""
+
+import argparse
+import contextvars
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from neo4j import RoutingControl
+
+from tests.fakes import StandInCluster, repository_calls
+from tests.seeding import SETTINGS_ENV
+
+
+def check_routing(cluster: StandInCluster, repo) -> list[str]:
+    """Calls every repository method and checks where its queries went.
+
+    Returns:
+      The failures.
+    """
+    # pylint: disable=import-outside-toplevel
+    from app.database.instrumentation import WRITE_CLAUSES, query_name
+
+    failures: list[str] = []
+
+    for method, call in repository_calls(repo).items():
+        start: int = len(cluster.calls)
+
+        try:
+            call()
+        except Exception:  # pylint: disable=broad-exception-caught
+            # The stand-in returns no records, which some methods do not expect.
+            pass
+
+        if len(cluster.calls) == start:
+            failures.append(f"{method} ran no query")
+
+        for text, routing, _, _ in cluster.calls[start:]:
+            writes: bool = WRITE_CLAUSES.search(text) is not None
+            expected: RoutingControl = RoutingControl.WRITE if writes else RoutingControl.READ
+            print(f"  {method}: {query_name(text)} -> {routing.name}")
+
+            if routing != expected:
+                failures.append(
+                    f"{method} routes {query_name(text)} to {routing.name}, "
+                    f"expected {expected.name}"
+                )
+
+    return failures
+
+
+def check_bookmarks(cluster: StandInCluster, repo) -> list[str]:
+    """Checks that only a student's own reads carry the bookmarks of their
+    writes.
+
+    Returns:
+      The failures.
+    """
+    # pylint: disable=import-outside-toplevel
+    from app.database import bookmarks as bookmarks_module
+    from app.database.bookmarks import (
+        RequestBookmarks,
+        StudentBookmarks,
+        current_request_bookmarks,
+        use_student_bookmarks,
+    )
+
+    failures: list[str] = []
+
+    def last_read() -> tuple[set[str], bool]:
+        _, routing, bookmarks, waited = cluster.calls[-1]
+        assert routing == RoutingControl.READ
+        return bookmarks, waited
+
+    def student_a():
+        use_student_bookmarks("A0000001X")
+        repo.add_modules("A0000001X", ["CS1010"])
+        written: set[str] = {f"standin:{cluster.leader_version}"}
+
+        repo.get_student_courses("A0000001X")
+        bookmarks, waited = last_read()
+        if bookmarks != written or not waited:
+            failures.append(
+                f"The student's read carried {bookmarks or 'no bookmarks'} "
+                f"instead of {written}, or the replica did not catch up"
+            )
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(
+                contextvars.copy_context().run, repo.get_student_courses, "A0000001X"
+            ).result()
+        if last_read()[0] != written:
+            failures.append("The student's read from a worker thread lost the bookmarks")
+
+    def student_b():
+        use_student_bookmarks("B0000002Y")
+        repo.get_student_courses("B0000002Y")
+        if last_read()[0]:
+            failures.append("Another student's read carried bookmarks")
+
+    def anonymous():
+        repo.get_modules_course_codes()
+        if last_read()[0]:
+            failures.append("A catalog read carried bookmarks")
+
+    def student_a_on_other_workers():
+        request: RequestBookmarks = RequestBookmarks()
+        current_request_bookmarks.set(request)
+        use_student_bookmarks("A0000001X")
+        repo.add_modules("A0000001X", ["CS1010"])
+        written: set[str] = {f"standin:{cluster.leader_version}"}
+        token: str = request.response_token()
+
+        for student_id, carried, expected in (
+            ("A0000001X", token, written),
+            ("B0000002Y", token, set()),
+            ("A0000001X", token[:-1] + ("0" if token[-1] != "0" else "1"), set()),
+        ):
+            # Each read is served by a worker that has not seen the write.
+            bookmarks_module.student_bookmarks = StudentBookmarks()
+            worker = contextvars.Context()
+            worker.run(current_request_bookmarks.set, RequestBookmarks(carried))
+            worker.run(use_student_bookmarks, student_id)
+            worker.run(repo.get_student_courses, student_id)
+
+            if last_read()[0] != expected:
+                failures.append(
+                    f"A read of {student_id} on another worker carried "
+                    f"{last_read()[0] or 'no bookmarks'} instead of {expected or 'none'}"
+                )
+
+    for scenario in (student_a, student_b, anonymous, student_a_on_other_workers):
+        contextvars.Context().run(scenario)
+
+    return failures
+
+
+def main():
+    """Entry point of the check."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.parse_args()
+
+    for name, value in SETTINGS_ENV.items():
+        os.environ.setdefault(name, value)
+
+    # pylint: disable=import-outside-toplevel
+    from app.database.instrumentation import InstrumentedDriver
+    from app.database.repository import Neo4jRepository
+
+    cluster: StandInCluster = StandInCluster()
+    repo: Neo4jRepository = Neo4jRepository(InstrumentedDriver(cluster))
+
+    print("Routing:")
+    failures: list[str] = check_routing(cluster, repo)
+    failures += check_bookmarks(cluster, repo)
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+
+    if failures:
+        sys.exit(1)
+
+    print("Reads go to the readers, writes to the writer, and each student reads their own writes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Summary statistics shared by the benchmarks.
+"""
+
+import statistics
+
+
+def percentile_values(samples: list[float]) -> dict[str, float]:
+    """Computes the p50/p95/p99 of latency samples given in seconds, in ms."""
+    if len(samples) < 2:
+        return {"p50": samples[0] * 1000} if samples else {}
+
+    cuts: list[float] = statistics.quantiles(samples, n=100, method="inclusive")
+
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000}
+
+
+def percentiles(samples: list[float]) -> str:
+    """Formats the p50/p95/p99 of latency samples given in seconds."""
+    if not samples:
+        return "no samples"
+
+    return " ".join(
+        f"{name}={value:.2f}ms" for name, value in percentile_values(samples).items()
+    )
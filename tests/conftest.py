@@ -0,0 +1,23 @@
+"""
+Shared setup of the tests.
+
+The tests run the app against a seeded in-memory backend, so no db is
+needed.
+"""
+
+import argparse
+
+import pytest
+
+from tests.seeding import Context, configure_app, seed
+
+configure_app()
+
+
+@pytest.fixture
+def seeded() -> tuple[object, Context]:
+    """Returns a small seeded InMemoryRepository and the context of its data."""
+    return seed(
+        10,
+        argparse.Namespace(modules=50, prerequisite_rate=0.3, seed=0, modules_per_student=10),
+    )
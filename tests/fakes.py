@@ -0,0 +1,208 @@
+"""
+Stand-ins for the repositories and the db driver, for the tests and benchmarks.
+"""
+
+import threading
+import time
+
+from neo4j import EagerResult, GraphDatabase, Query, RoutingControl
+from neo4j.api import BookmarkManager
+
+from app.database.instrumentation import QueryRecord, current_queries
+
+DEFAULT = object()
+
+
+class CountingRepository:
+    """Wraps a repository to count the operations it serves."""
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.queries: int = 0
+        self.lock: threading.Lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.repo, name)
+
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            with self.lock:
+                self.queries += 1
+
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+class SlowRepository:  # pylint: disable=too-few-public-methods
+    """Wraps a repository to delay every operation, as a remote db would."""
+
+    def __init__(self, repo, delay: float):
+        self.repo = repo
+        self.delay: float = delay
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.repo, name)
+
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def delayed(*args, **kwargs):
+            time.sleep(self.delay)
+            return attr(*args, **kwargs)
+
+        return delayed
+
+
+class QueryRecordingRepository:  # pylint: disable=too-few-public-methods
+    """Wraps a repository to record each operation as a query of the request,
+    as the InstrumentedDriver records the queries of the Neo4jRepository."""
+
+    def __init__(self, repo):
+        self.repo = repo
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.repo, name)
+
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def recorded(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            queries = current_queries.get()
+
+            if queries is not None:
+                queries.add(QueryRecord(f"memory.{name}", 0.0, 0))
+
+            return result
+
+        return recorded
+
+
+class StandInCluster:
+    """Stands in for the driver of a cluster with a lagging read replica.
+
+    Writes go to the leader, which hands out a new bookmark for each. Reads go
+    to the replica, which stays behind the leader unless a read carries the
+    bookmark of a later write, in which case it catches up first.
+
+    Attributes:
+      calls:
+        The queries run, as (text, routing, bookmarks, waited) tuples. waited
+        is whether the replica had to catch up before serving a read.
+    """
+
+    def __init__(self):
+        self.leader_version: int = 0
+        self.replica_version: int = 0
+        self.default_bookmarks: BookmarkManager = GraphDatabase.bookmark_manager()
+        self.calls: list[tuple[str, RoutingControl, set[str], bool]] = []
+
+    def execute_query(  # pylint: disable=too-many-arguments
+        self,
+        query: str | Query,
+        parameters_: dict[str, any] = None,  # pylint: disable=unused-argument
+        routing_: RoutingControl = RoutingControl.WRITE,
+        database_: str = None,  # pylint: disable=unused-argument
+        bookmark_manager_: BookmarkManager = DEFAULT,
+        **kwargs,  # pylint: disable=unused-argument
+    ) -> EagerResult:
+        """Records a query and returns no records."""
+        text: str = query.text if isinstance(query, Query) else query
+        manager: BookmarkManager = (
+            self.default_bookmarks if bookmark_manager_ is DEFAULT else bookmark_manager_
+        )
+        bookmarks: set[str] = manager.get_bookmarks() if manager is not None else set()
+        waited: bool = False
+
+        if routing_ == RoutingControl.WRITE:
+            self.leader_version += 1
+            if manager is not None:
+                manager.update_bookmarks(bookmarks, [f"standin:{self.leader_version}"])
+        else:
+            required: int = max(
+                (int(bookmark.split(":")[1]) for bookmark in bookmarks), default=0
+            )
+            waited = required > self.replica_version
+            self.replica_version = max(self.replica_version, required)
+
+        self.calls.append((text, routing_, bookmarks, waited))
+
+        return EagerResult([], None, [])
+
+
+def repository_calls(repo) -> dict[str, callable]:
+    """Returns a call of every method of a Neo4jRepository, keyed by name."""
+    # pylint: disable=import-outside-toplevel
+    from app.models.rec import Recommendation
+    from app.models.student import Student
+
+    student: Student = Student(student_id="A0000001X", email="a@u.edu")
+
+    return {
+        "get_modules": lambda: repo.get_modules(0, 10),
+        "get_modules_based_on_course_codes": lambda: repo.get_modules_based_on_course_codes(
+            ["CS1010"]
+        ),
+        "get_prerequisite_groups_for_each_module": lambda: (
+            repo.get_prerequisite_groups_for_each_module("CS1010")
+        ),
+        "get_mutually_exclusives_for_each_module": lambda: (
+            repo.get_mutually_exclusives_for_each_module("CS1010")
+        ),
+        "get_module": lambda: repo.get_module("CS1010"),
+        "search_modules": lambda: repo.search_modules("data", 0, 10),
+        "get_modules_course_codes": repo.get_modules_course_codes,
+        "get_faculties": repo.get_faculties,
+        "get_modules_in_a_faculty": lambda: repo.get_modules_in_a_faculty("Computing"),
+        "get_total_number_of_modules": repo.get_total_number_of_modules,
+        "search_for_modules": lambda: repo.search_for_modules(["CS1010"]),
+        "get_student": lambda: repo.get_student(student.student_id),
+        "get_all_student_ids": repo.get_all_student_ids,
+        "find_student_ids": lambda: repo.find_student_ids("CS", 1),
+        "get_student_courses": lambda: repo.get_student_courses(student.student_id),
+        "update_student": lambda: repo.update_student(student),
+        "remove_modules": lambda: repo.remove_modules(student.student_id, ["CS1010"]),
+        "add_modules": lambda: repo.add_modules(student.student_id, ["CS1010"]),
+        "get_modules_currently_taken": lambda: repo.get_modules_currently_taken(
+            student.student_id
+        ),
+        "register_student": lambda: repo.register_student(student, "hash"),
+        "get_cb_recs_that_fulfil_prereq": lambda: repo.get_cb_recs_that_fulfil_prereq(
+            student.student_id
+        ),
+        "get_cb_recs_that_have_no_prereq": lambda: repo.get_cb_recs_that_have_no_prereq(
+            student.student_id
+        ),
+        "get_cf_recs_that_fulfill_prereq": lambda: repo.get_cf_recs_that_fulfill_prereq(
+            student.student_id
+        ),
+        "get_cf_recs_that_have_no_prereq": lambda: repo.get_cf_recs_that_have_no_prereq(
+            student.student_id
+        ),
+        "get_stored_recommendations": lambda: repo.get_stored_recommendations(
+            student.student_id
+        ),
+        "store_recommendations": lambda: repo.store_recommendations(
+            student.student_id,
+            Recommendation(cf_recommendations=[], cbf_recommendations=[]),
+            1,
+            0.0,
+        ),
+        "invalidate_stored_recommendations": lambda: repo.invalidate_stored_recommendations(
+            student.student_id, 0.0
+        ),
+        "invalidate_all_stored_recommendations": lambda: (
+            repo.invalidate_all_stored_recommendations(0.0)
+        ),
+        "get_modules_for_recommender": repo.get_modules_for_recommender,
+        "get_similar_edges": repo.get_similar_edges,
+        "get_mutually_exclusive_pairs": repo.get_mutually_exclusive_pairs,
+        "get_student_rec_profile": lambda: repo.get_student_rec_profile(student.student_id),
+        "get_students_for_recommender": repo.get_students_for_recommender,
+        "get_similar_students": lambda: repo.get_similar_students(student.student_id),
+        "write_similar_students": lambda: repo.write_similar_students([]),
+        "get_enrollment_counts": repo.get_enrollment_counts,
+    }
@@ -0,0 +1,151 @@
+"""
+Seeded in-memory backends of the app, for the tests and benchmarks.
+
+configure_app points the settings at the in-memory backend before the app is
+imported, seed generates a synthetic graph into an InMemoryRepository along
+with the Context that requests are built from, and reset_app installs a
+repository in the app and drops everything derived from the previous one.
+"""
+
+import argparse
+import json
+import os
+import random
+
+from app.database.memory_repository import InMemoryRepository
+from app.recommenders.minhash import build_minhash_index
+from tests.synthetic import generate_modules, generate_similar_edges, generate_students
+
+PASSWORD = "benchmark-password"
+ADVISOR_ID = "A0000000"
+
+SETTINGS_ENV = {
+    "NEO4J_URI": "bolt://localhost:7687",
+    "NEO4J_USER": "neo4j",
+    "NEO4J_PASSWORD": "unused",
+    "SECRET_KEY": "benchmark-secret-key",
+}
+
+
+class Context:  # pylint: disable=too-few-public-methods
+    """The seeded data that requests are built from."""
+
+    def __init__(self, modules: list[dict[str, any]], students: list[dict[str, any]]):
+        self.modules: list[dict[str, any]] = modules
+        self.students: list[dict[str, any]] = students
+        self.rng: random.Random = random.Random(0)
+        self.tokens: dict[str, str] = {}
+        self.registered: int = 0
+
+    def module(self) -> dict[str, any]:
+        """Picks a random module."""
+        return self.rng.choice(self.modules)
+
+    def student(self) -> dict[str, any]:
+        """Picks a random student."""
+        return self.rng.choice(self.students)
+
+    def auth(self, student_id: str) -> dict[str, str]:
+        """Returns the authorization header of a student."""
+        # pylint: disable=import-outside-toplevel
+        from app.models.student import Student
+        from app.services.auth import create_access_token
+
+        if student_id not in self.tokens:
+            self.tokens[student_id] = create_access_token(
+                Student(student_id=student_id, email=f"{student_id}@example.com")
+            )
+
+        return {"Authorization": f"Bearer {self.tokens[student_id]}"}
+
+
+def configure_app():
+    """Points the settings at the in-memory backend before the app is imported."""
+    for name, value in SETTINGS_ENV.items():
+        os.environ.setdefault(name, value)
+
+    os.environ["REPOSITORY_BACKEND"] = "memory"
+    os.environ["ADVISOR_IDS"] = json.dumps([ADVISOR_ID])
+
+
+def prerequisite_closed(course_codes: list[str], prerequisites: dict[str, list[str]]):
+    """Drops the modules whose prerequisites are not taken, transitively."""
+    taken: set[str] = set(course_codes)
+    changed: bool = True
+
+    while changed:
+        missing: set[str] = {
+            course_code
+            for course_code in taken
+            if any(prerequisite not in taken for prerequisite in prerequisites[course_code])
+        }
+        taken -= missing
+        changed = bool(missing)
+
+    return sorted(taken)
+
+
+def seed(size: int, args: argparse.Namespace) -> tuple[InMemoryRepository, Context]:
+    """Generates a synthetic graph of the given number of students."""
+    # pylint: disable=import-outside-toplevel
+    from app.services.auth import get_password_hash
+
+    modules: list[dict[str, any]] = generate_modules(
+        args.modules, args.prerequisite_rate, args.seed
+    )
+    prerequisites: dict[str, list[str]] = {
+        module["course_code"]: module["prerequisites"] for module in modules
+    }
+    hashed_password: str = get_password_hash(PASSWORD)
+    students: list[dict[str, any]] = [
+        {
+            **student,
+            "email": f"{student['student_id']}@example.com",
+            "course_codes": prerequisite_closed(student["course_codes"], prerequisites),
+        }
+        for student in generate_students(
+            size, args.modules, args.modules_per_student, seed=args.seed
+        )
+    ]
+
+    repo: InMemoryRepository = InMemoryRepository()
+
+    for module in modules:
+        repo.add_module(module)
+        if module["prerequisites"]:
+            repo.add_prerequisite_group(module["course_code"], module["prerequisites"])
+    for source, target, score in generate_similar_edges(modules, seed=args.seed):
+        repo.add_similar(source, target, score)
+    for student in students:
+        repo.add_student(student, hashed_password)
+
+    index = build_minhash_index(students)
+    repo.write_similar_students(
+        [
+            {
+                "student_id": student["student_id"],
+                "neighbours": [
+                    {"student_id": neighbour, "score": score}
+                    for neighbour, score in index.neighbours(student["student_id"])
+                ],
+            }
+            for student in students
+        ]
+    )
+
+    return repo, Context(modules, students)
+
+
+def reset_app(repo):
+    """Installs a freshly seeded repository and drops everything derived from
+    the previous one."""
+    # pylint: disable=import-outside-toplevel
+    from app import dependencies
+    from app.services import rec as rec_service
+
+    dependencies.memory_repository = repo
+    rec_service.cb_recommender = None
+    rec_service.cf_recommender = None
+    rec_service.popularity_counters = None
+    rec_service.in_process_loaded_at.clear()
+    rec_service.refreshing_students.clear()
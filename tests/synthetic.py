@@ -0,0 +1,162 @@
+"""
+Synthetic cohorts of students and modules for the tests and benchmarks.
+
+Students belong to a discipline and take most of their modules from that
+discipline's pool, favouring the pool's first (core) modules, so that students
+of the same discipline have overlapping modules much like a real cohort.
+Modules may have an earlier module of their pool as prerequisite and are
+similar to other modules of their community, which spans two disciplines.
+"""
+
+import random
+
+DISCIPLINES = [f"Discipline {i}" for i in range(20)]
+
+
+def generate_modules(
+    num_modules: int, prerequisite_rate: float = 0.0, seed: int = 0
+) -> list[dict[str, any]]:
+    """Generates modules shaped like rec_db.get_modules_for_recommender rows.
+
+    Args:
+      num_modules:
+        The number of modules.
+      prerequisite_rate:
+        The fraction of modules, other than the first of each pool, that have
+        an earlier module of their pool as prerequisite.
+      seed:
+        The seed of the generator.
+
+    Returns:
+      A list of module dicts. Module i belongs to discipline i modulo the
+      number of disciplines and every two consecutive disciplines share a
+      community.
+    """
+    rng: random.Random = random.Random(seed)
+    modules: list[dict[str, any]] = []
+
+    for i in range(num_modules):
+        discipline: str = DISCIPLINES[i % len(DISCIPLINES)]
+        prerequisites: list[str] = []
+
+        if prerequisite_rate and i >= len(DISCIPLINES) and rng.random() < prerequisite_rate:
+            prerequisites.append(
+                f"M{rng.randrange(i % len(DISCIPLINES), i, len(DISCIPLINES)):05d}"
+            )
+
+        modules.append(
+            {
+                "course_code": f"M{i:05d}",
+                "course_name": f"Module {i}",
+                "course_info": None,
+                "faculty": f"Faculty {i % len(DISCIPLINES) // 4}",
+                "academic_units": rng.choice([2, 3, 4]),
+                "grade_type": "Letter Graded",
+                "broadening_and_deepening": rng.random() < 0.5,
+                "community": i % len(DISCIPLINES) // 2,
+                "discipline": discipline,
+                "prerequisites": prerequisites,
+            }
+        )
+
+    return modules
+
+
+def generate_students(
+    num_students: int,
+    num_modules: int,
+    modules_per_student: int = 30,
+    affinity: float = 0.8,
+    seed: int = 0,
+) -> list[dict[str, any]]:
+    """Generates students shaped like rec_db.get_students_for_recommender rows.
+
+    Args:
+      num_students:
+        The number of students.
+      num_modules:
+        The number of modules that students choose from, as generated by
+        generate_modules.
+      modules_per_student:
+        The number of modules taken by each student.
+      affinity:
+        The fraction of each student's modules taken from their discipline.
+      seed:
+        The seed of the generator.
+
+    Returns:
+      A list of student dicts.
+    """
+    rng: random.Random = random.Random(seed)
+    pools: list[list[str]] = [[] for _ in DISCIPLINES]
+
+    for i in range(num_modules):
+        pools[i % len(DISCIPLINES)].append(f"M{i:05d}")
+
+    weights: list[float] = [1 / (rank + 1) for rank in range(max(map(len, pools)))]
+    students: list[dict[str, any]] = []
+
+    for i in range(num_students):
+        discipline: int = rng.randrange(len(DISCIPLINES))
+        pool: list[str] = pools[discipline]
+        own: int = min(round(modules_per_student * affinity), len(pool))
+        course_codes: set[str] = set()
+
+        while len(course_codes) < own:
+            course_codes.update(rng.choices(pool, weights=weights[: len(pool)]))
+
+        while len(course_codes) < min(modules_per_student, num_modules):
+            course_codes.add(f"M{rng.randrange(num_modules):05d}")
+
+        students.append(
+            {
+                "student_id": f"S{i:07d}",
+                "disciplines": [DISCIPLINES[discipline]],
+                "year_of_study": rng.randint(1, 4),
+                "course_codes": sorted(course_codes),
+            }
+        )
+
+    return students
+
+
+def generate_similar_edges(
+    modules: list[dict[str, any]], edges_per_module: int = 10, seed: int = 0
+) -> list[tuple[str, str, float]]:
+    """Generates SIMILAR edges between modules of the same community.
+
+    Every module is similar to a random sample of the modules of its
+    community, and
+    every prerequisite is similar to the modules that require it.
+
+    Args:
+      modules:
+        The modules, as generated by generate_modules.
+      edges_per_module:
+        The number of random similar edges from each module.
+      seed:
+        The seed of the generator.
+
+    Returns:
+      A list of (source, target, score) tuples.
+    """
+    rng: random.Random = random.Random(seed)
+    communities: dict[int, list[str]] = {}
+
+    for module in modules:
+        communities.setdefault(module["community"], []).append(module["course_code"])
+
+    edges: dict[tuple[str, str], float] = {}
+
+    for module in modules:
+        course_code: str = module["course_code"]
+        community: list[str] = communities[module["community"]]
+
+        for target in rng.sample(community, min(edges_per_module + 1, len(community))):
+            if target != course_code:
+                edges[(course_code, target)] = round(rng.uniform(0.3, 0.95), 3)
+
+        for prerequisite in module["prerequisites"]:
+            edges[(prerequisite, course_code)] = round(rng.uniform(0.5, 0.84), 3)
+
+    return [(source, target, score) for (source, target), score in edges.items()]
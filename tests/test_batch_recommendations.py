@@ -0,0 +1,71 @@
+"""
+Tests the bound on the number of students of POST /recommendations/batch.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app import config
+from app.main import app
+from app.models.rec import BATCH_MAX_STUDENT_IDS
+from tests.seeding import ADVISOR_ID, reset_app
+
+
+@pytest.fixture
+def settings(monkeypatch) -> config.Settings:
+    """Returns the settings, restoring the bound changed by a test."""
+    settings: config.Settings = config.get_settings()
+    monkeypatch.setattr(settings, "rec_batch_max_students", settings.rec_batch_max_students)
+
+    return settings
+
+
+def post_batch(seeded, body: dict[str, any]) -> httpx.Response:
+    """Posts a batch to the app served by the seeded repository."""
+    repo, context = seeded
+    reset_app(repo)
+
+    async def send():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await client.post(
+                "/recommendations/batch", headers=context.auth(ADVISOR_ID), json=body
+            )
+
+    return asyncio.run(send())
+
+
+def test_batch_within_bound_is_streamed(seeded, settings: config.Settings):
+    _, context = seeded
+    student_ids: list[str] = [student["student_id"] for student in context.students]
+    settings.rec_batch_max_students = len(student_ids)
+
+    response = post_batch(seeded, {"student_ids": student_ids})
+
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == len(student_ids)
+
+
+def test_batch_over_bound_is_rejected(seeded, settings: config.Settings):
+    _, context = seeded
+    student_ids: list[str] = [student["student_id"] for student in context.students]
+    settings.rec_batch_max_students = len(student_ids) - 1
+
+    assert post_batch(seeded, {"student_ids": student_ids}).status_code == 400
+
+
+def test_batch_selecting_over_bound_is_rejected(seeded, settings: config.Settings):
+    repo, context = seeded
+    year_of_study: int = context.students[0]["year_of_study"]
+    settings.rec_batch_max_students = len(repo.find_student_ids(None, year_of_study)) - 1
+
+    assert post_batch(seeded, {"year_of_study": year_of_study}).status_code == 400
+
+
+def test_batch_listing_too_many_ids_is_invalid(seeded):
+    student_ids: list[str] = [f"S{i}" for i in range(BATCH_MAX_STUDENT_IDS + 1)]
+
+    assert post_batch(seeded, {"student_ids": student_ids}).status_code == 422
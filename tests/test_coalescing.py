@@ -0,0 +1,82 @@
+"""
+Tests that identical concurrent catalog requests share one repository call.
+"""
+
+import asyncio
+from typing import Callable
+
+import httpx
+import pytest
+
+from app.main import app
+from tests.fakes import CountingRepository, SlowRepository
+from tests.seeding import Context, reset_app
+
+CONCURRENCY = 10
+DELAY = 0.02
+
+CATALOG_REQUESTS: dict[str, Callable[[Context], dict[str, any]]] = {
+    "GET /modules/": lambda context: {"url": "/modules/", "params": {"limit": 20}},
+    "GET /modules/{course-code}": lambda context: {
+        "url": "/modules/{course-code}",
+        "params": {"course_code": context.module()["course_code"]},
+    },
+    "GET /modules/search/{search-term}": lambda context: {
+        "url": "/modules/search/{search-term}",
+        "params": {"search_term": context.module()["course_name"]},
+    },
+    "GET /modules/get/course-codes": lambda context: {"url": "/modules/get/course-codes"},
+    "GET /modules/get/faculties": lambda context: {"url": "/modules/get/faculties"},
+    "GET /modules/faculty/{faculty}": lambda context: {
+        "url": f"/modules/faculty/{context.module()['faculty']}"
+    },
+    "GET /modules/get/number-of-modules": lambda context: {
+        "url": "/modules/get/number-of-modules"
+    },
+}
+
+
+async def send_concurrently(
+    repo: CountingRepository, requests: list[dict[str, any]]
+) -> tuple[int, set[int]]:
+    """Sends GET requests at once to the app served by a repository.
+
+    Returns:
+      The number of repository calls they made and their status codes.
+    """
+    reset_app(repo)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        before: int = repo.queries
+        responses = await asyncio.gather(
+            *(client.request("GET", **request) for request in requests)
+        )
+
+    return repo.queries - before, {response.status_code for response in responses}
+
+
+@pytest.mark.parametrize("endpoint", CATALOG_REQUESTS)
+def test_identical_requests_share_one_call(seeded, endpoint: str):
+    repo, context = seeded
+    counting: CountingRepository = CountingRepository(SlowRepository(repo, DELAY))
+    request: dict[str, any] = CATALOG_REQUESTS[endpoint](context)
+
+    calls, statuses = asyncio.run(send_concurrently(counting, [request] * CONCURRENCY))
+
+    assert statuses == {200}
+    assert calls == 1
+
+
+def test_distinct_requests_are_not_coalesced(seeded):
+    repo, _ = seeded
+    counting: CountingRepository = CountingRepository(SlowRepository(repo, DELAY))
+    requests: list[dict[str, any]] = [
+        {"url": "/modules/", "params": {"skip": skip, "limit": 1}} for skip in range(CONCURRENCY)
+    ]
+
+    calls, statuses = asyncio.run(send_concurrently(counting, requests))
+
+    assert statuses == {200}
+    assert calls == CONCURRENCY
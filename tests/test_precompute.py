@@ -0,0 +1,45 @@
+"""
+Tests that precomputing the recommendations skips the students it cannot
+precompute.
+"""
+
+import asyncio
+
+from app.models.rec import StoredRecommendation
+from app.services.rec import precompute_recommendations
+from tests.seeding import reset_app
+
+
+class FlakyRepository:  # pylint: disable=too-few-public-methods
+    """Wraps a repository in which a student is deleted once the students are
+    listed and the stored recommendations of another cannot be read."""
+
+    def __init__(self, repo, deleted: str, failing: str):
+        self.repo = repo
+        self.deleted: str = deleted
+        self.failing: str = failing
+
+    def get_stored_recommendations(self, student_id: str) -> StoredRecommendation:
+        """Returns None for the deleted student and fails for the failing one."""
+        if student_id == self.deleted:
+            return None
+        if student_id == self.failing:
+            raise RuntimeError("Connection reset")
+
+        return self.repo.get_stored_recommendations(student_id)
+
+    def __getattr__(self, name: str):
+        return getattr(self.repo, name)
+
+
+def test_precompute_skips_deleted_and_failing_students(seeded):
+    repo, context = seeded
+    reset_app(repo)
+    student_ids: list[str] = [student["student_id"] for student in context.students]
+    flaky: FlakyRepository = FlakyRepository(repo, student_ids[0], student_ids[1])
+
+    precomputed: int = asyncio.run(precompute_recommendations(flaky, chunk_size=3))
+
+    assert precomputed == len(student_ids) - 2
+    for student_id in student_ids[2:]:
+        assert repo.get_stored_recommendations(student_id).computed_at is not None
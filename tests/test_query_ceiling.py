@@ -0,0 +1,70 @@
+"""
+Tests the per-endpoint query count ceilings of QueryInstrumentationMiddleware.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app import config
+from app.database.instrumentation import QueryCeilingExceeded
+from app.main import app
+from tests.fakes import QueryRecordingRepository
+from tests.seeding import reset_app
+
+ENDPOINT = "GET /modules/{course-code}"
+
+
+@pytest.fixture
+def settings(monkeypatch) -> config.Settings:
+    """Returns the settings, restoring the ceilings changed by a test."""
+    settings: config.Settings = config.get_settings()
+    monkeypatch.setattr(settings, "query_count_ceilings", {})
+    monkeypatch.setattr(settings, "query_count_ceiling_action", "log")
+
+    return settings
+
+
+def get_module(seeded) -> httpx.Response:
+    """Gets a module from the app served by the seeded repository."""
+    repo, context = seeded
+    reset_app(QueryRecordingRepository(repo))
+
+    async def send():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            return await client.get(
+                "/modules/{course-code}",
+                params={"course_code": context.module()["course_code"]},
+            )
+
+    return asyncio.run(send())
+
+
+def test_request_within_ceiling_passes(seeded, settings: config.Settings):
+    settings.query_count_ceilings = {ENDPOINT: 100}
+    settings.query_count_ceiling_action = "raise"
+
+    response = get_module(seeded)
+
+    assert response.status_code == 200
+    assert 'desc="0 queries"' not in response.headers["Server-Timing"]
+
+
+def test_request_over_ceiling_raises(seeded, settings: config.Settings):
+    settings.query_count_ceilings = {ENDPOINT: 0}
+    settings.query_count_ceiling_action = "raise"
+
+    with pytest.raises(QueryCeilingExceeded, match=ENDPOINT):
+        get_module(seeded)
+
+
+def test_request_over_ceiling_logs(seeded, settings: config.Settings, caplog):
+    settings.query_count_ceilings = {ENDPOINT: 0}
+
+    response = get_module(seeded)
+
+    assert response.status_code == 200
+    assert "above its ceiling of 0" in caplog.text
@@ -0,0 +1,48 @@
+"""
+Tests which recommendation sub-queries are run for a student.
+"""
+
+import pytest
+
+from app import config
+from app.models.rec import RecommendationParams, StudentRecProfile
+from app.services.rec import get_rec_sub_queries
+
+CB_SUB_QUERIES = ["cb_fulfil_prereq", "cb_no_prereq"]
+ALL_SUB_QUERIES = [*CB_SUB_QUERIES, "cf_fulfil_prereq", "cf_no_prereq"]
+
+
+@pytest.fixture(params=["cypher", "in_process"])
+def backend(request, monkeypatch) -> str:
+    """Sets the recommender backend."""
+    monkeypatch.setattr(config.get_settings(), "recommender_backend", request.param)
+
+    return request.param
+
+
+def profile(number_of_neighbours: int) -> StudentRecProfile:
+    """Returns the profile of a student having taken a module."""
+    return StudentRecProfile(
+        course_codes=["CS1010"], number_of_neighbours=number_of_neighbours
+    )
+
+
+def test_student_with_neighbours_runs_every_sub_query(backend: str):
+    assert sorted(get_rec_sub_queries(profile(10))) == ALL_SUB_QUERIES
+
+
+def test_student_without_stored_neighbours(backend: str):
+    sub_queries: list[str] = sorted(get_rec_sub_queries(profile(0)))
+
+    # The in-process backend finds the neighbours from the enrollments.
+    assert sub_queries == (ALL_SUB_QUERIES if backend == "in_process" else CB_SUB_QUERIES)
+
+
+def test_no_neighbour_asked_for_skips_collaborative(backend: str):
+    params: RecommendationParams = RecommendationParams(number_of_neighbours=0)
+
+    assert sorted(get_rec_sub_queries(profile(10), params)) == CB_SUB_QUERIES
+
+
+def test_student_without_modules_runs_none(backend: str):
+    assert not get_rec_sub_queries(StudentRecProfile())
@@ -0,0 +1,153 @@
+"""
+Tests the read/write routing and the bookmarks of the db functions against a
+stand-in cluster with a lagging read replica.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from neo4j import RoutingControl
+
+from app.database import bookmarks as bookmarks_module
+from app.database.bookmarks import (
+    RequestBookmarks,
+    StudentBookmarks,
+    current_request_bookmarks,
+    decode_bookmarks,
+    encode_bookmarks,
+    use_student_bookmarks,
+)
+from app.database.instrumentation import WRITE_CLAUSES, InstrumentedDriver, query_name
+from app.database.repository import Neo4jRepository
+from tests.fakes import StandInCluster, repository_calls
+
+STUDENT_A = "A0000001X"
+STUDENT_B = "B0000002Y"
+METHODS = list(repository_calls(Neo4jRepository(InstrumentedDriver(StandInCluster()))))
+
+
+@pytest.fixture
+def cluster(monkeypatch) -> StandInCluster:
+    """Returns a stand-in cluster, with the bookmarks of no student kept."""
+    monkeypatch.setattr(bookmarks_module, "student_bookmarks", StudentBookmarks())
+
+    return StandInCluster()
+
+
+@pytest.fixture
+def repo(cluster: StandInCluster) -> Neo4jRepository:
+    """Returns a repository over the stand-in cluster."""
+    return Neo4jRepository(InstrumentedDriver(cluster))
+
+
+def last_read(cluster: StandInCluster) -> tuple[set[str], bool]:
+    """Returns the bookmarks of the last query, a read, and whether the
+    replica had to catch up before serving it."""
+    _, routing, bookmarks, waited = cluster.calls[-1]
+    assert routing == RoutingControl.READ
+
+    return bookmarks, waited
+
+
+def write_as_student_a(cluster: StandInCluster, repo: Neo4jRepository) -> set[str]:
+    """Adds a module on behalf of student A.
+
+    Returns:
+      The bookmarks of the write.
+    """
+    use_student_bookmarks(STUDENT_A)
+    repo.add_modules(STUDENT_A, ["CS1010"])
+
+    return {f"standin:{cluster.leader_version}"}
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_queries_are_routed_by_whether_they_write(
+    cluster: StandInCluster, repo: Neo4jRepository, method: str
+):
+    try:
+        repository_calls(repo)[method]()
+    except Exception:  # pylint: disable=broad-exception-caught
+        # The stand-in returns no records, which some methods do not expect.
+        pass
+
+    assert cluster.calls
+    for text, routing, _, _ in cluster.calls:
+        writes: bool = WRITE_CLAUSES.search(text) is not None
+        assert routing == (RoutingControl.WRITE if writes else RoutingControl.READ), (
+            query_name(text)
+        )
+
+
+def test_student_reads_their_own_writes(cluster: StandInCluster, repo: Neo4jRepository):
+    def scenario():
+        written: set[str] = write_as_student_a(cluster, repo)
+
+        repo.get_student_courses(STUDENT_A)
+        assert last_read(cluster) == (written, True)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(
+                contextvars.copy_context().run, repo.get_student_courses, STUDENT_A
+            ).result()
+        assert last_read(cluster)[0] == written
+
+    contextvars.Context().run(scenario)
+
+
+def test_other_reads_carry_no_bookmarks(cluster: StandInCluster, repo: Neo4jRepository):
+    contextvars.Context().run(write_as_student_a, cluster, repo)
+
+    def student_b():
+        use_student_bookmarks(STUDENT_B)
+        repo.get_student_courses(STUDENT_B)
+
+    contextvars.Context().run(student_b)
+    assert not last_read(cluster)[0]
+
+    contextvars.Context().run(repo.get_modules_course_codes)
+    assert not last_read(cluster)[0]
+
+
+@pytest.mark.parametrize(
+    "student_id, tampered, carries",
+    [(STUDENT_A, False, True), (STUDENT_B, False, False), (STUDENT_A, True, False)],
+)
+def test_bookmarks_token_carries_writes_to_other_workers(  # pylint: disable=too-many-arguments
+    cluster: StandInCluster,
+    repo: Neo4jRepository,
+    monkeypatch,
+    student_id: str,
+    tampered: bool,
+    carries: bool,
+):
+    request: RequestBookmarks = RequestBookmarks()
+
+    def write() -> set[str]:
+        current_request_bookmarks.set(request)
+        return write_as_student_a(cluster, repo)
+
+    written: set[str] = contextvars.Context().run(write)
+    token: str = request.response_token()
+    if tampered:
+        token = token[:-1] + ("0" if token[-1] != "0" else "1")
+
+    # The read is served by a worker that has not seen the write.
+    monkeypatch.setattr(bookmarks_module, "student_bookmarks", StudentBookmarks())
+    worker = contextvars.Context()
+    worker.run(current_request_bookmarks.set, RequestBookmarks(token))
+    worker.run(use_student_bookmarks, student_id)
+    worker.run(repo.get_student_courses, student_id)
+
+    assert last_read(cluster)[0] == (written if carries else set())
+
+
+def test_bookmarks_token_is_only_read_for_its_student():
+    token: str = encode_bookmarks(STUDENT_A, {"standin:1", "standin:2"})
+    tampered: str = token[:-1] + ("0" if token[-1] != "0" else "1")
+
+    assert sorted(decode_bookmarks(token, STUDENT_A)) == ["standin:1", "standin:2"]
+    assert not decode_bookmarks(token, STUDENT_B)
+    assert not decode_bookmarks(tampered, STUDENT_A)
+    assert not decode_bookmarks("not a token", STUDENT_A)